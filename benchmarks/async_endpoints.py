@@ -0,0 +1,107 @@
+"""Compares the job read endpoints served sync (before) and async (after).
+
+Run from the repository root::
+
+    python -m benchmarks.async_endpoints --concurrency 64 --duration 10
+
+The "sync" app reproduces the previous endpoints: plain ``def`` handlers using the
+blocking helpers of ``restful_runner.database``, which Starlette runs in its
+threadpool. The "async" app is ``restful_runner.api.app``. Both serve the same
+seeded SQLite database.
+"""
+
+import argparse
+import datetime
+import os
+from typing import List
+import uuid
+
+from fastapi import Depends, FastAPI, HTTPException
+
+from benchmarks.common import add_load_arguments, make_workdir
+from benchmarks.loadgen import run_load, serve
+
+
+def build_sync_app(db) -> FastAPI:
+    # pylint: disable=import-outside-toplevel
+    from restful_runner import database
+    from restful_runner.schema import AnsibleJob
+
+    app = FastAPI()
+
+    def get_session():
+        with db.session_local() as session:
+            yield session
+
+    @app.get("/jobs", response_model=List[AnsibleJob])
+    def get_jobs(session=Depends(get_session)):
+        return database.get_ansible_jobs(session)
+
+    @app.get("/jobs/{job_uuid}", response_model=AnsibleJob)
+    def get_job_by_uuid(job_uuid: str, session=Depends(get_session)):
+        job = database.get_ansible_job(session, job_uuid)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    return app
+
+
+def seed(db, count: int) -> List[str]:
+    # pylint: disable=import-outside-toplevel
+    from restful_runner.data_model import AnsibleJob
+    from restful_runner.schema import AnsibleRunnerStatus
+
+    now = datetime.datetime.now()
+    idents = [str(uuid.uuid1()) for _ in range(count)]
+    with db.session_local() as session:
+        session.add_all(
+            AnsibleJob(
+                job_uuid=ident,
+                job_name="bench.yml",
+                initiator="bench",
+                status=AnsibleRunnerStatus.SUCCESSFUL,
+                start_time=now - datetime.timedelta(seconds=index),
+                end_time=now,
+            )
+            for index, ident in enumerate(idents)
+        )
+        session.commit()
+    return idents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=1000)
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    make_workdir()
+
+    # pylint: disable=import-outside-toplevel
+    from restful_runner import api, database
+
+    # The async app creates its own connection to the database when it starts
+    db = database.DatabaseConnection(os.environ["DB_URL"])
+    database.upgrade_schema(db.get_engine())
+    idents = seed(db, args.jobs)
+    scenarios = {
+        "/jobs": ["/jobs"],
+        "/jobs/{uuid}": [f"/jobs/{ident}" for ident in idents],
+    }
+
+    print(f"{'app':<8}{'endpoint':<16}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, app in (("sync", build_sync_app(db)), ("async", api.app)):
+        with serve(app) as base_url:
+            for endpoint, paths in scenarios.items():
+                report = run_load(
+                    base_url, paths, args.concurrency, args.duration, args.processes
+                ).as_dict()
+                print(
+                    f"{name:<8}{endpoint:<16}{report['rps']:>10}"
+                    f"{report['p50_ms']:>10}{report['p99_ms']:>10}"
+                )
+
+
+if __name__ == "__main__":
+    main()
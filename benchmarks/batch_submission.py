@@ -0,0 +1,94 @@
+"""Compares submitting and checking many jobs one by one and in batches.
+
+Run from the repository root::
+
+    python -m benchmarks.batch_submission --jobs 1000 --concurrency 16
+
+"per-call" starts every job with ``POST /playbooks/{playbook}`` and reads its
+status back with ``GET /jobs/{uuid}``, from ``--concurrency`` concurrent clients.
+"batch" does the same with ``POST /jobs:batch`` and ``POST /jobs:lookup`` in
+chunks of ``--batch-size`` jobs. The API runs in distributed mode against a
+SQLite file, so the jobs are only stored and nothing runs them.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.common import make_workdir
+from benchmarks.loadgen import serve
+
+
+async def per_call(base_url: str, jobs: int, concurrency: int) -> List[str]:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+
+        async def submit(index: int) -> str:
+            async with semaphore:
+                response = await client.post(
+                    "/playbooks/bench.yml", json={"extravars": {"index": index}}
+                )
+                response.raise_for_status()
+                job_uuid = response.json()["job_uuid"]
+                response = await client.get(f"/jobs/{job_uuid}")
+                response.raise_for_status()
+                return job_uuid
+
+        return await asyncio.gather(*(submit(index) for index in range(jobs)))
+
+
+async def batched(base_url: str, jobs: int, batch_size: int) -> List[str]:
+    job_uuids: List[str] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for first in range(0, jobs, batch_size):
+            submissions = [
+                {"playbook": "bench.yml", "extravars": {"index": index}}
+                for index in range(first, min(jobs, first + batch_size))
+            ]
+            response = await client.post("/jobs:batch", json={"jobs": submissions})
+            response.raise_for_status()
+            chunk = [job["job_uuid"] for job in response.json()]
+            response = await client.post("/jobs:lookup", json={"job_uuids": chunk})
+            response.raise_for_status()
+            job_uuids.extend(chunk)
+    return job_uuids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    make_workdir(playbook=True)
+    os.environ["EXECUTION_MODE"] = "distributed"
+    # Every mode submits --jobs jobs that stay waiting
+    os.environ["MAX_QUEUE_SIZE"] = str(4 * args.jobs)
+
+    from restful_runner import api  # pylint: disable=import-outside-toplevel
+
+    print(f"{'mode':<10}{'jobs':>8}{'seconds':>10}{'jobs/s':>10}")
+    with serve(api.app) as base_url:
+        for mode in ("per-call", "batch"):
+            start = time.perf_counter()
+            if mode == "per-call":
+                job_uuids = asyncio.run(per_call(base_url, args.jobs, args.concurrency))
+            else:
+                job_uuids = asyncio.run(batched(base_url, args.jobs, args.batch_size))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{mode:<10}{len(job_uuids):>8}{elapsed:>10.2f}"
+                f"{len(job_uuids) / elapsed:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmarks."""
+import argparse
+import os
+import tempfile
+
+
+def add_load_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the options passed to ``loadgen.run_load`` to a benchmark's parser."""
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--processes", type=int, default=2)
+
+
+def make_workdir(playbook: bool = False) -> str:
+    """Creates a private data directory and points the settings of the API at it.
+
+    The database is a SQLite file in the directory. With ``playbook``, the
+    project holds a ``bench.yml`` playbook.
+    """
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    os.makedirs(os.path.join(workdir, "project"))
+    if playbook:
+        path = os.path.join(workdir, "project", "bench.yml")
+        with open(path, "w", encoding="utf-8") as playbook_file:
+            playbook_file.write("- hosts: all\n")
+    os.environ["DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["PRIVATE_DATA_DIR"] = workdir
+    return workdir
+
+
+def rss_mb() -> float:
+    """Returns the resident memory of the current process in MiB."""
+    with open("/proc/self/status", encoding="utf-8") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
@@ -0,0 +1,184 @@
+"""Measures status writes and job listings contending for a SQLite database.
+
+Run from the repository root::
+
+    python -m benchmarks.db_contention --writer-processes 2 --duration 10
+
+For every engine profile, a new database is seeded with ``--jobs`` jobs. Then,
+for ``--duration`` seconds, ``--writer-processes`` processes each run
+``--writers`` threads storing status changes one at a time, like executor
+threads with ``status_writer_batching`` off or workers in distributed mode,
+while clients list ``/jobs`` from the API. The profiles are:
+
+* ``legacy``: the SQLite defaults, which the engines used before the settings
+  existed: rollback journal, ``synchronous=full``, a busy timeout of 5 seconds.
+* ``wal``: the default settings, WAL journal and ``synchronous=normal``.
+* ``writer``: the default settings with ``sqlite_writer_connection``.
+
+Reported are the committed writes per second, their p99 latency and the writes
+that failed, e.g. with "database is locked", then the same for the reads.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.loadgen import run_load, serve
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "legacy": {
+        "sqlite_journal_mode": None,
+        "sqlite_synchronous": None,
+        "sqlite_busy_timeout_seconds": 5.0,
+    },
+    "wal": {},
+    "writer": {"sqlite_writer_connection": True},
+}
+
+
+def _write_statuses(  # pylint: disable=too-many-locals
+    db_url: str, profile: Dict[str, Any], args: argparse.Namespace, results: Any
+) -> None:
+    # pylint: disable=import-outside-toplevel
+    from restful_runner import database, utils
+    from restful_runner.config import ApplicationSettings
+    from restful_runner.executors import RemoteRunnerConfig
+
+    db = database.DatabaseConnection(
+        db_url, ApplicationSettings(db_url=db_url, **profile)
+    )
+    handler = utils.build_status_handler(db.write_session_local)
+    latencies: List[float] = []
+    errors: List[str] = []
+    deadline = time.monotonic() + args.duration
+
+    def write(offset: int) -> None:
+        index = offset
+        while time.monotonic() < deadline:
+            ident = f"job-{index % args.jobs}"
+            index += args.writers
+            start = time.perf_counter()
+            try:
+                handler(
+                    {"status": "running", "runner_ident": ident},
+                    RemoteRunnerConfig(ident),
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(type(exc).__name__)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    workers = [
+        threading.Thread(target=write, args=(offset,)) for offset in range(args.writers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, errors))
+
+
+def _seed(db_url: str, jobs: int) -> None:
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import insert
+
+    from restful_runner import database
+    from restful_runner.data_model import AnsibleJob
+    from restful_runner.schema import AnsibleRunnerStatus
+
+    db = database.DatabaseConnection(db_url)
+    database.upgrade_schema(db.get_engine())
+    with db.session_local() as session:
+        session.execute(
+            insert(AnsibleJob),
+            [
+                {
+                    "job_uuid": f"job-{index}",
+                    "job_name": "bench.yml",
+                    "initiator": "bench",
+                    "status": AnsibleRunnerStatus.RUNNING,
+                }
+                for index in range(jobs)
+            ],
+        )
+        session.commit()
+    db.get_engine().dispose()
+
+
+def measure(  # pylint: disable=too-many-locals
+    name: str, args: argparse.Namespace
+) -> str:
+    # pylint: disable=import-outside-toplevel
+    from restful_runner import api
+    from restful_runner.config import ApplicationSettings
+
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    os.makedirs(os.path.join(workdir, "project"))
+    db_url = f"sqlite:///{workdir}/bench.db"
+    profile = PROFILES[name]
+    _seed(db_url, args.jobs)
+
+    settings = ApplicationSettings(
+        db_url=db_url,
+        private_data_dir=workdir,
+        schedules_enabled=False,
+        job_cache_size=0,
+        **profile,
+    )
+    results: Any = multiprocessing.Queue()
+    writers = [
+        multiprocessing.Process(
+            target=_write_statuses,
+            args=(db_url, profile, args, results),
+        )
+        for _ in range(args.writer_processes)
+    ]
+    with serve(api.create_app(settings)) as base_url:
+        for writer in writers:
+            writer.start()
+        reads = run_load(
+            base_url, ["/jobs"], args.concurrency, args.duration, args.processes
+        )
+        latencies: List[float] = []
+        errors: List[str] = []
+        for _ in writers:
+            writer_latencies, writer_errors = results.get()
+            latencies.extend(writer_latencies)
+            errors.extend(writer_errors)
+        for writer in writers:
+            writer.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    return (
+        f"{name:<10}{len(latencies) / args.duration:>10.1f}{p99:>10.1f}"
+        f"{len(errors):>8}{reads.requests_per_second:>10.1f}"
+        f"{reads.percentile(0.99):>10.1f}{reads.errors:>8}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--writer-processes", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    args = parser.parse_args()
+
+    print(
+        f"{'profile':<10}{'writes/s':>10}{'p99 ms':>10}{'errors':>8}"
+        f"{'reads/s':>10}{'p99 ms':>10}{'errors':>8}"
+    )
+    for name in args.profiles:
+        print(measure(name, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Measures job event ingestion for a playbook run on many hosts.
+
+Run from the repository root::
+
+    python -m benchmarks.event_ingest --hosts 1000 --tasks 10
+
+Runs the fake runner with ``--hosts`` hosts and ``--tasks`` tasks, storing every
+host outcome in the ``ansible_job_events`` table. "direct" inserts and commits
+each event from the runner thread, "batched" goes through ``EventWriter``. The
+rate is measured until every event has been committed to a SQLite file, the
+runner overhead is the time the run itself took.
+"""
+
+import argparse
+import tempfile
+import time
+
+from restful_runner import database, utils
+from restful_runner.writers import EventWriter
+
+from benchmarks import fake_runner
+
+
+def measure(mode: str, hosts: int, tasks: int):
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    db = database.DatabaseConnection(f"sqlite:///{workdir}/bench.db")
+    database.upgrade_schema(db.get_engine())
+
+    writer = EventWriter(db.session_local)
+    if mode == "batched":
+        writer.start()
+        event_handler = utils.build_event_store_handler(writer)
+    else:
+
+        def event_handler(event):
+            fields = utils.job_event_fields(event)
+            if fields is not None:
+                with db.session_local() as session:
+                    database.create_ansible_job_events(session, [fields])
+            return True
+
+    start = time.perf_counter()
+    fake_runner.run(
+        ident="bench",
+        playbook="bench.yml",
+        event_handler=event_handler,
+        extravars={"fake_duration": 0, "fake_hosts": hosts, "fake_tasks": tasks},
+    )
+    run_time = time.perf_counter() - start
+    if mode == "batched":
+        writer.stop()
+    elapsed = time.perf_counter() - start
+
+    db.get_engine().dispose()
+    return hosts * tasks / elapsed, run_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'events/s':>12}{'runner s':>12}")
+    for mode in ("direct", "batched"):
+        rate, run_time = measure(mode, args.hosts, args.tasks)
+        print(f"{mode:<10}{rate:>12.0f}{run_time:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares API latency while N jobs run on each executor backend.
+
+Run from the repository root::
+
+    python -m benchmarks.executor_backends --jobs 8 --duration 5
+
+Each backend runs ``--jobs`` concurrent fake jobs (see ``benchmarks.fake_runner``)
+while the main thread polls ``GET /jobs``. The latency percentiles of those polls
+and the resident memory of the API process are reported per backend.
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from benchmarks.common import make_workdir, rss_mb
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> None:  # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--cpu", type=float, default=0.5)
+    parser.add_argument(
+        "--backends", nargs="+", default=["thread", "process", "subprocess"]
+    )
+    args = parser.parse_args()
+
+    make_workdir()
+
+    # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient
+
+    from restful_runner import api, database, executors, utils
+    from benchmarks import fake_runner
+
+    with TestClient(api.app) as client:
+        db = api.app.state.runtime.db
+        status_handler = utils.build_status_handler(db.session_local)
+        extravars = {"fake_duration": args.duration, "fake_cpu": args.cpu}
+
+        print(f"{'backend':<12}{'polls':>8}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>10}")
+        for backend in args.backends:
+            executor = executors.build_executor(backend, args.jobs)
+            futures = []
+            with db.session_local() as session:
+                for _ in range(args.jobs):
+                    ident = str(uuid.uuid1())
+                    database.create_ansible_job(session, ident, "bench.yml", "bench")
+                    futures.append(
+                        executor.submit(
+                            fake_runner.run,
+                            status_handler=status_handler,
+                            ident=ident,
+                            playbook="bench.yml",
+                            extravars=extravars,
+                        )
+                    )
+
+            latencies = []
+            while not all(future.done() for future in futures):
+                start = time.perf_counter()
+                client.get("/jobs")
+                latencies.append((time.perf_counter() - start) * 1000)
+            rss = rss_mb()
+            executor.shutdown()
+
+            print(
+                f"{backend:<12}{len(latencies):>8}"
+                f"{statistics.median(latencies):>10.2f}"
+                f"{_percentile(latencies, 0.99):>10.2f}{rss:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
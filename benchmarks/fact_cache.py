@@ -0,0 +1,95 @@
+"""Measures repeated runs of a playbook with and without the shared fact cache.
+
+Run from the repository root, with ansible installed::
+
+    python -m benchmarks.fact_cache --hosts 20 --runs 5
+
+Creates a private data dir whose inventory has ``--hosts`` hosts, all connecting
+to this machine, and a playbook with a single debug task that gathers facts
+first, as plays do by default. "per-job" runs it ``--runs`` times the way
+ansible_runner does by default, each job with a fact cache of its own in its
+artifacts. "shared" runs it with the fact cache of ``restful_runner.facts``, so
+only the first run gathers facts. The wall-clock time of the first run and the
+median of the others are reported.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import ansible_runner
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.facts import FactCache
+
+_PLAYBOOK = """\
+- hosts: all
+  tasks:
+    - debug:
+        msg: "{{ ansible_system }}"
+"""
+
+
+def build_private_data_dir(hosts: int) -> str:
+    private_data_dir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    os.makedirs(os.path.join(private_data_dir, "inventory"))
+    os.makedirs(os.path.join(private_data_dir, "project"))
+    with open(
+        os.path.join(private_data_dir, "inventory", "hosts"), "w", encoding="utf-8"
+    ) as inventory:
+        for index in range(hosts):
+            inventory.write(
+                f"host{index} ansible_connection=local "
+                f"ansible_python_interpreter={sys.executable}\n"
+            )
+    with open(
+        os.path.join(private_data_dir, "project", "bench.yml"), "w", encoding="utf-8"
+    ) as playbook:
+        playbook.write(_PLAYBOOK)
+    return private_data_dir
+
+
+def time_run(private_data_dir: str, forks: int, **kwargs) -> float:
+    start = time.perf_counter()
+    runner = ansible_runner.run(
+        private_data_dir=private_data_dir,
+        playbook="bench.yml",
+        quiet=True,
+        forks=forks,
+        suppress_env_files=True,
+        **kwargs,
+    )
+    if runner.status != "successful":
+        raise RuntimeError(f"The playbook run {runner.status}")
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--forks", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    private_data_dir = build_private_data_dir(args.hosts)
+    fact_cache = FactCache(
+        ApplicationSettings(private_data_dir=private_data_dir, fact_cache="jsonfile")
+    )
+
+    print(f"{'mode':<10}{'hosts':>8}{'first s':>10}{'others s':>10}")
+    for mode in ("per-job", "shared"):
+        kwargs = fact_cache.run_kwargs() if mode == "shared" else {}
+        timings = [
+            time_run(private_data_dir, args.forks, **kwargs) for _ in range(args.runs)
+        ]
+        print(
+            f"{mode:<10}{args.hosts:>8}{timings[0]:>10.2f}"
+            f"{statistics.median(timings[1:]):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
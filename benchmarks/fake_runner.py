@@ -0,0 +1,128 @@
+"""Stand-in for ``ansible_runner.run`` used by the benchmarks.
+
+The behaviour of a fake run is controlled through its extravars so that it can be
+driven through the API and across process boundaries:
+
+* ``fake_duration``: seconds the run takes (default 1.0)
+* ``fake_cpu``: fraction of the duration spent burning CPU in the calling
+  process, mimicking ansible_runner's own output processing (default 0.5)
+* ``fake_hosts``: number of hosts reporting a result per task (default 1)
+* ``fake_tasks``: number of tasks in the fake play (default 1)
+* ``fake_rc``: return code of the run (default 0)
+
+Like the real runner, a run reports a ``playbook_on_start`` event first and,
+unless it was stopped, a ``playbook_on_stats`` event with the outcome of every
+host last. It stops early when its ``cancel_callback`` returns true or it exceeds
+its ``timeout``, both checked between tasks.
+"""
+
+from dataclasses import dataclass, field
+import datetime
+import time
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class FakeRunnerConfig:
+    ident: str
+
+
+@dataclass
+class FakeRunner:
+    config: FakeRunnerConfig
+    status: str = "unstarted"
+    rc: Optional[int] = None
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+def _spend(seconds: float, cpu_fraction: float) -> None:
+    deadline = time.perf_counter() + seconds * cpu_fraction
+    while time.perf_counter() < deadline:
+        pass
+    time.sleep(seconds * (1 - cpu_fraction))
+
+
+def run(**kwargs) -> FakeRunner:  # pylint: disable=too-many-locals
+    extravars = kwargs.get("extravars") or {}
+    duration = float(extravars.get("fake_duration", 1.0))
+    cpu_fraction = float(extravars.get("fake_cpu", 0.5))
+    hosts = int(extravars.get("fake_hosts", 1))
+    tasks = int(extravars.get("fake_tasks", 1))
+    rc = int(extravars.get("fake_rc", 0))
+
+    runner = FakeRunner(FakeRunnerConfig(str(kwargs["ident"])))
+    status_handler = kwargs.get("status_handler")
+    event_handler = kwargs.get("event_handler")
+
+    def set_status(status: str) -> None:
+        runner.status = status
+        if status_handler is not None:
+            status_handler(
+                {"status": status, "runner_ident": runner.config.ident},
+                runner_config=runner.config,
+            )
+
+    set_status("starting")
+    set_status("running")
+
+    cancel_callback = kwargs.get("cancel_callback")
+    timeout = kwargs.get("timeout")
+    start = time.monotonic()
+    final_status = None
+
+    counter = 0
+
+    def emit(event: str, event_data: Dict[str, Any]) -> None:
+        nonlocal counter
+        counter += 1
+        if event_handler is not None:
+            event_handler(
+                {
+                    "uuid": f"{runner.config.ident}-{counter}",
+                    "counter": counter,
+                    "event": event,
+                    "runner_ident": runner.config.ident,
+                    "created": datetime.datetime.utcnow().isoformat(),
+                    "event_data": event_data,
+                }
+            )
+
+    emit("playbook_on_start", {"playbook": kwargs.get("playbook")})
+    step = duration / max(tasks, 1)
+    for task_index in range(tasks):
+        if cancel_callback is not None and cancel_callback():
+            final_status = "canceled"
+        elif timeout and time.monotonic() - start > timeout:
+            final_status = "timeout"
+        if final_status is not None:
+            break
+        _spend(step, cpu_fraction)
+        for host_index in range(hosts):
+            emit(
+                "runner_on_ok",
+                {
+                    "host": f"host{host_index:05d}",
+                    "task": f"task {task_index}",
+                    "play": "fake play",
+                    "playbook": kwargs.get("playbook"),
+                    "res": {"changed": False},
+                },
+            )
+
+    runner.rc = rc
+    host_names = [f"host{index:05d}" for index in range(hosts)]
+    runner.stats = {
+        "ok": {host: tasks for host in host_names},
+        "changed": {},
+        "failures": {} if rc == 0 else {host_names[0]: 1},
+        "dark": {},
+        "skipped": {},
+        "processed": {host: 1 for host in host_names},
+    }
+    if final_status is not None:
+        runner.rc = 254
+        set_status(final_status)
+        return runner
+    emit("playbook_on_stats", runner.stats)
+    set_status("successful" if rc == 0 else "failed")
+    return runner
@@ -0,0 +1,92 @@
+"""Measures polling of finished jobs with and without the job cache.
+
+Run from the repository root::
+
+    python -m benchmarks.job_cache --concurrency 64 --duration 10
+
+Seeds ``--jobs`` finished jobs, then has clients poll ``GET /jobs/{uuid}`` for
+``--polled`` of them, and ``GET /jobs``, in three modes: with the cache off
+(``job_cache_size`` of 0), with the cache on, and with the cache on and clients
+sending the ETags they got in If-None-Match. Reports throughput, latency, and
+the job queries made per request, read from the database helper metrics.
+"""
+
+import argparse
+
+import httpx
+from prometheus_client import REGISTRY
+
+from benchmarks.async_endpoints import seed
+from benchmarks.common import add_load_arguments, make_workdir
+from benchmarks.loadgen import run_load, serve
+
+_QUERIES = {
+    "/jobs/{uuid}": "async_get_ansible_job",
+    "/jobs": "async_get_ansible_jobs",
+}
+
+
+def _queries(operation: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "restful_runner_db_operation_seconds_count", {"operation": operation}
+        )
+        or 0.0
+    )
+
+
+def main() -> None:  # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--polled", type=int, default=20)
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    make_workdir()
+
+    # pylint: disable=import-outside-toplevel
+    from restful_runner import api, cache
+
+    print(
+        f"{'mode':<10}{'endpoint':<16}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'queries/req':>13}"
+    )
+    with serve(api.app) as base_url:
+        runtime = api.app.state.runtime
+        idents = seed(runtime.db, args.jobs)[: args.polled]
+        scenarios = {
+            "/jobs/{uuid}": [f"/jobs/{ident}" for ident in idents],
+            "/jobs": ["/jobs"],
+        }
+        for mode in ("off", "on", "etag"):
+            runtime.job_cache = cache.JobCache(
+                0 if mode == "off" else runtime.settings.job_cache_size
+            )
+            for endpoint, paths in scenarios.items():
+                headers = None
+                if mode == "etag":
+                    etags = [
+                        httpx.get(base_url + path).headers["ETag"] for path in paths
+                    ]
+                    headers = {"If-None-Match": ", ".join(etags)}
+                before = _queries(_QUERIES[endpoint])
+                report = run_load(
+                    base_url,
+                    paths,
+                    args.concurrency,
+                    args.duration,
+                    args.processes,
+                    headers=headers,
+                )
+                queries = (_queries(_QUERIES[endpoint]) - before) / max(
+                    1, report.requests
+                )
+                figures = report.as_dict()
+                print(
+                    f"{mode:<10}{endpoint:<16}{figures['rps']:>10}"
+                    f"{figures['p50_ms']:>10}{figures['p99_ms']:>10}{queries:>13.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compares listing jobs with and without their results.
+
+Run from the repository root::
+
+    python -m benchmarks.job_results --jobs 100 --result-kb 500
+
+Seeds ``--jobs`` jobs that each have a result of about ``--result-kb`` KiB, then
+times ``GET /jobs`` with ``include_result`` on and off, and ``GET
+/jobs/{uuid}/result`` for a single job. Peak memory allocated while serving a
+request is measured with tracemalloc.
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.common import make_workdir
+
+
+def _large_result(size_kb: int):
+    host_count = max(1, size_kb * 1024 // 100)
+    return {
+        "hosts": {
+            f"host{index:06d}.example.com": {"ok": 10, "changed": 2, "failed": 0}
+            for index in range(host_count)
+        }
+    }
+
+
+def _measure(client, path: str, repeat: int):
+    latencies = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(latencies), peak / 1024 / 1024, len(response.content)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--result-kb", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    make_workdir()
+
+    # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient
+
+    from restful_runner import api, database
+
+    with TestClient(api.app) as client:
+        result = _large_result(args.result_kb)
+        with api.app.state.runtime.db.session_local() as session:
+            for index in range(args.jobs):
+                database.create_ansible_job(
+                    session, f"job-{index}", "bench.yml", "bench"
+                )
+                database.update_ansible_job(session, f"job-{index}", result=result)
+
+        scenarios = {
+            "list, include_result": f"/jobs?limit={args.jobs}&include_result=true",
+            "list, summary only": f"/jobs?limit={args.jobs}",
+            "single result stream": "/jobs/job-0/result",
+        }
+        print(f"{'request':<24}{'p50 ms':>10}{'peak MB':>10}{'body KB':>10}")
+        for name, path in scenarios.items():
+            latency, peak, size = _measure(client, path, args.repeat)
+            print(f"{name:<24}{latency:>10.1f}{peak:>10.1f}{size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
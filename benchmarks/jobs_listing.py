@@ -0,0 +1,109 @@
+"""Measures /jobs page latency at depth, OFFSET paging vs keyset paging.
+
+Run from the repository root::
+
+    python -m benchmarks.jobs_listing --rows 1000000
+
+Seeds a SQLite database with ``--rows`` jobs, then times fetching a page of 100
+jobs at increasing depths. "offset" is the previous query (ORDER BY start_time
+with OFFSET), "keyset" and "keyset+status" are ``database.get_ansible_jobs``
+without and with a status filter.
+"""
+
+import argparse
+import datetime
+import functools
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from restful_runner import database
+from restful_runner.data_model import AnsibleJob
+from restful_runner.schema import AnsibleRunnerStatus
+
+_STATUSES = [
+    AnsibleRunnerStatus.SUCCESSFUL,
+    AnsibleRunnerStatus.SUCCESSFUL,
+    AnsibleRunnerStatus.FAILED,
+    AnsibleRunnerStatus.RUNNING,
+]
+
+
+def seed(db: database.DatabaseConnection, rows: int, chunk: int = 50000) -> None:
+    start = datetime.datetime(2022, 1, 1)
+    rng = random.Random(0)
+    with db.session_local() as session:
+        for offset in range(0, rows, chunk):
+            session.execute(
+                insert(AnsibleJob),
+                [
+                    {
+                        "job_uuid": f"job-{index}",
+                        "job_name": f"playbook{rng.randrange(20)}.yml",
+                        "initiator": f"user{rng.randrange(5)}",
+                        "status": rng.choice(_STATUSES),
+                        "start_time": start + datetime.timedelta(seconds=index),
+                    }
+                    for index in range(offset, min(rows, offset + chunk))
+                ],
+            )
+            session.commit()
+
+
+def _time(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    db = database.DatabaseConnection(f"sqlite:///{workdir}/bench.db")
+    database.upgrade_schema(db.get_engine())
+    start = time.perf_counter()
+    seed(db, args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    depths = [depth for depth in (0, 1000, 10000, 100000, 900000) if depth < args.rows]
+    print(f"{'depth':>8}{'offset ms':>12}{'keyset ms':>12}{'keyset+status ms':>18}")
+    with db.session_local() as session:
+        for depth in depths:
+            # Job ids are assigned in insertion order, starting at 1
+            cursor = database.encode_cursor(AnsibleJob(id=args.rows - depth + 1))
+
+            def offset_page(depth=depth):
+                return (
+                    session.query(AnsibleJob)
+                    .order_by(AnsibleJob.start_time.desc())
+                    .offset(depth)
+                    .limit(args.limit)
+                    .all()
+                )
+
+            def keyset_page(cursor=cursor, **filters):
+                return database.get_ansible_jobs(
+                    session, cursor=cursor, limit=args.limit, **filters
+                )
+
+            running = _time(
+                functools.partial(keyset_page, status=AnsibleRunnerStatus.RUNNING)
+            )
+            print(
+                f"{depth:>8}{_time(offset_page):>12.2f}{_time(keyset_page):>12.2f}"
+                f"{running:>18.2f}"
+            )
+            session.expunge_all()
+
+
+if __name__ == "__main__":
+    main()
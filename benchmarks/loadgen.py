@@ -0,0 +1,161 @@
+"""Multi-client HTTP load generator used by the benchmarks.
+
+``serve`` runs an ASGI app with uvicorn in a background thread, ``run_load`` then
+drives it from separate client processes so that the clients don't compete with
+the server for the GIL.
+"""
+
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+import multiprocessing
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+import uvicorn
+
+
+@dataclass
+class LoadReport:
+    requests: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    def percentile(self, fraction: float) -> float:
+        """Returns the given latency percentile in milliseconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests_per_second, 1),
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+        }
+
+    def merge(self, other: "LoadReport") -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.duration = max(self.duration, other.duration)
+        self.latencies.extend(other.latencies)
+
+
+@contextlib.contextmanager
+def serve(app: Any, host: str = "127.0.0.1") -> Iterator[str]:
+    """Serves the app on a free port for the duration of the block."""
+    sock = socket.socket()
+    sock.bind((host, 0))
+    port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(
+        target=server.run, kwargs={"sockets": [sock]}, daemon=True
+    )
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+@dataclass(frozen=True)
+class _Requests:
+    """The requests every client of a load sends."""
+
+    method: str
+    paths: Sequence[str]
+    json_body: Any = None
+    headers: Optional[Dict[str, str]] = None
+
+
+async def _client(
+    client: httpx.AsyncClient,
+    requests: _Requests,
+    offset: int,
+    deadline: float,
+    report: LoadReport,
+) -> None:
+    index = offset
+    while time.perf_counter() < deadline:
+        path = requests.paths[index % len(requests.paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                requests.method,
+                path,
+                json=requests.json_body,
+                headers=requests.headers,
+            )
+            if response.status_code >= 400:
+                report.errors += 1
+        except httpx.HTTPError:
+            report.errors += 1
+        report.latencies.append(time.perf_counter() - start)
+        report.requests += 1
+
+
+async def _run_clients(
+    base_url: str, requests: _Requests, concurrency: int, duration: float
+) -> LoadReport:
+    report = LoadReport(duration=duration)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                _client(client, requests, index, deadline, report)
+                for index in range(concurrency)
+            )
+        )
+    return report
+
+
+def _run_client_process(args) -> LoadReport:
+    return asyncio.run(_run_clients(*args))
+
+
+def run_load(  # pylint: disable=too-many-arguments
+    base_url: str,
+    paths: Sequence[str],
+    concurrency: int = 16,
+    duration: float = 10.0,
+    processes: int = 2,
+    *,
+    method: str = "GET",
+    json_body: Any = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> LoadReport:
+    """Sends requests for ``paths`` round robin from ``concurrency`` clients."""
+    per_process = max(1, concurrency // processes)
+    requests = _Requests(method, list(paths), json_body, headers)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        reports = pool.map(
+            _run_client_process,
+            [(base_url, requests, per_process, duration)] * processes,
+        )
+
+    total = LoadReport()
+    for report in reports:
+        total.merge(report)
+    return total
@@ -0,0 +1,84 @@
+"""Measures the overhead of the metrics instrumentation.
+
+Run from the repository root::
+
+    python -m benchmarks.metrics_overhead
+
+Times each instrumented hot path against the same code without instrumentation:
+an empty function wrapped by ``metrics.timed``, the batched status handler with
+the job timing hooks, and ``database.update_ansible_job`` on a SQLite file.
+"""
+
+import argparse
+import tempfile
+import timeit
+from types import SimpleNamespace
+from typing import cast
+
+from restful_runner import database, metrics, utils, writers
+
+
+class _NullWriter:
+    def update(self, job_uuid, **kwargs):
+        pass
+
+
+def _per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:  # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    def noop():
+        pass
+
+    # Stands in for the StatusWriter, so only the handler itself is timed
+    writer = cast(writers.StatusWriter, _NullWriter())
+    runner_config = SimpleNamespace(ident="bench")
+    status = {"status": "running", "runner_ident": "bench"}
+    metrics.job_submitted("bench", "bench.yml")
+    handler = utils.build_batched_status_handler(writer)
+
+    def plain_handler():
+        writer.update("bench", **utils.status_update_fields(status))
+
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    db = database.DatabaseConnection(f"sqlite:///{workdir}/bench.db")
+    database.upgrade_schema(db.get_engine())
+    session = db.session_local()
+    database.create_ansible_job(session, "bench", "bench.yml", "bench")
+    update = database.update_ansible_job
+    # The function metrics.timed wrapped
+    plain_update = getattr(update, "__wrapped__")
+
+    scenarios = [
+        ("timed no-op", noop, metrics.timed("bench")(noop), args.number),
+        (
+            "status handler",
+            plain_handler,
+            lambda: handler(status, runner_config),
+            args.number // 10,
+        ),
+        (
+            "update_ansible_job",
+            lambda: plain_update(session, "bench", result={"n": 1}),
+            lambda: update(session, "bench", result={"n": 1}),
+            200,
+        ),
+    ]
+    print(f"{'path':<20}{'plain us':>12}{'metrics us':>12}{'overhead us':>13}")
+    for name, plain, instrumented, number in scenarios:
+        plain_us = _per_call_us(plain, number)
+        instrumented_us = _per_call_us(instrumented, number)
+        print(
+            f"{name:<20}{plain_us:>12.2f}{instrumented_us:>12.2f}"
+            f"{instrumented_us - plain_us:>13.2f}"
+        )
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measures the time to the first task with and without a prepared inventory.
+
+Run from the repository root, with ansible installed::
+
+    python -m benchmarks.prepared_inventory --hosts 5000 --source-latency 2
+
+Creates a private data dir whose inventory is a script returning ``--hosts``
+hosts in ``--groups`` groups, with a few variables each. The script waits
+``--source-latency`` seconds first, standing in for the API calls of a cloud
+inventory plugin. "source" runs a playbook
+against that inventory the way ansible_runner does by default, "prepared" against
+the inventory rendered by ``PreparedEnvironment``. A run is canceled as soon as
+its first task starts; the median time from calling ansible_runner to that task
+is reported. The one-off time to render the inventory is printed separately.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+import ansible_runner
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.environments import PreparedEnvironment
+
+_INVENTORY_SCRIPT = """\
+#!/usr/bin/env python3
+import json
+import time
+
+time.sleep({latency})
+hosts = [f"host{{index}}" for index in range({hosts})]
+inventory = {{"_meta": {{"hostvars": {{}}}}}}
+for index, host in enumerate(hosts):
+    group = inventory.setdefault(f"group{{index % {groups}}}", {{"hosts": []}})
+    group["hosts"].append(host)
+    inventory["_meta"]["hostvars"][host] = {{
+        "ansible_connection": "local",
+        "index": index,
+        "rack": f"rack{{index // 40}}",
+    }}
+print(json.dumps(inventory))
+"""
+
+_PLAYBOOK = """\
+- hosts: all
+  gather_facts: false
+  tasks:
+    - debug:
+        msg: "{{ rack }}"
+"""
+
+
+def build_private_data_dir(hosts: int, groups: int, latency: float) -> str:
+    private_data_dir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    os.makedirs(os.path.join(private_data_dir, "inventory"))
+    os.makedirs(os.path.join(private_data_dir, "project"))
+    script = os.path.join(private_data_dir, "inventory", "hosts.py")
+    with open(script, "w", encoding="utf-8") as script_file:
+        script_file.write(
+            _INVENTORY_SCRIPT.format(hosts=hosts, groups=groups, latency=latency)
+        )
+    os.chmod(script, 0o755)
+    playbook = os.path.join(private_data_dir, "project", "bench.yml")
+    with open(playbook, "w", encoding="utf-8") as playbook_file:
+        playbook_file.write(_PLAYBOOK)
+    return private_data_dir
+
+
+def time_to_first_task(private_data_dir: str, **kwargs) -> float:
+    started: List[float] = []
+
+    def event_handler(event):
+        if event.get("event") == "playbook_on_task_start" and not started:
+            started.append(time.perf_counter())
+        return False
+
+    start = time.perf_counter()
+    ansible_runner.run(
+        private_data_dir=private_data_dir,
+        playbook="bench.yml",
+        quiet=True,
+        event_handler=event_handler,
+        cancel_callback=lambda: bool(started),
+        settings={"pexpect_timeout": 0.05},
+        **kwargs,
+    )
+    if not started:
+        raise RuntimeError("The playbook never started a task")
+    return started[0] - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--source-latency", type=float, default=2.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    private_data_dir = build_private_data_dir(
+        args.hosts, args.groups, args.source_latency
+    )
+    environment = PreparedEnvironment(
+        ApplicationSettings(private_data_dir=private_data_dir, prepared_inventory=True)
+    )
+    start = time.perf_counter()
+    environment.refresh()
+    print(f"rendered the inventory in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'mode':<10}{'hosts':>8}{'first task s':>14}")
+    for mode in ("source", "prepared"):
+        kwargs = environment.run_kwargs() if mode == "prepared" else {}
+        timings = [
+            time_to_first_task(private_data_dir, **kwargs) for _ in range(args.runs)
+        ]
+        print(f"{mode:<10}{args.hosts:>8}{statistics.median(timings):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
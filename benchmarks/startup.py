@@ -0,0 +1,150 @@
+"""Measures the import time of the service modules and the cold start of the API.
+
+Run from the repository root::
+
+    python -m benchmarks.startup --runs 10
+
+Every measurement runs in a fresh interpreter, so nothing is imported yet.
+"import" is the time to import a module, on top of the start of the interpreter
+itself, and whether ansible_runner got imported along with it. "cold start" is
+the time from starting uvicorn serving ``restful_runner.api:app`` to the first
+200 response to ``GET /``, with a new SQLite database every run, followed by the
+resident memory of the API process at that point. The median and the slowest of
+``--runs`` runs are reported.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+MODULES = (
+    "restful_runner.config",
+    "restful_runner.schema",
+    "restful_runner.database",
+    "restful_runner.services",
+    "restful_runner.worker",
+    "restful_runner.api",
+)
+
+_IMPORT_SCRIPT = """\
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, "ansible_runner" in sys.modules)
+"""
+
+
+def _environment(workdir: str, name: str) -> Dict[str, str]:
+    # Older versions read the settings and open the database on import
+    return dict(
+        os.environ,
+        DB_URL=f"sqlite:///{workdir}/{name}.db",
+        PRIVATE_DATA_DIR=workdir,
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def time_import(module: str, env: Dict[str, str]) -> Tuple[float, bool]:
+    """Returns the time to import a module, and whether ansible_runner was."""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    ).stdout.split()
+    return float(output[0]), output[1] == "True"
+
+
+def time_cold_start(env: Dict[str, str], timeout: float) -> Tuple[float, float]:
+    """Returns the time to the first response of a new API process, and its RSS."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    with subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+            "restful_runner.api:app",
+        ],
+        env=env,
+    ) as server, httpx.Client(timeout=timeout) as client:
+        # The client is created once, a new client per attempt would compete
+        # with the API for CPU
+        try:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get(url).status_code == 200:
+                        return time.perf_counter() - start, _rss_mb(server.pid)
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError(f"The API exited with {server.returncode}")
+                time.sleep(0.005)
+            raise RuntimeError(f"The API didn't answer within {timeout}s")
+        finally:
+            server.terminate()
+
+
+def _summary(timings: List[float]) -> str:
+    return f"{statistics.median(timings) * 1000:>10.0f}{max(timings) * 1000:>10.0f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    os.makedirs(os.path.join(workdir, "project"))
+
+    print(f"{'import':<28}{'p50 ms':>10}{'max ms':>10}  ansible_runner")
+    for module in MODULES:
+        results = [
+            time_import(module, _environment(workdir, f"{module}-{run}"))
+            for run in range(args.runs)
+        ]
+        print(
+            f"{module:<28}{_summary([timing for timing, _ in results])}"
+            f"  {'yes' if results[0][1] else 'no'}"
+        )
+
+    starts = [
+        time_cold_start(_environment(workdir, f"api-{run}"), args.timeout)
+        for run in range(args.runs)
+    ]
+    print(
+        f"{'cold start':<28}{_summary([timing for timing, _ in starts])}"
+        f"  rss {statistics.median(rss for _, rss in starts):.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
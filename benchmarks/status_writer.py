@@ -0,0 +1,78 @@
+"""Measures committed status updates per second, direct vs batched.
+
+Run from the repository root::
+
+    python -m benchmarks.status_writer --updates 200
+
+For 1, 8 and 32 concurrent jobs, each job thread reports ``--updates`` status
+changes through the status handler. The direct handler opens a session and
+commits once per change; the batched handler goes through ``StatusWriter``. The
+rate is measured until every update has been committed to a SQLite file.
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from restful_runner import database, utils
+from restful_runner.writers import StatusWriter
+
+
+def _run_jobs(handler, jobs: int, updates: int) -> None:
+    def job(index: int) -> None:
+        runner_config = SimpleNamespace(ident=f"job-{index}")
+        for update in range(updates):
+            status = "starting" if update == 0 else "running"
+            handler(
+                {"status": status, "runner_ident": runner_config.ident}, runner_config
+            )
+
+    threads = [threading.Thread(target=job, args=(index,)) for index in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure(mode: str, jobs: int, updates: int) -> float:
+    workdir = tempfile.mkdtemp(prefix="restful-runner-bench-")
+    db = database.DatabaseConnection(f"sqlite:///{workdir}/bench.db")
+    database.upgrade_schema(db.get_engine())
+    with db.session_local() as session:
+        for index in range(jobs):
+            database.create_ansible_job(session, f"job-{index}", "bench.yml", "bench")
+
+    writer = StatusWriter(db.session_local)
+    if mode == "batched":
+        writer.start()
+        handler = utils.build_batched_status_handler(writer)
+    else:
+        handler = utils.build_status_handler(db.session_local)
+
+    start = time.perf_counter()
+    _run_jobs(handler, jobs, updates)
+    if mode == "batched":
+        writer.stop()
+    elapsed = time.perf_counter() - start
+
+    db.get_engine().dispose()
+    return jobs * updates / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print(f"{'jobs':>6}{'direct/s':>12}{'batched/s':>12}")
+    for jobs in args.jobs:
+        direct = measure("direct", jobs, args.updates)
+        batched = measure("batched", jobs, args.updates)
+        print(f"{jobs:>6}{direct:>12.0f}{batched:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Load-test scenarios whose reports can be compared between commits.
+
+Run from the repository root::
+
+    python -m benchmarks.suite --output before.json
+    git checkout my-branch
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Every scenario runs in a fresh process against its own SQLite database. The API
+serves it over HTTP with uvicorn, and ``benchmarks.fake_runner`` replaces
+``ansible_runner.run``:
+
+* ``burst``: clients submit short jobs as fast as they can for ``--duration``
+  seconds. The queue is then left to drain.
+* ``polling``: clients list ``/jobs`` and read single jobs out of
+  ``--seed-jobs`` finished jobs, while ``--jobs`` jobs run.
+* ``long-runs``: ``--jobs`` jobs run through the whole scenario, each reporting
+  ``--hosts`` hosts on ``--tasks`` tasks, while clients read their status.
+
+Each scenario reports request throughput, p50 and p99 latency, failed requests,
+finished jobs per second, and the resident memory of the API process. Memory is
+measured when the scenario starts, at its peak, and when it ends.
+``--compare`` also prints how each figure changed relative to an earlier report,
+marking the figures that got worse with ``!``. Small changes are noise unless
+they show up in several runs.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import make_workdir, rss_mb
+from benchmarks.loadgen import run_load, serve
+
+SCENARIOS = ("burst", "polling", "long-runs")
+
+# Figures of a scenario, and whether a higher value is better
+_FIGURES = {
+    "rps": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "errors": False,
+    "jobs_per_second": True,
+    "rss_start_mb": False,
+    "rss_peak_mb": False,
+    "rss_end_mb": False,
+}
+
+
+def _commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit or None
+
+
+def _prepare(options: Dict[str, Any]) -> None:
+    make_workdir(playbook=True)
+    os.environ["EXECUTION_MODE"] = "local"
+    os.environ["MAX_EXECUTOR_THREADS"] = str(options["workers"])
+    # Submissions are only turned down when the queue is full, which isn't
+    # what is measured here
+    os.environ["MAX_QUEUE_SIZE"] = "1000000"
+
+    # pylint: disable=import-outside-toplevel
+    import ansible_runner
+
+    from benchmarks import fake_runner
+
+    ansible_runner.run = fake_runner.run
+
+
+def _submit(base_url: str, count: int, extravars: Dict[str, Any]) -> List[str]:
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        job_uuids = []
+        for _ in range(count):
+            response = client.post(
+                "/playbooks/bench.yml", json={"extravars": extravars}
+            )
+            response.raise_for_status()
+            job_uuids.append(response.json()["job_uuid"])
+    return job_uuids
+
+
+def _drain(job_scheduler, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = job_scheduler.stats()
+        if stats.queued == 0 and stats.running == 0:
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"Jobs still queued or running after {timeout}s")
+
+
+def run_scenario(  # pylint: disable=too-many-locals
+    name: str, options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Runs one scenario in this process and returns its figures."""
+    _prepare(options)
+
+    # pylint: disable=import-outside-toplevel
+    from benchmarks.async_endpoints import seed
+    from restful_runner import api
+
+    load_options = {
+        "concurrency": options["concurrency"],
+        "duration": options["duration"],
+        "processes": options["processes"],
+    }
+    short_job = {"fake_duration": 0.05, "fake_cpu": 0.1}
+    long_job = {
+        "fake_duration": options["duration"],
+        "fake_hosts": options["hosts"],
+        "fake_tasks": options["tasks"],
+    }
+
+    rss_start = rss_mb()
+    with serve(api.app) as base_url:
+        runtime = api.app.state.runtime
+        start = time.perf_counter()
+        if name == "burst":
+            report = run_load(
+                base_url,
+                ["/playbooks/bench.yml"],
+                method="POST",
+                json_body={"extravars": short_job},
+                **load_options,
+            )
+        elif name == "polling":
+            seeded = seed(runtime.db, options["seed_jobs"])
+            _submit(base_url, options["jobs"], dict(long_job, fake_hosts=1))
+            paths = ["/jobs"] + [f"/jobs/{job_uuid}" for job_uuid in seeded[:100]]
+            report = run_load(base_url, paths, **load_options)
+        elif name == "long-runs":
+            job_uuids = _submit(base_url, options["jobs"], long_job)
+            report = run_load(
+                base_url,
+                [f"/jobs/{job_uuid}" for job_uuid in job_uuids],
+                **load_options,
+            )
+        else:
+            raise ValueError(f"Unknown scenario: {name}")
+        _drain(runtime.job_scheduler, options["drain_timeout"])
+        elapsed = time.perf_counter() - start
+        finished = runtime.job_scheduler.stats().dispatched_total or 0
+
+    return {
+        **report.as_dict(),
+        "jobs": finished,
+        "jobs_per_second": round(finished / elapsed, 1),
+        "rss_start_mb": round(rss_start, 1),
+        # Kilobytes on Linux
+        "rss_peak_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "rss_end_mb": round(rss_mb(), 1),
+    }
+
+
+def _run_in_process(name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.suite",
+            "--run-scenario",
+            name,
+            "--options",
+            json.dumps(options),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def print_report(
+    report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None
+) -> None:
+    print(
+        f"{'scenario':<12}{'figure':<18}{'value':>12}"
+        + (f"{'baseline':>12}{'change':>10}" if baseline else "")
+    )
+    for name, figures in report["scenarios"].items():
+        previous = (baseline or {}).get("scenarios", {}).get(name, {})
+        for figure, higher_is_better in _FIGURES.items():
+            line = f"{name:<12}{figure:<18}{figures[figure]:>12}"
+            if baseline:
+                old = previous.get(figure)
+                change = ""
+                if old:
+                    ratio = (figures[figure] - old) / old
+                    better = (ratio > 0) == higher_is_better
+                    change = f"{ratio:+.1%}{'' if ratio == 0 or better else ' !'}"
+                line += f"{'' if old is None else old:>12}{change:>10}"
+            print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--seed-jobs", type=int, default=10000)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="file to write the report to, as JSON")
+    parser.add_argument("--compare", help="report of an earlier run to compare with")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(args.run_scenario, json.loads(args.options))))
+        return
+
+    options = {
+        key: getattr(args, key)
+        for key in (
+            "duration",
+            "concurrency",
+            "processes",
+            "workers",
+            "jobs",
+            "seed_jobs",
+            "hosts",
+            "tasks",
+            "drain_timeout",
+        )
+    }
+    report = {
+        "commit": _commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "options": options,
+        "scenarios": {name: _run_in_process(name, options) for name in args.scenarios},
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("options") != options:
+            print("warning: the baseline was run with other options", file=sys.stderr)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,870 @@
-from concurrent.futures import ThreadPoolExecutor
-import os
-import os.path
-from typing import Generator, List
+import contextlib
+import datetime
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import uuid
 
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    FastAPI,
+    HTTPException,
+    Depends,
+    Header,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
+import prometheus_client
+from prometheus_client.exposition import choose_encoder
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from restful_runner import database, config, data_model, services, utils
-from restful_runner.schema import AnsibleJob, StartPlaybookRequest
+from restful_runner import (
+    cache,
+    database,
+    config,
+    facts,
+    metrics,
+    results,
+    scheduler,
+    schedules,
+    streams,
+    utils,
+)
+from restful_runner.runtime import Runtime, get_runtime, get_session
+from restful_runner.schema import (
+    TERMINAL_STATUSES,
+    AnsibleJob,
+    AnsibleRunnerStatus,
+    BatchJobSubmission,
+    BatchSubmitRequest,
+    CachedHost,
+    FactsRequest,
+    HostResults,
+    JobEvent,
+    JobEventFilter,
+    JobFilter,
+    JobLookupRequest,
+    JobLookupResponse,
+    OverlapPolicy,
+    PlaybookInfo,
+    QueueStats,
+    ResultSummary,
+    ScheduleInfo,
+    ScheduleRequest,
+    StartPlaybookRequest,
+)
 
 
-# ===== Get the settings and initialize everything =====
-settings = config.get_app_settings()
+# Endpoints get their parameters and dependencies as arguments, those that take
+# many of them disable too-many-arguments
+router = APIRouter()
 
-db = database.DatabaseConnection(settings.db_url)
-data_model.Base.metadata.create_all(bind=db.get_engine())
 
+@router.get("/")
+async def get_root():
+    return "OK"
 
-def get_session() -> Generator[Session, None, None]:
-    session = db.session_local()
-    try:
-        yield session
-    finally:
-        session.close()
 
+def _not_modified(etag: str, if_none_match: Optional[str]) -> bool:
+    return if_none_match is not None and etag in (
+        tag.strip() for tag in if_none_match.split(",")
+    )
 
-executor = ThreadPoolExecutor(max_workers=settings.max_executor_threads)
-executor_service = services.PlaybookExecutorService(
-    executor, utils.build_status_handler(db.session_local)
-)
 
+@router.get("/playbooks", response_model=List[str])
+async def get_playbooks(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Lists the playbooks in the project directory, including subdirectories."""
+    etag = runtime.playbook_catalog.etag
+    if _not_modified(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return runtime.playbook_catalog.playbooks()
 
-app = FastAPI()
 
+@router.get("/playbooks/{playbook:path}", response_model=PlaybookInfo)
+def get_playbook(
+    playbook: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    runtime: Runtime = Depends(get_runtime),
+):
+    entry = runtime.playbook_catalog.get(playbook)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Playbook not found")
+    if _not_modified(entry.etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": entry.etag})
 
-@app.get("/")
-def get_root():
-    return "OK"
+    # Reads the playbook the first time, which is why this endpoint is not async
+    details = runtime.playbook_catalog.details(entry)
+    response.headers["ETag"] = entry.etag
+    return PlaybookInfo(
+        name=entry.path,
+        mtime=datetime.datetime.fromtimestamp(entry.mtime),
+        size=entry.size,
+        **details,
+    )
 
 
-@app.get("/playbooks", response_model=List[str])
-def get_playbooks():
-    if settings.project_dir is None:
-        project_dir = os.path.join(settings.private_data_dir, "project")
-    else:
-        project_dir = settings.project_dir
+def _replay(job, request_hash: str):
+    if job.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    return job, True
 
-    filenames = os.listdir(project_dir)
-    playbooks = [
-        name for name in filenames if os.path.splitext(name)[1] in (".yml", ".yaml")
-    ]
-    return playbooks
+
+@router.post("/playbooks/{playbook:path}", response_model=AnsibleJob)
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+async def start_playbook(
+    playbook: str,
+    request_data: StartPlaybookRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Starts a playbook, or returns the job an identical earlier request started.
+
+    A request with the Idempotency-Key of an earlier request returns the job of
+    that request. A request with ``coalesce`` set returns the queued or running
+    job with the same playbook, extravars and tags, if there is one.
+    """
+    job, replayed = await _launch(
+        runtime, session, playbook, request_data, idempotency_key
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return job
+
+
+async def _launch(
+    runtime: Runtime,
+    session: AsyncSession,
+    playbook: str,
+    request_data: StartPlaybookRequest,
+    idempotency_key: Optional[str],
+):
+    """Starts a playbook, returns its job and whether it was an earlier one."""
+    if playbook not in runtime.playbook_catalog:
+        raise HTTPException(status_code=404, detail="Playbook not found")
+
+    request_hash = utils.request_hash(
+        playbook, request_data.extravars, request_data.tags
+    )
+    if idempotency_key is not None:
+        job = await database.async_get_ansible_job_by_idempotency_key(
+            session, idempotency_key
+        )
+        if job is not None:
+            return _replay(job, request_hash)
+
+    if not request_data.coalesce:
+        return await _create_job(
+            runtime,
+            session,
+            playbook,
+            request_data,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash,
+        )
+    async with runtime.coalesce_lock:
+        job = await database.async_get_in_flight_ansible_job(session, request_hash)
+        if job is not None:
+            return job, True
+        return await _create_job(
+            runtime,
+            session,
+            playbook,
+            request_data,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash,
+        )
 
 
-@app.post("/playbooks/{playbook}", response_model=AnsibleJob)
-def start_playbook(
+async def _create_job(  # pylint: disable=too-many-arguments
+    runtime: Runtime,
+    session: AsyncSession,
     playbook: str,
     request_data: StartPlaybookRequest,
-    session: Session = Depends(get_session),
+    *,
+    idempotency_key: Optional[str],
+    request_hash: str,
 ):
+    settings = runtime.settings
     ident = str(uuid.uuid1())
-    database.create_ansible_job(session, ident, playbook, "REST")
-    executor_service.submit_job(
-        ident, playbook, request_data.extravars, request_data.tags
+    if settings.execution_mode == "distributed":
+        # Workers pick the job up from the database
+        waiting = await database.async_count_ansible_jobs_with_status(
+            session, AnsibleRunnerStatus.CREATED
+        )
+        if waiting >= settings.max_queue_size:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Queue is full ({settings.max_queue_size} jobs are waiting)",
+                headers={"Retry-After": str(round(settings.worker_poll_seconds))},
+            )
+        status = AnsibleRunnerStatus.CREATED
+    else:
+        status = AnsibleRunnerStatus.QUEUED
+
+    try:
+        job = await database.async_create_ansible_job(
+            session,
+            ident,
+            playbook,
+            request_data.initiator,
+            status=status,
+            priority=request_data.priority,
+            extravars=request_data.extravars,
+            tags=request_data.tags,
+            timeout=request_data.timeout,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash,
+        )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        # A concurrent request with the same key created its job first
+        await session.rollback()
+        existing = await database.async_get_ansible_job_by_idempotency_key(
+            session, idempotency_key
+        )
+        if existing is None:
+            raise
+        return _replay(existing, request_hash)
+    if settings.execution_mode == "distributed":
+        return job, False
+
+    metrics.job_created(ident)
+    try:
+        runtime.job_scheduler.submit(
+            ident,
+            playbook,
+            request_data.initiator,
+            priority=request_data.priority,
+            extravars=request_data.extravars,
+            tags=request_data.tags,
+            timeout=request_data.timeout,
+        )
+    except scheduler.AdmissionError as exc:
+        metrics.job_done(ident)
+        await database.async_delete_ansible_job(session, ident)
+        status_code = 429 if isinstance(exc, scheduler.InitiatorQueueFullError) else 503
+        retry_after = max(
+            1, round(runtime.job_scheduler.stats().average_wait_seconds or 0)
+        )
+        raise HTTPException(
+            status_code=status_code,
+            detail=str(exc),
+            headers={"Retry-After": str(retry_after)},
+        ) from exc
+
+    return job, False
+
+
+@router.get("/metrics")
+def get_metrics(accept: str = Header("")):
+    """Serves the metrics in the Prometheus or OpenMetrics text format."""
+    encoder, content_type = choose_encoder(accept)
+    return Response(
+        encoder(prometheus_client.REGISTRY), headers={"Content-Type": content_type}
     )
-    return database.get_ansible_job(session, ident)
 
 
-@app.get("/jobs", response_model=List[AnsibleJob])
-def get_jobs(
-    session: Session = Depends(get_session),
+@router.get("/queue", response_model=QueueStats)
+async def get_queue_stats(
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
 ):
-    return database.get_ansible_jobs(session)
+    if runtime.settings.execution_mode != "distributed":
+        return runtime.job_scheduler.stats()
+
+    counts = await database.async_count_ansible_jobs_by_status(session)
+    queued_per_playbook, oldest = await database.async_get_waiting_ansible_job_stats(
+        session
+    )
+    oldest_wait = datetime.datetime.now() - oldest if oldest else datetime.timedelta()
+    return QueueStats(
+        queued=sum(queued_per_playbook.values()),
+        running=counts.get(AnsibleRunnerStatus.STARTING, 0)
+        + counts.get(AnsibleRunnerStatus.RUNNING, 0),
+        max_queue_size=runtime.settings.max_queue_size,
+        queued_per_playbook=queued_per_playbook,
+        oldest_wait_seconds=oldest_wait.total_seconds(),
+    )
+
+
+@router.get("/events", response_model=List[JobEvent])
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+async def get_job_events(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: JobEventFilter = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    """Lists the outcomes of tasks on hosts across jobs, newest first."""
+    try:
+        job_events = await database.async_get_ansible_job_events(
+            session, cursor=cursor, limit=limit, **filters.dict()
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    _set_next_page_headers(request, response, job_events, limit)
+    return job_events
+
+
+def _aggregate_results(
+    runtime: Runtime,
+    playbook: Optional[str],
+    ended_after: Optional[datetime.datetime],
+    ended_before: Optional[datetime.datetime],
+) -> Tuple[ResultSummary, List[HostResults]]:
+    if ended_after is None:
+        # Every result in the period is read and decoded, so it is always bounded
+        ended_after = (ended_before or datetime.datetime.now()) - datetime.timedelta(
+            days=runtime.settings.results_window_days
+        )
+    with runtime.db.session_local() as session:
+        return results.aggregate_results(
+            database.iter_ansible_job_results(
+                session,
+                job_name=playbook,
+                ended_after=ended_after,
+                ended_before=ended_before,
+            )
+        )
+
+
+@router.get("/results/summary", response_model=ResultSummary)
+def get_result_summary(
+    playbook: Optional[str] = None,
+    ended_after: Optional[datetime.datetime] = None,
+    ended_before: Optional[datetime.datetime] = None,
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Sums up the results of the jobs that finished in a period."""
+    return _aggregate_results(runtime, playbook, ended_after, ended_before)[0]
+
+
+@router.get("/results/hosts", response_model=List[HostResults])
+def get_host_results(
+    playbook: Optional[str] = None,
+    ended_after: Optional[datetime.datetime] = None,
+    ended_before: Optional[datetime.datetime] = None,
+    failed: Optional[bool] = None,
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Sums up the results of every host over the jobs that finished in a period.
+
+    With ``failed`` set, only the hosts that had failed or unreachable tasks, or
+    only those that didn't, are listed.
+    """
+    hosts = _aggregate_results(runtime, playbook, ended_after, ended_before)[1]
+    if failed is None:
+        return hosts
+    return [host for host in hosts if bool(host.failed or host.unreachable) == failed]
+
+
+def _fact_cache(runtime: Runtime) -> facts.FactCache:
+    if runtime.environment.fact_cache is None:
+        raise HTTPException(status_code=501, detail="The fact cache is not enabled")
+    return runtime.environment.fact_cache
+
+
+@router.get("/facts", response_model=List[CachedHost])
+def get_cached_hosts(runtime: Runtime = Depends(get_runtime)):
+    """Lists the hosts with cached facts."""
+    return _fact_cache(runtime).hosts()
+
+
+@router.get("/facts/{host}")
+def get_host_facts(host: str, runtime: Runtime = Depends(get_runtime)):
+    try:
+        host_facts = _fact_cache(runtime).get(host)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if host_facts is None:
+        raise HTTPException(status_code=404, detail="No cached facts for the host")
+    return host_facts
+
+
+@router.delete("/facts/{host}", status_code=204)
+def invalidate_host_facts(host: str, runtime: Runtime = Depends(get_runtime)):
+    try:
+        found = _fact_cache(runtime).invalidate_host(host)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not found:
+        raise HTTPException(status_code=404, detail="No cached facts for the host")
+
+
+@router.post("/facts:prefetch")
+def prefetch_facts(request_data: FactsRequest, runtime: Runtime = Depends(get_runtime)):
+    """Gathers the facts of the hosts matching a pattern, returns the summary."""
+    return _fact_cache(runtime).prefetch(
+        request_data.pattern, runtime.environment.run_kwargs()
+    )
+
+
+@router.post("/facts:invalidate", response_model=List[str])
+def invalidate_facts(
+    request_data: FactsRequest, runtime: Runtime = Depends(get_runtime)
+):
+    """Deletes the cached facts of the hosts matching a pattern, returns them."""
+    return _fact_cache(runtime).invalidate(
+        request_data.pattern, runtime.environment.run_kwargs()
+    )
+
+
+async def _launch_scheduled(
+    runtime: Runtime, entry: schedules.ScheduleEntry, run_time: datetime.datetime
+) -> str:
+    request_data = StartPlaybookRequest(
+        extravars=entry.extravars,
+        tags=entry.tags,
+        priority=entry.priority,
+        initiator=entry.initiator,
+        timeout=entry.timeout,
+        coalesce=entry.overlap == OverlapPolicy.COALESCE,
+    )
+    # The key makes every run start once, however many API nodes launch it
+    idempotency_key = f"schedule:{entry.name}:{run_time.isoformat()}"
+    async with runtime.db.async_session_local() as session:
+        job, _ = await _launch(
+            runtime, session, entry.playbook, request_data, idempotency_key
+        )
+    return job.job_uuid
+
 
+@router.get("/schedules", response_model=List[ScheduleInfo])
+async def get_schedules(session: AsyncSession = Depends(get_session)):
+    return await database.async_get_schedules(session)
 
-@app.get("/jobs/{job_uuid}", response_model=AnsibleJob)
-def get_job_by_uuid(
+
+@router.get("/schedules/{name}", response_model=ScheduleInfo)
+async def get_schedule(name: str, session: AsyncSession = Depends(get_session)):
+    schedule = await database.async_get_schedule(session, name)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule
+
+
+@router.put("/schedules/{name}", response_model=ScheduleInfo)
+async def put_schedule(
+    name: str,
+    request_data: ScheduleRequest,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Creates a schedule, or replaces it, counting its runs from now on."""
+    if request_data.playbook not in runtime.playbook_catalog:
+        raise HTTPException(status_code=404, detail="Playbook not found")
+    now = time.time()
+    try:
+        next_run = schedules.next_run(
+            request_data.cron, request_data.interval_seconds, now
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+    schedule, created = await database.async_put_schedule(
+        session, name, next_run=next_run, **request_data.dict()
+    )
+    if created:
+        response.status_code = 201
+    if schedule.enabled:
+        runtime.schedule_runner.put(schedules.ScheduleEntry.from_row(schedule, now))
+    else:
+        runtime.schedule_runner.remove(schedule.id)
+    return schedule
+
+
+@router.delete("/schedules/{name}", status_code=204)
+async def delete_schedule(
+    name: str,
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    schedule_id = await database.async_delete_schedule(session, name)
+    if schedule_id is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    runtime.schedule_runner.remove(schedule_id)
+
+
+# Finished jobs don't change, clients may keep them for a day
+_FINAL_JOB_CACHE_CONTROL = "max-age=86400, immutable"
+
+
+def _is_final(runtime: Runtime, job, with_result: bool) -> bool:
+    # Workers write the results, out of reach of the cache invalidations
+    return cache.is_final(
+        job,
+        with_result,
+        require_result=runtime.settings.execution_mode == "distributed",
+    )
+
+
+def _serialize_job(
+    runtime: Runtime, job, with_result: bool, generation: int
+) -> cache.CachedJob:
+    """Returns the JSON of a job, from the job cache if it is there."""
+    entry = runtime.job_cache.get(job.job_uuid, with_result)
+    if entry is None:
+        entry = cache.serialize_job(job)
+        if _is_final(runtime, job, with_result):
+            runtime.job_cache.put(job.job_uuid, with_result, entry, generation)
+    return entry
+
+
+@router.get("/jobs", response_model=List[AnsibleJob])
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+async def get_jobs(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: JobFilter = Depends(),
+    include_result: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Lists jobs, newest first, a page of ``limit`` jobs at a time.
+
+    The JSON of the finished jobs comes from the job cache. The page has an
+    ETag, a request with a matching If-None-Match gets a 304.
+    """
+    generation = runtime.job_cache.generation()
+    try:
+        jobs = await database.async_get_ansible_jobs(
+            session,
+            cursor=cursor,
+            limit=limit,
+            include_result=include_result,
+            **filters.dict(),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    serialized = [
+        _serialize_job(runtime, job, include_result, generation) for job in jobs
+    ]
+    body = b"[" + b",".join(entry.body for entry in serialized) + b"]"
+    etag = cache.body_etag(body)
+    if _not_modified(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+    response = Response(body, media_type="application/json", headers={"ETag": etag})
+    _set_next_page_headers(request, response, jobs, limit)
+    return response
+
+
+def _set_next_page_headers(
+    request: Request, response: Response, rows: List, limit: int
+) -> None:
+    """Points to the next page of a listing when the current one is full."""
+    if len(rows) == limit:
+        next_cursor = database.encode_cursor(rows[-1])
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+@router.post("/jobs:batch", response_model=List[AnsibleJob])
+async def submit_jobs(
+    request_data: BatchSubmitRequest,
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Starts several playbooks, returning their jobs in the order submitted.
+
+    Every submission is handled like a request to start_playbook, but the new
+    jobs are created in one transaction and admitted to the queue all together
+    or not at all.
+    """
+    submissions = request_data.jobs
+    _check_batch(runtime, submissions)
+    hashes = [
+        utils.request_hash(sub.playbook, sub.extravars, sub.tags) for sub in submissions
+    ]
+    replayed, in_flight = await _find_batch_jobs(session, submissions, hashes)
+
+    existing = {job.job_uuid: job for job in [*replayed.values(), *in_flight.values()]}
+    in_flight_uuids = {
+        request_hash: job.job_uuid for request_hash, job in in_flight.items()
+    }
+    job_uuids: List[str] = []
+    new_jobs: List[Dict[str, Any]] = []
+    for sub, request_hash in zip(submissions, hashes):
+        job = replayed.get(sub.idempotency_key) if sub.idempotency_key else None
+        if job is not None:
+            if job.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Idempotency-Key {sub.idempotency_key} was already used "
+                    "for a different request",
+                )
+            job_uuids.append(job.job_uuid)
+            continue
+        if sub.coalesce and request_hash in in_flight_uuids:
+            job_uuids.append(in_flight_uuids[request_hash])
+            continue
+
+        new_job = _new_batch_job(runtime, sub, request_hash)
+        new_jobs.append(new_job)
+        job_uuids.append(new_job["job_uuid"])
+        # Later identical submissions of the batch may attach to this job
+        in_flight_uuids[request_hash] = new_job["job_uuid"]
+
+    if new_jobs:
+        existing.update(await _create_jobs(runtime, session, new_jobs))
+    return [existing[job_uuid] for job_uuid in job_uuids]
+
+
+def _check_batch(runtime: Runtime, submissions: List[BatchJobSubmission]) -> None:
+    unknown = sorted(
+        {
+            sub.playbook
+            for sub in submissions
+            if sub.playbook not in runtime.playbook_catalog
+        }
+    )
+    if unknown:
+        raise HTTPException(
+            status_code=404, detail=f"Playbooks not found: {', '.join(unknown)}"
+        )
+    keys = [sub.idempotency_key for sub in submissions if sub.idempotency_key]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(
+            status_code=422, detail="Idempotency keys must be unique in a batch"
+        )
+
+
+async def _find_batch_jobs(
+    session: AsyncSession, submissions: List[BatchJobSubmission], hashes: List[str]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Returns the earlier jobs of a batch, by idempotency key and request hash.
+
+    Only the submissions with ``coalesce`` set look for in-flight jobs.
+    """
+    keys = [sub.idempotency_key for sub in submissions if sub.idempotency_key]
+    replayed = {}
+    if keys:
+        replayed = await database.async_get_ansible_jobs_by_idempotency_key(
+            session, keys
+        )
+    coalesced = {sub_hash for sub, sub_hash in zip(submissions, hashes) if sub.coalesce}
+    in_flight = {}
+    if coalesced:
+        in_flight = await database.async_get_in_flight_ansible_jobs(
+            session, list(coalesced)
+        )
+    return replayed, in_flight
+
+
+def _new_batch_job(
+    runtime: Runtime, sub: BatchJobSubmission, request_hash: str
+) -> Dict[str, Any]:
+    """Returns the columns of the job a submission creates."""
+    distributed = runtime.settings.execution_mode == "distributed"
+    return {
+        "job_uuid": str(uuid.uuid1()),
+        "job_name": sub.playbook,
+        "initiator": sub.initiator,
+        "status": (
+            AnsibleRunnerStatus.CREATED if distributed else AnsibleRunnerStatus.QUEUED
+        ),
+        "priority": sub.priority,
+        "extravars": sub.extravars,
+        "tags": sub.tags,
+        "timeout": sub.timeout,
+        "idempotency_key": sub.idempotency_key,
+        "request_hash": request_hash,
+    }
+
+
+async def _create_jobs(
+    runtime: Runtime, session: AsyncSession, new_jobs: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    settings = runtime.settings
+    if settings.execution_mode == "distributed":
+        waiting = await database.async_count_ansible_jobs_with_status(
+            session, AnsibleRunnerStatus.CREATED
+        )
+        if waiting + len(new_jobs) > settings.max_queue_size:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Queue is full ({settings.max_queue_size} jobs are waiting)",
+                headers={"Retry-After": str(round(settings.worker_poll_seconds))},
+            )
+
+    try:
+        created = await database.async_create_ansible_jobs(session, new_jobs)
+    except IntegrityError as exc:
+        await session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="A concurrent request used one of the idempotency keys, "
+            "retry the batch",
+        ) from exc
+    if settings.execution_mode == "distributed":
+        return {job.job_uuid: job for job in created}
+
+    for job in new_jobs:
+        metrics.job_created(job["job_uuid"])
+    try:
+        runtime.job_scheduler.submit_many(
+            [
+                {
+                    "ident": job["job_uuid"],
+                    "playbook": job["job_name"],
+                    "initiator": job["initiator"],
+                    "priority": job["priority"],
+                    "extravars": job["extravars"],
+                    "tags": job["tags"],
+                    "timeout": job["timeout"],
+                }
+                for job in new_jobs
+            ]
+        )
+    except scheduler.AdmissionError as exc:
+        for job in new_jobs:
+            metrics.job_done(job["job_uuid"])
+        await database.async_delete_ansible_jobs(
+            session, [job["job_uuid"] for job in new_jobs]
+        )
+        status_code = 429 if isinstance(exc, scheduler.InitiatorQueueFullError) else 503
+        retry_after = max(
+            1, round(runtime.job_scheduler.stats().average_wait_seconds or 0)
+        )
+        raise HTTPException(
+            status_code=status_code,
+            detail=str(exc),
+            headers={"Retry-After": str(retry_after)},
+        ) from exc
+
+    return {job.job_uuid: job for job in created}
+
+
+@router.post("/jobs:lookup", response_model=JobLookupResponse)
+async def lookup_jobs(
+    request_data: JobLookupRequest,
+    include_result: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """Returns several jobs by UUID with a single query."""
+    job_uuids = list(dict.fromkeys(request_data.job_uuids))
+    jobs = await database.async_get_ansible_jobs_by_uuid(
+        session, job_uuids, include_result=include_result
+    )
+    found = {job.job_uuid: job for job in jobs}
+    return JobLookupResponse(
+        jobs=[found[job_uuid] for job_uuid in job_uuids if job_uuid in found],
+        missing=[job_uuid for job_uuid in job_uuids if job_uuid not in found],
+    )
+
+
+@router.get("/jobs/{job_uuid}", response_model=AnsibleJob)
+async def get_job_by_uuid(
     job_uuid: str,
-    session: Session = Depends(get_session),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
 ):
-    job = database.get_ansible_job(session, job_uuid)
+    """Returns a job, from the job cache once it has finished.
+
+    The response has an ETag, a request with a matching If-None-Match gets a
+    304. Finished jobs also have a Last-Modified header and may be cached by
+    clients.
+    """
+    entry = runtime.job_cache.get(job_uuid, True)
+    final = entry is not None
+    if entry is None:
+        generation = runtime.job_cache.generation()
+        job = await database.async_get_ansible_job(session, job_uuid)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        final = _is_final(runtime, job, True)
+        entry = _serialize_job(runtime, job, True, generation)
+
+    headers = {"ETag": entry.etag}
+    if final:
+        headers["Cache-Control"] = _FINAL_JOB_CACHE_CONTROL
+        if entry.last_modified is not None:
+            headers["Last-Modified"] = entry.last_modified
+    else:
+        headers["Cache-Control"] = "no-cache"
+    if _not_modified(entry.etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+@router.post("/jobs/{job_uuid}/cancel", response_model=AnsibleJob, status_code=202)
+@router.delete("/jobs/{job_uuid}", response_model=AnsibleJob, status_code=202)
+async def cancel_job(
+    job_uuid: str,
+    session: AsyncSession = Depends(get_session),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Cancels a job. Queued jobs are dropped, running jobs are stopped."""
+    job = await database.async_get_ansible_job(session, job_uuid)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail="Job has already finished")
+
+    if runtime.settings.execution_mode == "distributed":
+        await database.async_request_ansible_job_cancel(session, job_uuid)
+    else:
+        # The done listeners of a job canceled before it started run right away
+        found = await run_in_threadpool(runtime.job_scheduler.cancel, job_uuid)
+        if not found:
+            # Left over from before a restart, nothing will run it
+            await database.async_update_ansible_job(
+                session,
+                job_uuid,
+                status=AnsibleRunnerStatus.CANCELED,
+                end_time=datetime.datetime.now(),
+            )
+        elif runtime.settings.status_writer_batching:
+            await run_in_threadpool(runtime.status_writer.flush, 1.0)
+
+    await session.refresh(job)
     return job
+
+
+def create_app(settings: Optional[config.ApplicationSettings] = None) -> FastAPI:
+    """Creates the API application.
+
+    Creating it is cheap, its ``Runtime`` is only created when it starts, from
+    ``settings`` or else from those of the environment, and stopped when it shuts
+    down. The runtime is in the ``runtime`` attribute of ``app.state`` meanwhile.
+    """
+
+    @contextlib.asynccontextmanager
+    async def lifespan(application: FastAPI) -> AsyncIterator[None]:
+        runtime = Runtime(settings or config.get_app_settings(), _launch_scheduled)
+        runtime.start()
+        application.state.runtime = runtime
+        try:
+            yield
+        finally:
+            await runtime.stop()
+
+    application = FastAPI(lifespan=lifespan)
+    application.include_router(router)
+    application.include_router(streams.router)
+    return application
+
+
+# Served by uvicorn, see the Dockerfile
+app = create_app()
@@ -0,0 +1,185 @@
+"""Access to the artifacts ansible_runner writes for every job.
+
+The artifacts of a job are first written to ``<artifact_dir>/<job_uuid>/``. Once
+the job has finished, the retention engine may replace that directory with a
+single ``<artifact_dir>/<job_uuid>.zip`` archive. The helpers here read
+artifacts from either form.
+"""
+import os
+import shutil
+import time
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import zipfile
+
+from restful_runner.config import ApplicationSettings
+
+
+ARCHIVE_SUFFIX = ".zip"
+# Output of the playbook, written by ansible_runner while the job runs
+STDOUT = "stdout"
+
+# File written by ansible_runner once a job has finished
+_STATUS_FILE = "status"
+
+
+def artifact_root(settings: ApplicationSettings) -> str:
+    if settings.artifact_dir is None:
+        return os.path.join(settings.private_data_dir, "artifacts")
+    return settings.artifact_dir
+
+
+def _job_path(settings: ApplicationSettings, job_uuid: str, suffix: str = "") -> str:
+    # Job UUIDs come from URLs, only a plain file name stays in the artifact root
+    if job_uuid in ("", ".", "..") or os.path.basename(job_uuid) != job_uuid:
+        raise FileNotFoundError(job_uuid)
+    root = artifact_root(settings)
+    path = os.path.join(root, job_uuid + suffix)
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([real_root, os.path.realpath(path)]) != real_root:
+        raise FileNotFoundError(job_uuid)
+    return path
+
+
+def artifact_path(settings: ApplicationSettings, job_uuid: str) -> str:
+    """Returns the directory the artifacts of a running job are written to.
+
+    Raises FileNotFoundError when the job UUID would name a path outside of the
+    artifact directory.
+    """
+    return _job_path(settings, job_uuid)
+
+
+def archive_path(settings: ApplicationSettings, job_uuid: str) -> str:
+    """Returns the archive of the artifacts of a job, see artifact_path."""
+    return _job_path(settings, job_uuid, ARCHIVE_SUFFIX)
+
+
+def is_finished(directory: str) -> bool:
+    """Returns whether ansible_runner is done writing to an artifact directory."""
+    return os.path.isfile(os.path.join(directory, _STATUS_FILE))
+
+
+def final_status(
+    settings: ApplicationSettings, job_uuid: str
+) -> Optional[Tuple[str, float]]:
+    """Returns the status ansible_runner wrote when a job finished, and when.
+
+    The time is a time.time() timestamp. Returns None when the job has no
+    artifacts or didn't finish.
+    """
+    directory = artifact_path(settings, job_uuid)
+    if os.path.isdir(directory):
+        path = os.path.join(directory, _STATUS_FILE)
+        try:
+            with open(path, encoding="utf-8") as status_file:
+                return status_file.read().strip(), os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+
+    try:
+        with zipfile.ZipFile(archive_path(settings, job_uuid)) as zip_file:
+            info = zip_file.getinfo(_STATUS_FILE)
+            status = zip_file.read(info).decode("utf-8").strip()
+    except (FileNotFoundError, KeyError):
+        return None
+    return status, time.mktime(info.date_time + (0, 0, -1))
+
+
+def compress(directory: str, archive: str) -> None:
+    """Replaces an artifact directory with a zip archive of its files."""
+    partial = archive + ".partial"
+    with zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for parent, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(parent, filename)
+                zip_file.write(path, os.path.relpath(path, directory))
+    # The archive only appears once it is complete
+    os.replace(partial, archive)
+    shutil.rmtree(directory)
+
+
+def _check_name(name: str) -> str:
+    normalized = os.path.normpath(name)
+    if os.path.isabs(normalized) or normalized.split(os.sep)[0] == "..":
+        raise FileNotFoundError(name)
+    return normalized.replace(os.sep, "/")
+
+
+def list_artifacts(settings: ApplicationSettings, job_uuid: str) -> List[str]:
+    """Returns the names of the artifacts of a job, relative to its directory.
+
+    Raises FileNotFoundError when the job has no artifacts.
+    """
+    directory = artifact_path(settings, job_uuid)
+    if os.path.isdir(directory):
+        return sorted(
+            os.path.relpath(os.path.join(parent, filename), directory).replace(
+                os.sep, "/"
+            )
+            for parent, _, filenames in os.walk(directory)
+            for filename in filenames
+        )
+    with zipfile.ZipFile(archive_path(settings, job_uuid)) as zip_file:
+        return sorted(
+            info.filename for info in zip_file.infolist() if not info.is_dir()
+        )
+
+
+def open_artifact(settings: ApplicationSettings, job_uuid: str, name: str) -> BinaryIO:
+    """Opens an artifact of a job for reading, from its directory or archive.
+
+    Raises FileNotFoundError when the job or the artifact doesn't exist.
+    """
+    name = _check_name(name)
+    directory = artifact_path(settings, job_uuid)
+    if os.path.isdir(directory):
+        return open(os.path.join(directory, name), "rb")
+
+    # The member stays readable, the archive is closed along with it
+    with zipfile.ZipFile(archive_path(settings, job_uuid)) as zip_file:
+        try:
+            return zip_file.open(name)  # type: ignore[return-value]
+        except KeyError as exc:
+            raise FileNotFoundError(name) from exc
+
+
+def artifact_size(settings: ApplicationSettings, job_uuid: str, name: str) -> int:
+    """Returns the size of an artifact in bytes, see open_artifact."""
+    name = _check_name(name)
+    directory = artifact_path(settings, job_uuid)
+    if os.path.isdir(directory):
+        return os.path.getsize(os.path.join(directory, name))
+
+    with zipfile.ZipFile(archive_path(settings, job_uuid)) as zip_file:
+        try:
+            return zip_file.getinfo(name).file_size
+        except KeyError as exc:
+            raise FileNotFoundError(name) from exc
+
+
+def iter_artifact(  # pylint: disable=too-many-arguments
+    settings: ApplicationSettings,
+    job_uuid: str,
+    name: str,
+    chunk_size: int,
+    *,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Yields the content of an artifact in chunks, see open_artifact.
+
+    Reading starts at ``offset`` and stops after ``length`` bytes when it is set;
+    both are keyword-only so range reads stay readable at the call sites.
+    """
+    with open_artifact(settings, job_uuid, name) as artifact:
+        if offset:
+            artifact.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = artifact.read(size)
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
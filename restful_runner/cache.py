@@ -0,0 +1,124 @@
+"""In-process cache of the serialized jobs served by the job read endpoints.
+
+Jobs in a final status no longer change, so clients polling them get the JSON
+serialized the first time they were read, without a query for ``GET
+/jobs/{job_uuid}``, along with an ETag and a Last-Modified header. The job
+listing still runs its query but reuses the JSON of the jobs in it.
+
+The result of a job is stored shortly after its final status, and retention
+deletes old jobs, so entries are invalidated whenever a job is written: by the
+status and result handlers of ``utils``, by the status writer once a batch is
+committed, and by the retention engine. A read that started before an
+invalidation doesn't fill the cache, see ``JobCache.generation``.
+
+In distributed mode the workers write jobs in other processes, out of reach of
+the invalidations, so only jobs that already have their result are cached in
+full there.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import datetime
+import email.utils
+import hashlib
+import threading
+from typing import Any, Iterable, Optional, Tuple
+
+from restful_runner import metrics
+from restful_runner.schema import TERMINAL_STATUSES, AnsibleJob
+
+
+@dataclass(frozen=True)
+class CachedJob:
+    body: bytes
+    etag: str
+    # HTTP date of the end of the job, None if it hasn't ended
+    last_modified: Optional[str] = None
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def serialize_job(job: Any) -> CachedJob:
+    """Serializes a job, or the summary row of a job, as the API returns it."""
+    body = AnsibleJob.from_orm(job).json().encode()
+    last_modified = None
+    if job.end_time is not None:
+        last_modified = email.utils.format_datetime(
+            job.end_time.astimezone(datetime.timezone.utc), usegmt=True
+        )
+    return CachedJob(
+        body=body,
+        etag=body_etag(body),
+        last_modified=last_modified,
+    )
+
+
+def is_final(job: Any, with_result: bool, require_result: bool) -> bool:
+    """Returns whether a job, read with or without its result, won't change.
+
+    ``require_result`` is set when the result may be written where this process
+    doesn't see it, see the module docstring.
+    """
+    if job.status not in TERMINAL_STATUSES:
+        return False
+    return not (with_result and require_result) or job.result is not None
+
+
+class JobCache:
+    """LRU cache of serialized jobs, keyed by (job_uuid, with_result).
+
+    A ``max_size`` of 0 disables the cache. Safe to use from any thread.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, bool], CachedJob]" = OrderedDict()
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation(self) -> int:
+        """Returns a token to take before reading the jobs to ``put``."""
+        return self._generation
+
+    def get(self, job_uuid: str, with_result: bool) -> Optional[CachedJob]:
+        if not self._max_size:
+            return None
+        key = (job_uuid, with_result)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.JOB_CACHE_LOOKUPS.labels("miss" if entry is None else "hit").inc()
+        return entry
+
+    def put(
+        self, job_uuid: str, with_result: bool, entry: CachedJob, generation: int
+    ) -> bool:
+        """Caches a job unless a job was invalidated since ``generation``."""
+        if not self._max_size:
+            return False
+        key = (job_uuid, with_result)
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, job_uuid: str) -> None:
+        self.invalidate_many([job_uuid])
+
+    def invalidate_many(self, job_uuids: Iterable[str]) -> None:
+        if not self._max_size:
+            return
+        with self._lock:
+            self._generation += 1
+            for job_uuid in job_uuids:
+                self._entries.pop((job_uuid, True), None)
+                self._entries.pop((job_uuid, False), None)
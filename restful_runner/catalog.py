@@ -0,0 +1,203 @@
+"""In-memory index of the playbooks in the project directory.
+
+The project directory is scanned recursively in a background thread, so serving
+the list of playbooks or checking that a playbook exists never touches the
+filesystem. This matters when the project directory is on a network mount.
+"""
+from dataclasses import dataclass, field
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+import yaml
+
+from restful_runner.config import ApplicationSettings
+
+
+logger = logging.getLogger("restful_runner")
+
+PLAYBOOK_EXTENSIONS = (".yml", ".yaml")
+
+# Directories of an ansible project that hold YAML files which aren't playbooks
+_EXCLUDED_DIRS = frozenset(
+    ["roles", "group_vars", "host_vars", "collections", "inventory", "vars"]
+)
+
+
+class _PlaybookLoader(yaml.SafeLoader):  # pylint: disable=too-many-ancestors
+    """SafeLoader that ignores tags such as !vault instead of failing on them."""
+
+
+_PlaybookLoader.add_multi_constructor("!", lambda loader, suffix, node: None)
+
+
+@dataclass
+class PlaybookEntry:
+    """A playbook in the catalog. Plays and tags are parsed on first use."""
+
+    path: str
+    mtime_ns: int
+    size: int
+    parsed: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self.mtime_ns:x}-{self.size:x}"'
+
+
+def _collect_tags(node: Any, tags: Set[str]) -> None:
+    if isinstance(node, dict):
+        node_tags = node.get("tags")
+        if isinstance(node_tags, str):
+            tags.update(tag.strip() for tag in node_tags.split(","))
+        elif isinstance(node_tags, list):
+            tags.update(str(tag) for tag in node_tags)
+        for value in node.values():
+            _collect_tags(value, tags)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_tags(value, tags)
+
+
+def parse_playbook(path: str) -> Dict[str, Any]:
+    """Returns the play names and tags of the playbook at the given path."""
+    with open(path, encoding="utf-8") as playbook_file:
+        plays = yaml.load(playbook_file, Loader=_PlaybookLoader)
+    if not isinstance(plays, list):
+        raise ValueError("A playbook must be a list of plays")
+
+    tags: Set[str] = set()
+    _collect_tags(plays, tags)
+    return {
+        "plays": [
+            str(play.get("name") or play.get("hosts") or play.get("import_playbook"))
+            for play in plays
+            if isinstance(play, dict)
+        ],
+        "tags": sorted(tags),
+    }
+
+
+class PlaybookCatalog:
+    """Index of the playbooks under a project directory, kept up to date by polling.
+
+    Call ``refresh`` to rescan the directory, or ``start`` to do so every
+    ``poll_interval`` seconds in a background thread. Readers get a consistent
+    snapshot: a refresh builds a new index and swaps it in.
+    """
+
+    def __init__(self, project_dir: str, poll_interval: float = 5.0) -> None:
+        self.project_dir = project_dir
+        self._poll_interval = poll_interval
+        self._entries: Dict[str, PlaybookEntry] = {}
+        self._etag = 'W/"empty"'
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="playbook-catalog", daemon=True
+        )
+
+    @property
+    def etag(self) -> str:
+        """Changes whenever a playbook is added, removed or modified."""
+        return self._etag
+
+    def playbooks(self) -> List[str]:
+        return sorted(self._entries)
+
+    def get(self, path: str) -> Optional[PlaybookEntry]:
+        return self._entries.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._entries
+
+    def details(self, entry: PlaybookEntry) -> Dict[str, Any]:
+        """Returns the plays and tags of a playbook, parsing it the first time."""
+        if entry.parsed is None:
+            try:
+                parsed = parse_playbook(os.path.join(self.project_dir, entry.path))
+            except (OSError, ValueError, yaml.YAMLError) as exc:
+                logger.warning("Could not parse playbook %s: %s", entry.path, exc)
+                parsed = {"plays": [], "tags": []}
+            entry.parsed = parsed
+        return entry.parsed
+
+    def refresh(self) -> bool:
+        """Rescans the project directory, returns whether anything changed."""
+        entries = {}
+        for path, stat in self._scan(self.project_dir, ""):
+            previous = self._entries.get(path)
+            if (
+                previous is not None
+                and previous.mtime_ns == stat.st_mtime_ns
+                and previous.size == stat.st_size
+            ):
+                # Unchanged, keep what was already parsed
+                entries[path] = previous
+            else:
+                entries[path] = PlaybookEntry(path, stat.st_mtime_ns, stat.st_size)
+
+        digest = hashlib.sha1(usedforsecurity=False)
+        for path in sorted(entries):
+            digest.update(f"{path}\0{entries[path].etag}\0".encode())
+        etag = f'W/"{digest.hexdigest()}"'
+
+        with self._lock:
+            changed = etag != self._etag
+            self._entries = entries
+            self._etag = etag
+        return changed
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _scan(self, directory: str, prefix: str):
+        try:
+            with os.scandir(directory) as scanner:
+                dir_entries = list(scanner)
+        except OSError as exc:
+            logger.warning("Could not scan %s: %s", directory, exc)
+            return
+
+        for dir_entry in dir_entries:
+            if dir_entry.name.startswith("."):
+                continue
+            path = prefix + dir_entry.name
+            if dir_entry.is_dir():
+                if dir_entry.name not in _EXCLUDED_DIRS:
+                    yield from self._scan(dir_entry.path, path + "/")
+            elif os.path.splitext(dir_entry.name)[1] in PLAYBOOK_EXTENSIONS:
+                try:
+                    yield path, dir_entry.stat()
+                except OSError:
+                    # Removed since the directory was listed
+                    continue
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._poll_interval):
+            try:
+                if self.refresh():
+                    logger.info("Playbook catalog changed")
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to refresh the playbook catalog")
+
+
+def build_catalog(settings: ApplicationSettings) -> PlaybookCatalog:
+    """Builds and populates the catalog of the configured project directory."""
+    if settings.project_dir is None:
+        project_dir = os.path.join(settings.private_data_dir, "project")
+    else:
+        project_dir = settings.project_dir
+
+    catalog = PlaybookCatalog(project_dir, settings.playbook_catalog_poll_seconds)
+    catalog.refresh()
+    return catalog
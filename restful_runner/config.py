@@ -2,7 +2,7 @@ from functools import lru_cache
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 
 from pydantic import BaseSettings
 
@@ -27,11 +27,65 @@ def json_config_settings_source(settings: BaseSettings) -> Dict[str, Any]:
 
 class ApplicationSettings(BaseSettings):
     db_url: str = "sqlite:////ansible/restful_runner.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: Optional[float] = None
+    db_pool_pre_ping: bool = True
+    sqlite_journal_mode: Optional[
+        Literal["delete", "truncate", "persist", "memory", "wal", "off"]
+    ] = "wal"
+    sqlite_synchronous: Optional[Literal["off", "normal", "full", "extra"]] = "normal"
+    sqlite_busy_timeout_seconds: float = 30.0
+    sqlite_writer_connection: bool = False
     max_executor_threads: int = 1
+    executor_backend: Literal["thread", "process", "subprocess"] = "thread"
+    max_queue_size: int = 1000
+    max_running_per_playbook: Optional[int] = None
+    max_running_per_initiator: Optional[int] = None
+    max_queued_per_initiator: Optional[int] = None
+    execution_mode: Literal["local", "distributed"] = "local"
+    worker_id: Optional[str] = None
+    worker_lease_seconds: float = 30.0
+    worker_heartbeat_seconds: float = 10.0
+    worker_poll_seconds: float = 1.0
+    worker_metrics_port: Optional[int] = None
     private_data_dir: str = "/ansible"
     project_dir: Optional[str] = None
     artifact_dir: Optional[str] = None
+    artifact_compression: bool = True
+    artifact_max_age_days: Optional[float] = None
+    artifact_max_total_mb: Optional[float] = None
+    job_max_age_days: Optional[float] = None
+    retention_interval_seconds: float = 300.0
+    retention_batch_size: int = 500
+    recover_jobs_on_startup: bool = True
+    recovery_batch_size: int = 1000
+    playbook_catalog_poll_seconds: float = 5.0
+    schedules_enabled: bool = True
+    schedule_tick_seconds: float = 1.0
+    schedule_sync_seconds: float = 60.0
     ansible_quiet: bool = True
+    job_timeout: Optional[int] = None
+    cancel_poll_seconds: float = 1.0
+    prepared_inventory: bool = False
+    inventory_max_age_seconds: float = 300.0
+    environment_poll_seconds: float = 5.0
+    fact_cache: Optional[str] = None
+    fact_cache_dir: Optional[str] = None
+    fact_cache_timeout_seconds: int = 86400
+    ssh_control_persist_seconds: Optional[int] = None
+    status_writer_batching: bool = True
+    status_flush_interval: float = 0.05
+    status_flush_size: int = 500
+    job_cache_size: int = 10000
+    results_window_days: float = 7.0
+    event_buffer_size: int = 1000
+    event_heartbeat_seconds: float = 15.0
+    stdout_follow_poll_seconds: float = 0.5
+    event_store: bool = True
+    event_flush_interval: float = 0.5
+    event_flush_size: int = 1000
 
     class Config:
         env_file = ".env"
@@ -52,8 +106,7 @@ class ApplicationSettings(BaseSettings):
             )
 
 
-_settings = ApplicationSettings()
-
-
+@lru_cache
 def get_app_settings() -> ApplicationSettings:
-    return _settings
+    """Returns the settings of the environment, read the first time it's called."""
+    return ApplicationSettings()
@@ -1,5 +1,17 @@
-from sqlalchemy import Column, DateTime, Enum, Integer, JSON, String
-from sqlalchemy.orm import declarative_base
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Enum,
+    Float,
+    Index,
+    Integer,
+    JSON,
+    String,
+)
+from sqlalchemy.orm import Mapped, declarative_base, mapped_column
 
 from restful_runner import schema
 
@@ -8,12 +20,109 @@ Base = declarative_base()
 
 class AnsibleJob(Base):  # type: ignore[valid-type,misc]
     __tablename__ = "ansible_jobs"
+    __table_args__ = (
+        # Job listings are ordered by id, newest first, and filtered by these
+        Index("ix_ansible_jobs_status_id", "status", "id"),
+        Index("ix_ansible_jobs_job_name_id", "job_name", "id"),
+        Index("ix_ansible_jobs_initiator_id", "initiator", "id"),
+        Index("ix_ansible_jobs_start_time", "start_time"),
+        # Finished jobs are pruned in order of their end time
+        Index("ix_ansible_jobs_end_time", "end_time"),
+        # Retried submissions are matched on their key, identical ones on their hash
+        Index("ix_ansible_jobs_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_ansible_jobs_request_hash_status", "request_hash", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    job_uuid: Mapped[str] = mapped_column(String, unique=True, nullable=True)
+    job_name: Mapped[str] = mapped_column(String, nullable=True)
+    initiator: Mapped[str] = mapped_column(String, nullable=True)
+    status: Mapped[schema.AnsibleRunnerStatus] = mapped_column(
+        Enum(schema.AnsibleRunnerStatus), nullable=True
+    )
+    start_time: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)
+    end_time: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON)
+    created_time: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, default=datetime.datetime.now
+    )
+
+    # Parameters of the run, so any node can start the job
+    priority: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    extravars: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON)
+    tags: Mapped[Optional[List[str]]] = mapped_column(JSON)
+    timeout: Mapped[Optional[int]] = mapped_column(Integer)
+    # Idempotency-Key header of the submission and hash of its parameters
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String)
+    request_hash: Mapped[Optional[str]] = mapped_column(String)
+
+    # Claim held by the worker running the job in distributed mode
+    worker_id: Mapped[Optional[str]] = mapped_column(String)
+    lease_expires: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)
+    # Set to have the worker running the job cancel it
+    cancel_requested: Mapped[Optional[bool]] = mapped_column(Boolean)
+
+
+class AnsibleJobEvent(Base):  # type: ignore[valid-type,misc]
+    """Outcome of one task on one host, taken from the runner events of a job.
+
+    Only the fields needed to find hosts and tasks are kept, not the full event.
+    """
+
+    __tablename__ = "ansible_job_events"
+    __table_args__ = (
+        # Events are listed newest first, across jobs or for a single job
+        Index("ix_ansible_job_events_job_uuid_id", "job_uuid", "id"),
+        Index("ix_ansible_job_events_host_id", "host", "id"),
+        Index("ix_ansible_job_events_task_id", "task", "id"),
+        Index("ix_ansible_job_events_created", "created"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_uuid: Mapped[str] = mapped_column(String, nullable=False)
+    counter: Mapped[int] = mapped_column(Integer, nullable=True)
+    host: Mapped[str] = mapped_column(String, nullable=True)
+    play: Mapped[Optional[str]] = mapped_column(String)
+    task: Mapped[Optional[str]] = mapped_column(String)
+    task_action: Mapped[Optional[str]] = mapped_column(String)
+    status: Mapped[schema.JobEventStatus] = mapped_column(
+        Enum(schema.JobEventStatus), nullable=True
+    )
+    changed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
+    duration: Mapped[Optional[float]] = mapped_column(Float)
+    message: Mapped[Optional[str]] = mapped_column(String)
+    created: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.now, nullable=True
+    )
+
+
+class Schedule(Base):  # type: ignore[valid-type,misc]
+    """Playbook run repeated on a cron expression or at a fixed interval."""
+
+    __tablename__ = "schedules"
+    __table_args__ = (Index("ix_schedules_name", "name", unique=True),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    playbook: Mapped[str] = mapped_column(String, nullable=False)
+    # One of the two is set
+    cron: Mapped[Optional[str]] = mapped_column(String)
+    interval_seconds: Mapped[Optional[int]] = mapped_column(Integer)
+    overlap: Mapped[schema.OverlapPolicy] = mapped_column(
+        Enum(schema.OverlapPolicy), default=schema.OverlapPolicy.SKIP, nullable=True
+    )
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True, nullable=True)
+
+    # Parameters of the jobs, as in a request to start the playbook
+    initiator: Mapped[str] = mapped_column(String, nullable=True)
+    priority: Mapped[int] = mapped_column(Integer, default=0, nullable=True)
+    extravars: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON)
+    tags: Mapped[Optional[List[str]]] = mapped_column(JSON)
+    timeout: Mapped[Optional[int]] = mapped_column(Integer)
 
-    id = Column(Integer, primary_key=True, index=True)
-    job_uuid = Column(String, unique=True)
-    job_name = Column(String)
-    initiator = Column(String)
-    status = Column(Enum(schema.AnsibleRunnerStatus), nullable=True)
-    start_time = Column(DateTime)
-    end_time = Column(DateTime, nullable=True)
-    result = Column(JSON, nullable=True)
+    next_run: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)
+    last_run: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)
+    last_job_uuid: Mapped[Optional[str]] = mapped_column(String)
+    created_time: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.now, nullable=True
+    )
@@ -1,36 +1,333 @@
-from typing import List
+# All the queries live here, most of them along with the async version the
+# endpoints use, which takes more than the usual module size
+# pylint: disable=too-many-lines
+import base64
+import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, cast
 
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy import (
+    ColumnElement,
+    Enum,
+    Table,
+    Text,
+    and_,
+    bindparam,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import URL, CursorResult, Dialect, Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker, Session
 
-from restful_runner.data_model import AnsibleJob
-from restful_runner.schema import AnsibleRunnerStatus
+from restful_runner import metrics
+from restful_runner.config import ApplicationSettings
+from restful_runner.data_model import AnsibleJob, AnsibleJobEvent, Base, Schedule
+from restful_runner.schema import (
+    TERMINAL_STATUSES,
+    AnsibleRunnerStatus,
+    JobEventFilter,
+    JobFilter,
+)
+
+
+# Async drivers used for the database URLs that name a sync (or no) driver
+_ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def to_async_url(db_url: str) -> str:
+    """Returns the URL of the database using the dialect's asyncio driver."""
+    url = make_url(db_url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() in _ASYNC_DRIVERS.values():
+        return db_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+def _is_sqlite_memory(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def engine_options(
+    url: URL, settings: ApplicationSettings, writer: bool = False
+) -> Dict[str, Any]:
+    """Returns the arguments of create_engine for a database, see the settings.
+
+    ``writer`` is for the engine of the writer connection of SQLite databases.
+    """
+    options: Dict[str, Any] = {}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {
+            # Sessions are used from the executor and writer threads
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_seconds,
+        }
+        if _is_sqlite_memory(url):
+            # Left to the default pool, as every connection has its own database
+            return options
+    else:
+        # Servers may drop idle connections
+        options["pool_pre_ping"] = settings.db_pool_pre_ping
+        if settings.db_pool_recycle_seconds is not None:
+            options["pool_recycle"] = settings.db_pool_recycle_seconds
+    options["pool_size"] = 1 if writer else settings.db_pool_size
+    options["max_overflow"] = 0 if writer else settings.db_max_overflow
+    options["pool_timeout"] = settings.db_pool_timeout_seconds
+    return options
+
+
+def _set_up_sqlite(
+    engine: Engine, settings: ApplicationSettings, immediate: bool = False
+) -> None:
+    """Sets the pragmas of the settings on every new connection of an engine.
+
+    With ``immediate``, transactions start with BEGIN IMMEDIATE, which takes the
+    write lock right away rather than on the first write.
+    """
+    pragmas = []
+    if settings.sqlite_journal_mode is not None:
+        pragmas.append(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    if settings.sqlite_synchronous is not None:
+        pragmas.append(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        if immediate:
+            # Stops the driver from starting transactions itself, see on_begin
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+
+        @event.listens_for(engine, "begin")
+        def on_begin(connection):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
 
 
 class DatabaseConnection:
-    def __init__(self, db_url: str) -> None:
-        self._engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    """The engines of a database, set up with the settings given.
 
+    On SQLite, writes may go through a writer connection of their own, see
+    ``write_session_local``. Without settings, their defaults are used.
+    """
+
+    def __init__(
+        self, db_url: str, settings: Optional[ApplicationSettings] = None
+    ) -> None:
+        # Doesn't read the environment, unlike ApplicationSettings()
+        self._settings = settings or ApplicationSettings.construct()
+        url = make_url(db_url)
+        sqlite = url.get_backend_name() == "sqlite"
+
+        self._engine = create_engine(db_url, **engine_options(url, self._settings))
+        if sqlite:
+            _set_up_sqlite(self._engine, self._settings)
         self._session_local = sessionmaker(
             autocommit=False, autoflush=False, bind=self._engine
         )
 
+        self._writer_engine: Optional[Engine] = None
+        self._write_session_local = self._session_local
+        if (
+            sqlite
+            and self._settings.sqlite_writer_connection
+            and not _is_sqlite_memory(url)
+        ):
+            self._writer_engine = create_engine(
+                db_url, **engine_options(url, self._settings, writer=True)
+            )
+            _set_up_sqlite(self._writer_engine, self._settings, immediate=True)
+            self._write_session_local = sessionmaker(
+                autocommit=False, autoflush=False, bind=self._writer_engine
+            )
+
+        # Created on first use, so sync-only users don't need an asyncio driver
+        self._async_engine: Optional[AsyncEngine] = None
+        self._async_session_local: Optional[async_sessionmaker] = None
+
     def get_engine(self) -> Engine:
         return self._engine
 
     def session_local(self) -> Session:
         return self._session_local()
 
+    def write_session_local(self) -> Session:
+        """Returns a session for writes.
+
+        On SQLite, with ``sqlite_writer_connection``, all of them share one
+        connection and their transactions take the write lock as they start.
+        A transaction that reads before writing then can't fail with "database
+        is locked" once another process wrote in between, at the cost of
+        holding the lock longer, which slows down many small concurrent writes,
+        see ``benchmarks/db_contention.py``. Otherwise, this is
+        ``session_local``.
+        """
+        return self._write_session_local()
+
+    def get_async_engine(self) -> AsyncEngine:
+        if self._async_engine is None:
+            async_url = to_async_url(
+                self._engine.url.render_as_string(hide_password=False)
+            )
+            url = make_url(async_url)
+            try:
+                self._async_engine = create_async_engine(
+                    async_url, **engine_options(url, self._settings)
+                )
+            except ModuleNotFoundError as exc:
+                # The asyncio drivers of servers aren't in the requirements
+                if exc.name != url.get_driver_name():
+                    raise
+                raise ImportError(
+                    f"The {url.get_backend_name()} database needs the {exc.name} "
+                    f"package, install it with: pip install {exc.name}"
+                ) from exc
+            if self._engine.dialect.name == "sqlite":
+                _set_up_sqlite(self._async_engine.sync_engine, self._settings)
+        return self._async_engine
+
+    def async_session_local(self) -> AsyncSession:
+        if self._async_session_local is None:
+            self._async_session_local = async_sessionmaker(
+                bind=self.get_async_engine(), autoflush=False, expire_on_commit=False
+            )
+        return self._async_session_local()
+
+    async def dispose(self) -> None:
+        """Closes the pooled connections of all engines."""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        if self._writer_engine is not None:
+            self._writer_engine.dispose()
+        self._engine.dispose()
+
+
+def enum_upgrades(
+    dialect: Dialect, table: Table, existing_types: Dict[str, Any]
+) -> List[str]:
+    """Returns the statements adding the values missing from native enum columns.
+
+    ``existing_types`` holds the types of the columns of the table as reflected.
+    PostgreSQL enums are types of their own, MySQL ones are part of the column.
+    """
+    statements: List[str] = []
+    for column in table.columns:
+        column_type = column.type
+        existing_type = existing_types.get(column.name)
+        if not (
+            isinstance(column_type, Enum)
+            and column_type.native_enum
+            and isinstance(existing_type, Enum)
+        ):
+            continue
+        missing = [
+            value for value in column_type.enums if value not in existing_type.enums
+        ]
+        if not missing:
+            continue
+        if dialect.name == "postgresql":
+            statements.extend(
+                f"ALTER TYPE {column_type.name} ADD VALUE IF NOT EXISTS '{value}'"
+                for value in missing
+            )
+        elif dialect.name in ("mysql", "mariadb"):
+            statements.append(
+                f"ALTER TABLE {table.name} MODIFY COLUMN {column.name} "
+                f"{column_type.compile(dialect=dialect)}"
+            )
+    return statements
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Creates missing tables, and the columns, indexes and enum values they lack.
+
+    Only additive changes are made: new columns are added as nullable columns
+    without a server default, which every supported database can do in place.
+    Building a new index on a large existing table may take a while. New values
+    of enums are added to the enum types of PostgreSQL and the enum columns of
+    MySQL, SQLite stores enums as plain strings.
+    """
+    Base.metadata.create_all(bind=engine)
 
-def create_ansible_job(
-    session: Session, job_uuid: str, job_name: str, initiator: str
+    enum_statements: List[str] = []
+    with engine.begin() as connection:
+        # Inspected on the transaction's connection, the pool may hold no other
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {
+                column["name"]: column["type"]
+                for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+            enum_statements.extend(enum_upgrades(engine.dialect, table, existing))
+
+    # Before PostgreSQL 12 enum values can't be added in a transaction
+    if enum_statements:
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            for statement in enum_statements:
+                connection.execute(text(statement))
+
+
+@metrics.timed("create_ansible_job")
+def create_ansible_job(  # pylint: disable=too-many-arguments
+    session: Session,
+    job_uuid: str,
+    job_name: str,
+    initiator: str,
+    *,
+    status: AnsibleRunnerStatus = AnsibleRunnerStatus.CREATED,
+    priority: int = 0,
+    extravars: Optional[Dict[str, Any]] = None,
+    tags: Optional[List[str]] = None,
+    timeout: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None,
 ) -> AnsibleJob:
     ansible_job = AnsibleJob(
         job_uuid=job_uuid,
         job_name=job_name,
         initiator=initiator,
-        status=AnsibleRunnerStatus.CREATED,
+        status=status,
+        priority=priority,
+        extravars=extravars,
+        tags=tags,
+        timeout=timeout,
+        idempotency_key=idempotency_key,
+        request_hash=request_hash,
     )
     session.add(ansible_job)
     session.commit()
@@ -38,24 +335,83 @@ def create_ansible_job(
     return ansible_job
 
 
+@metrics.timed("get_ansible_job")
 def get_ansible_job(session: Session, job_uuid: str) -> AnsibleJob:
     return session.query(AnsibleJob).filter(AnsibleJob.job_uuid == job_uuid).one()
 
 
+def encode_cursor(job: Any) -> str:
+    """Returns the cursor of the page following the given job or job event."""
+    return base64.urlsafe_b64encode(str(job.id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as exc:
+        raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+
+def _job_filters(
+    before_id: Optional[int], job_filter: JobFilter
+) -> List[ColumnElement[bool]]:
+    filters = []
+    if before_id is not None:
+        filters.append(AnsibleJob.id < before_id)
+    if job_filter.status is not None:
+        filters.append(AnsibleJob.status == job_filter.status)
+    if job_filter.job_name is not None:
+        filters.append(AnsibleJob.job_name == job_filter.job_name)
+    if job_filter.initiator is not None:
+        filters.append(AnsibleJob.initiator == job_filter.initiator)
+    if job_filter.started_after is not None:
+        filters.append(AnsibleJob.start_time >= job_filter.started_after)
+    if job_filter.started_before is not None:
+        filters.append(AnsibleJob.start_time < job_filter.started_before)
+    return filters
+
+
+# Columns loaded when listing jobs without their results
+_SUMMARY_COLUMNS = (
+    AnsibleJob.id,
+    AnsibleJob.job_uuid,
+    AnsibleJob.status,
+    AnsibleJob.start_time,
+    AnsibleJob.end_time,
+)
+
+
+@metrics.timed("get_ansible_jobs")
 def get_ansible_jobs(
-    session: Session, skip: int = 0, limit: int = 100
-) -> List[AnsibleJob]:
+    session: Session,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    include_result: bool = True,
+    **filters,
+) -> List[Any]:
+    """Returns a page of jobs, newest first.
+
+    Pages are selected with a keyset on the job id rather than an offset, so deep
+    pages cost the same as the first one. Pass the ``encode_cursor`` of the last
+    job of a page to get the next page. The remaining keyword arguments filter the
+    jobs, they are the fields of ``JobFilter``.
+
+    Without ``include_result`` only the summary columns are loaded and rows with
+    those attributes are returned instead of ``AnsibleJob`` instances.
+    """
+    before_id = decode_cursor(cursor) if cursor is not None else None
+    entities = (AnsibleJob,) if include_result else _SUMMARY_COLUMNS
     return (
-        session.query(AnsibleJob)
-        .order_by(AnsibleJob.start_time.desc())
-        .offset(skip)
+        session.query(*entities)
+        .filter(*_job_filters(before_id, JobFilter(**filters)))
+        .order_by(AnsibleJob.id.desc())
         .limit(limit)
         .all()
     )
 
 
-def update_ansible_job(session: Session, job_uuid: str, **kwargs) -> None:
-    update_dict = {}
+def _update_values(**kwargs) -> Dict[Any, Any]:
+    update_dict: Dict[Any, Any] = {}
     if "status" in kwargs:
         update_dict[AnsibleJob.status] = kwargs["status"]
 
@@ -68,6 +424,12 @@ def update_ansible_job(session: Session, job_uuid: str, **kwargs) -> None:
     if "result" in kwargs:
         update_dict[AnsibleJob.result] = kwargs["result"]
 
+    return update_dict
+
+
+@metrics.timed("update_ansible_job")
+def update_ansible_job(session: Session, job_uuid: str, **kwargs) -> None:
+    update_dict = _update_values(**kwargs)
     if update_dict:
         updated_rows = (
             session.query(AnsibleJob)
@@ -86,6 +448,32 @@ def update_ansible_job(session: Session, job_uuid: str, **kwargs) -> None:
         session.commit()
 
 
+@metrics.timed("update_ansible_jobs")
+def update_ansible_jobs(
+    session: Session, updates: Dict[str, Dict[str, Any]]
+) -> List[str]:
+    """Applies updates to many jobs in a single transaction.
+
+    Returns the UUIDs of the jobs that don't exist.
+    """
+    missing = []
+    for job_uuid, fields in updates.items():
+        update_dict = _update_values(**fields)
+        if not update_dict:
+            continue
+        updated_rows = (
+            session.query(AnsibleJob)
+            .filter(AnsibleJob.job_uuid == job_uuid)
+            .update(update_dict, synchronize_session=False)
+        )
+        if updated_rows == 0:
+            missing.append(job_uuid)
+
+    session.commit()
+    return missing
+
+
+@metrics.timed("delete_ansible_job")
 def delete_ansible_job(session: Session, job_uuid: str) -> None:
     updated_rows = (
         session.query(AnsibleJob).filter(AnsibleJob.job_uuid == job_uuid).delete()
@@ -100,3 +488,675 @@ def delete_ansible_job(session: Session, job_uuid: str) -> None:
         )
 
     session.commit()
+
+
+_count_by_status = select(AnsibleJob.status, func.count(AnsibleJob.id)).group_by(
+    AnsibleJob.status
+)
+
+_waiting = and_(
+    AnsibleJob.status == AnsibleRunnerStatus.CREATED,
+    AnsibleJob.worker_id.is_(None),
+)
+_count_waiting_by_playbook = (
+    select(AnsibleJob.job_name, func.count(AnsibleJob.id))
+    .where(_waiting)
+    .group_by(AnsibleJob.job_name)
+)
+_oldest_waiting = select(func.min(AnsibleJob.created_time)).where(_waiting)
+
+
+@metrics.timed("count_ansible_jobs_by_status")
+def count_ansible_jobs_by_status(session: Session) -> Dict[AnsibleRunnerStatus, int]:
+    return dict(session.execute(_count_by_status).all())
+
+
+@metrics.timed("get_waiting_ansible_job_stats")
+def get_waiting_ansible_job_stats(
+    session: Session,
+) -> Tuple[Dict[str, int], Optional[datetime.datetime]]:
+    """Returns the number of unclaimed jobs per playbook and the oldest one's age."""
+    per_playbook = dict(session.execute(_count_waiting_by_playbook).all())
+    return per_playbook, session.execute(_oldest_waiting).scalar()
+
+
+def _claimable(now: datetime.datetime):
+    """Jobs nobody holds a valid lease on and that have not been started yet."""
+    return and_(
+        AnsibleJob.status == AnsibleRunnerStatus.CREATED,
+        or_(AnsibleJob.lease_expires.is_(None), AnsibleJob.lease_expires < now),
+    )
+
+
+@metrics.timed("claim_ansible_job")
+def claim_ansible_job(
+    session: Session, worker_id: str, lease_seconds: float, attempts: int = 5
+) -> Optional[AnsibleJob]:
+    """Atomically claims the next job waiting to be run, if any.
+
+    The highest priority, oldest claimable job is selected and then claimed with a
+    conditional UPDATE that only succeeds when the job is still claimable. When
+    another worker wins the race the next candidate is tried, up to ``attempts``
+    times. This works on any database with atomic single row updates, which
+    includes SQLite.
+    """
+    for _ in range(attempts):
+        now = datetime.datetime.now()
+        candidate = (
+            session.query(AnsibleJob.id)
+            .filter(_claimable(now))
+            .order_by(AnsibleJob.priority.desc(), AnsibleJob.id)
+            .first()
+        )
+        if candidate is None:
+            session.rollback()
+            return None
+
+        claimed = (
+            session.query(AnsibleJob)
+            .filter(AnsibleJob.id == candidate.id, _claimable(now))
+            .update(
+                {
+                    AnsibleJob.worker_id: worker_id,
+                    AnsibleJob.lease_expires: now
+                    + datetime.timedelta(seconds=lease_seconds),
+                },
+                synchronize_session=False,
+            )
+        )
+        session.commit()
+        if claimed == 1:
+            return session.query(AnsibleJob).filter(AnsibleJob.id == candidate.id).one()
+
+    return None
+
+
+@metrics.timed("renew_ansible_job_leases")
+def renew_ansible_job_leases(
+    session: Session, worker_id: str, job_uuids: Sequence[str], lease_seconds: float
+) -> int:
+    """Extends the leases a worker holds on the given jobs."""
+    if not job_uuids:
+        return 0
+
+    lease_expires = datetime.datetime.now() + datetime.timedelta(seconds=lease_seconds)
+    renewed = (
+        session.query(AnsibleJob)
+        .filter(AnsibleJob.job_uuid.in_(job_uuids), AnsibleJob.worker_id == worker_id)
+        .update({AnsibleJob.lease_expires: lease_expires}, synchronize_session=False)
+    )
+    session.commit()
+    return renewed
+
+
+@metrics.timed("release_ansible_job_leases")
+def release_ansible_job_leases(
+    session: Session, worker_id: str, job_uuids: Sequence[str]
+) -> int:
+    """Drops the leases a worker holds on the given jobs, once they have a status.
+
+    Jobs still waiting to start keep their lease, so other workers don't claim
+    them again before it runs out.
+    """
+    if not job_uuids:
+        return 0
+
+    released = (
+        session.query(AnsibleJob)
+        .filter(
+            AnsibleJob.job_uuid.in_(job_uuids),
+            AnsibleJob.worker_id == worker_id,
+            AnsibleJob.status != AnsibleRunnerStatus.CREATED,
+        )
+        .update({AnsibleJob.lease_expires: None}, synchronize_session=False)
+    )
+    session.commit()
+    return released
+
+
+@metrics.timed("expire_ansible_job_leases")
+def expire_ansible_job_leases(session: Session) -> int:
+    """Fails started jobs whose worker stopped renewing its lease.
+
+    A started job may have made changes to the hosts, so it is not run again.
+    """
+    now = datetime.datetime.now()
+    expired = (
+        session.query(AnsibleJob)
+        .filter(
+            AnsibleJob.status.in_(
+                [AnsibleRunnerStatus.STARTING, AnsibleRunnerStatus.RUNNING]
+            ),
+            AnsibleJob.lease_expires < now,
+        )
+        .update(
+            {AnsibleJob.status: AnsibleRunnerStatus.FAILED, AnsibleJob.end_time: now},
+            synchronize_session=False,
+        )
+    )
+    session.commit()
+    return expired
+
+
+@metrics.timed("get_cancel_requested_ansible_jobs")
+def get_cancel_requested_ansible_jobs(
+    session: Session, worker_id: str, job_uuids: Sequence[str]
+) -> List[str]:
+    """Returns which of the given jobs of a worker have been asked to cancel."""
+    if not job_uuids:
+        return []
+    return list(
+        session.scalars(
+            select(AnsibleJob.job_uuid).where(
+                AnsibleJob.job_uuid.in_(job_uuids),
+                AnsibleJob.worker_id == worker_id,
+                AnsibleJob.cancel_requested.is_(True),
+            )
+        )
+    )
+
+
+_UNFINISHED_STATUSES = [
+    status for status in AnsibleRunnerStatus if status not in TERMINAL_STATUSES
+]
+
+
+@metrics.timed("get_unfinished_ansible_jobs")
+def get_unfinished_ansible_jobs(
+    session: Session, after_id: int, limit: int
+) -> List[AnsibleJob]:
+    """Returns up to ``limit`` unfinished jobs with an id above ``after_id``."""
+    return list(
+        session.scalars(
+            select(AnsibleJob)
+            .where(
+                AnsibleJob.status.in_(_UNFINISHED_STATUSES), AnsibleJob.id > after_id
+            )
+            .order_by(AnsibleJob.id)
+            .limit(limit)
+        )
+    )
+
+
+# Rows fetched at a time when reading the results of many jobs
+_RESULT_BATCH_SIZE = 500
+
+
+def iter_ansible_job_results(
+    session: Session,
+    job_name: Optional[str] = None,
+    ended_after: Optional[datetime.datetime] = None,
+    ended_before: Optional[datetime.datetime] = None,
+) -> Iterator[Any]:
+    """Yields (job_uuid, status, result) rows of finished jobs, oldest first.
+
+    Rows are fetched ``_RESULT_BATCH_SIZE`` at a time, so any number of jobs can
+    be read without loading them all.
+    """
+    filters: List[ColumnElement[bool]] = [AnsibleJob.status.in_(TERMINAL_STATUSES)]
+    if job_name is not None:
+        filters.append(AnsibleJob.job_name == job_name)
+    if ended_after is not None:
+        filters.append(AnsibleJob.end_time >= ended_after)
+    if ended_before is not None:
+        filters.append(AnsibleJob.end_time < ended_before)
+    yield from session.execute(
+        select(AnsibleJob.job_uuid, AnsibleJob.status, AnsibleJob.result)
+        .where(*filters)
+        .order_by(AnsibleJob.end_time, AnsibleJob.id)
+        .execution_options(yield_per=_RESULT_BATCH_SIZE)
+    )
+
+
+@metrics.timed("delete_finished_ansible_jobs")
+def delete_finished_ansible_jobs(
+    session: Session, ended_before: datetime.datetime, limit: int
+) -> List[str]:
+    """Deletes up to ``limit`` jobs that ended before the given time.
+
+    The events of the deleted jobs are deleted as well. Returns the UUIDs of the
+    deleted jobs, call again until fewer than ``limit`` are returned.
+    """
+    rows = session.execute(
+        select(AnsibleJob.id, AnsibleJob.job_uuid)
+        .where(
+            AnsibleJob.status.in_(TERMINAL_STATUSES),
+            AnsibleJob.end_time < ended_before,
+        )
+        .order_by(AnsibleJob.end_time)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return []
+
+    job_uuids = [row.job_uuid for row in rows]
+    session.execute(
+        delete(AnsibleJobEvent).where(AnsibleJobEvent.job_uuid.in_(job_uuids))
+    )
+    session.execute(
+        delete(AnsibleJob).where(AnsibleJob.id.in_([row.id for row in rows]))
+    )
+    session.commit()
+    return job_uuids
+
+
+@metrics.timed("create_ansible_job_events")
+def create_ansible_job_events(
+    session: Session, job_events: Sequence[Dict[str, Any]]
+) -> None:
+    """Inserts job events, given as dicts of column values, in one statement."""
+    if not job_events:
+        return
+    session.execute(insert(AnsibleJobEvent), list(job_events))
+    session.commit()
+
+
+def _job_event_filters(
+    before_id: Optional[int], event_filter: JobEventFilter
+) -> List[ColumnElement[bool]]:
+    filters = []
+    if before_id is not None:
+        filters.append(AnsibleJobEvent.id < before_id)
+    if event_filter.job_uuid is not None:
+        filters.append(AnsibleJobEvent.job_uuid == event_filter.job_uuid)
+    if event_filter.host is not None:
+        filters.append(AnsibleJobEvent.host == event_filter.host)
+    if event_filter.task is not None:
+        filters.append(AnsibleJobEvent.task == event_filter.task)
+    if event_filter.status is not None:
+        filters.append(AnsibleJobEvent.status == event_filter.status)
+    if event_filter.created_after is not None:
+        filters.append(AnsibleJobEvent.created >= event_filter.created_after)
+    if event_filter.created_before is not None:
+        filters.append(AnsibleJobEvent.created < event_filter.created_before)
+    return filters
+
+
+def _job_events_query(cursor: Optional[str], limit: int, **filters):
+    before_id = decode_cursor(cursor) if cursor is not None else None
+    return (
+        select(AnsibleJobEvent)
+        .where(*_job_event_filters(before_id, JobEventFilter(**filters)))
+        .order_by(AnsibleJobEvent.id.desc())
+        .limit(limit)
+    )
+
+
+@metrics.timed("get_ansible_job_events")
+def get_ansible_job_events(
+    session: Session, cursor: Optional[str] = None, limit: int = 100, **filters
+) -> List[AnsibleJobEvent]:
+    """Returns a page of job events, newest first, across all jobs.
+
+    Paged like ``get_ansible_jobs``; the keyword arguments filter the events, they
+    are the fields of ``JobEventFilter``.
+    """
+    return list(session.scalars(_job_events_query(cursor, limit, **filters)))
+
+
+# ===== Async versions of the helpers, for use from async endpoints =====
+
+
+@metrics.timed("async_create_ansible_job")
+async def async_create_ansible_job(  # pylint: disable=too-many-arguments
+    session: AsyncSession,
+    job_uuid: str,
+    job_name: str,
+    initiator: str,
+    *,
+    status: AnsibleRunnerStatus = AnsibleRunnerStatus.CREATED,
+    priority: int = 0,
+    extravars: Optional[Dict[str, Any]] = None,
+    tags: Optional[List[str]] = None,
+    timeout: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None,
+) -> AnsibleJob:
+    ansible_job = AnsibleJob(
+        job_uuid=job_uuid,
+        job_name=job_name,
+        initiator=initiator,
+        status=status,
+        priority=priority,
+        extravars=extravars,
+        tags=tags,
+        timeout=timeout,
+        idempotency_key=idempotency_key,
+        request_hash=request_hash,
+    )
+    session.add(ansible_job)
+    await session.commit()
+    await session.refresh(ansible_job)
+    return ansible_job
+
+
+@metrics.timed("async_create_ansible_jobs")
+async def async_create_ansible_jobs(
+    session: AsyncSession, jobs: Sequence[Dict[str, Any]]
+) -> List[AnsibleJob]:
+    """Creates several jobs in one transaction, returning them in the given order.
+
+    Every dict holds the columns of a job, e.g. ``job_uuid``, ``job_name`` and
+    ``initiator``.
+    """
+    result = await session.scalars(
+        insert(AnsibleJob).returning(AnsibleJob, sort_by_parameter_order=True),
+        [{"status": AnsibleRunnerStatus.CREATED, **job} for job in jobs],
+    )
+    created = result.all()
+    await session.commit()
+    return list(created)
+
+
+@metrics.timed("async_get_ansible_job")
+async def async_get_ansible_job(
+    session: AsyncSession, job_uuid: str
+) -> Optional[AnsibleJob]:
+    result = await session.execute(
+        select(AnsibleJob).where(AnsibleJob.job_uuid == job_uuid)
+    )
+    return result.scalar_one_or_none()
+
+
+@metrics.timed("async_get_ansible_job_by_idempotency_key")
+async def async_get_ansible_job_by_idempotency_key(
+    session: AsyncSession, idempotency_key: str
+) -> Optional[AnsibleJob]:
+    result = await session.execute(
+        select(AnsibleJob).where(AnsibleJob.idempotency_key == idempotency_key)
+    )
+    return result.scalar_one_or_none()
+
+
+@metrics.timed("async_get_ansible_jobs_by_idempotency_key")
+async def async_get_ansible_jobs_by_idempotency_key(
+    session: AsyncSession, idempotency_keys: Sequence[str]
+) -> Dict[str, AnsibleJob]:
+    result = await session.scalars(
+        select(AnsibleJob).where(AnsibleJob.idempotency_key.in_(idempotency_keys))
+    )
+    return {cast(str, job.idempotency_key): job for job in result}
+
+
+@metrics.timed("async_get_in_flight_ansible_job")
+async def async_get_in_flight_ansible_job(
+    session: AsyncSession, request_hash: str
+) -> Optional[AnsibleJob]:
+    """Returns the newest job with the given request hash that hasn't finished."""
+    result = await session.execute(
+        select(AnsibleJob)
+        .where(
+            AnsibleJob.request_hash == request_hash,
+            AnsibleJob.status.not_in(TERMINAL_STATUSES),
+        )
+        .order_by(AnsibleJob.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+@metrics.timed("async_get_in_flight_ansible_jobs")
+async def async_get_in_flight_ansible_jobs(
+    session: AsyncSession, request_hashes: Sequence[str]
+) -> Dict[str, AnsibleJob]:
+    """Returns the newest unfinished job of each of the given request hashes."""
+    result = await session.scalars(
+        select(AnsibleJob)
+        .where(
+            AnsibleJob.request_hash.in_(request_hashes),
+            AnsibleJob.status.not_in(TERMINAL_STATUSES),
+        )
+        .order_by(AnsibleJob.id)
+    )
+    return {cast(str, job.request_hash): job for job in result}
+
+
+@metrics.timed("async_get_ansible_jobs_by_uuid")
+async def async_get_ansible_jobs_by_uuid(
+    session: AsyncSession, job_uuids: Sequence[str], include_result: bool = True
+) -> List[Any]:
+    """Returns the jobs with the given UUIDs, in no particular order."""
+    entities = (AnsibleJob,) if include_result else _SUMMARY_COLUMNS
+    result = await session.execute(
+        select(*entities).where(AnsibleJob.job_uuid.in_(job_uuids))
+    )
+    return list(result.scalars() if include_result else result.all())
+
+
+@metrics.timed("async_get_ansible_jobs")
+async def async_get_ansible_jobs(
+    session: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    include_result: bool = True,
+    **filters,
+) -> List[Any]:
+    before_id = decode_cursor(cursor) if cursor is not None else None
+    entities = (AnsibleJob,) if include_result else _SUMMARY_COLUMNS
+    result = await session.execute(
+        select(*entities)
+        .where(*_job_filters(before_id, JobFilter(**filters)))
+        .order_by(AnsibleJob.id.desc())
+        .limit(limit)
+    )
+    return list(result.scalars() if include_result else result.all())
+
+
+@metrics.timed("async_get_ansible_job_result_text")
+async def async_get_ansible_job_result_text(
+    session: AsyncSession, job_uuid: str
+) -> Tuple[bool, Optional[str]]:
+    """Returns whether the job exists and its result as stored, without decoding it."""
+    result = await session.execute(
+        select(AnsibleJob.result.cast(Text)).where(AnsibleJob.job_uuid == job_uuid)
+    )
+    row = result.first()
+    return row is not None, row[0] if row is not None else None
+
+
+@metrics.timed("async_get_ansible_job_events")
+async def async_get_ansible_job_events(
+    session: AsyncSession, cursor: Optional[str] = None, limit: int = 100, **filters
+) -> List[AnsibleJobEvent]:
+    result = await session.scalars(_job_events_query(cursor, limit, **filters))
+    return list(result)
+
+
+@metrics.timed("async_update_ansible_job")
+async def async_update_ansible_job(
+    session: AsyncSession, job_uuid: str, **kwargs
+) -> None:
+    update_dict = _update_values(**kwargs)
+    if update_dict:
+        result = await session.execute(
+            update(AnsibleJob)
+            .where(AnsibleJob.job_uuid == job_uuid)
+            .values(update_dict)
+        )
+        updated_rows = cast(CursorResult, result).rowcount
+
+        if updated_rows == 0:
+            raise IndexError(f"No job with UUID: {job_uuid}")
+        if updated_rows > 1:
+            await session.rollback()
+            raise RuntimeError(
+                f"More than one row ({updated_rows} rows) have UUID: {job_uuid}"
+            )
+
+        await session.commit()
+
+
+@metrics.timed("async_request_ansible_job_cancel")
+async def async_request_ansible_job_cancel(
+    session: AsyncSession, job_uuid: str
+) -> None:
+    """Cancels a job that no worker claimed yet, or flags it for its worker."""
+    now = datetime.datetime.now()
+    result = await session.execute(
+        update(AnsibleJob)
+        .where(AnsibleJob.job_uuid == job_uuid, _claimable(now))
+        .values(status=AnsibleRunnerStatus.CANCELED, end_time=now)
+    )
+    if cast(CursorResult, result).rowcount == 0:
+        await session.execute(
+            update(AnsibleJob)
+            .where(
+                AnsibleJob.job_uuid == job_uuid,
+                AnsibleJob.status.not_in(TERMINAL_STATUSES),
+            )
+            .values(cancel_requested=True)
+        )
+    await session.commit()
+
+
+@metrics.timed("async_delete_ansible_job")
+async def async_delete_ansible_job(session: AsyncSession, job_uuid: str) -> None:
+    result = await session.execute(
+        delete(AnsibleJob).where(AnsibleJob.job_uuid == job_uuid)
+    )
+    updated_rows = cast(CursorResult, result).rowcount
+
+    if updated_rows == 0:
+        raise IndexError(f"No job with UUID: {job_uuid}")
+    if updated_rows > 1:
+        await session.rollback()
+        raise RuntimeError(
+            f"More than one row ({updated_rows} rows) have UUID: {job_uuid}"
+        )
+
+    await session.commit()
+
+
+@metrics.timed("async_delete_ansible_jobs")
+async def async_delete_ansible_jobs(
+    session: AsyncSession, job_uuids: Sequence[str]
+) -> None:
+    await session.execute(delete(AnsibleJob).where(AnsibleJob.job_uuid.in_(job_uuids)))
+    await session.commit()
+
+
+@metrics.timed("async_count_ansible_jobs_by_status")
+async def async_count_ansible_jobs_by_status(
+    session: AsyncSession,
+) -> Dict[AnsibleRunnerStatus, int]:
+    return dict((await session.execute(_count_by_status)).all())
+
+
+@metrics.timed("async_count_ansible_jobs_with_status")
+async def async_count_ansible_jobs_with_status(
+    session: AsyncSession, status: AnsibleRunnerStatus
+) -> int:
+    """Counts the jobs with one status, using the status index."""
+    return (
+        await session.execute(
+            select(func.count())
+            .select_from(AnsibleJob)
+            .where(AnsibleJob.status == status)
+        )
+    ).scalar_one()
+
+
+@metrics.timed("async_get_waiting_ansible_job_stats")
+async def async_get_waiting_ansible_job_stats(
+    session: AsyncSession,
+) -> Tuple[Dict[str, int], Optional[datetime.datetime]]:
+    per_playbook = dict((await session.execute(_count_waiting_by_playbook)).all())
+    return per_playbook, (await session.execute(_oldest_waiting)).scalar()
+
+
+# ===== Schedules =====
+
+
+@metrics.timed("async_get_schedule")
+async def async_get_schedule(session: AsyncSession, name: str) -> Optional[Schedule]:
+    result = await session.execute(select(Schedule).where(Schedule.name == name))
+    return result.scalar_one_or_none()
+
+
+@metrics.timed("async_get_schedules")
+async def async_get_schedules(
+    session: AsyncSession, enabled_only: bool = False
+) -> List[Schedule]:
+    """Returns the schedules sorted by name."""
+    query = select(Schedule).order_by(Schedule.name)
+    if enabled_only:
+        query = query.where(Schedule.enabled.is_(True))
+    return list(await session.scalars(query))
+
+
+@metrics.timed("async_put_schedule")
+async def async_put_schedule(
+    session: AsyncSession, name: str, **fields
+) -> Tuple[Schedule, bool]:
+    """Creates a schedule or replaces the one with the same name.
+
+    ``fields`` are the columns of the schedule. Returns the schedule and whether
+    it was created.
+    """
+    schedule = await async_get_schedule(session, name)
+    created = schedule is None
+    if schedule is None:
+        schedule = Schedule(name=name)
+        session.add(schedule)
+    for column, value in fields.items():
+        setattr(schedule, column, value)
+    await session.commit()
+    await session.refresh(schedule)
+    return schedule, created
+
+
+@metrics.timed("async_delete_schedule")
+async def async_delete_schedule(session: AsyncSession, name: str) -> Optional[int]:
+    """Deletes a schedule, returns its id or None if there was none."""
+    result = await session.execute(
+        delete(Schedule).where(Schedule.name == name).returning(Schedule.id)
+    )
+    schedule_id = result.scalar_one_or_none()
+    await session.commit()
+    return schedule_id
+
+
+# Core statement, as ORM-enabled updates don't run with many parameter sets
+_update_schedule_run = (
+    update(Schedule.__table__)
+    .where(Schedule.__table__.c.id == bindparam("b_id"))
+    .values(
+        next_run=bindparam("b_next_run"),
+        last_run=bindparam("b_last_run"),
+        last_job_uuid=bindparam("b_last_job_uuid"),
+    )
+)
+
+
+@metrics.timed("async_update_schedule_runs")
+async def async_update_schedule_runs(
+    session: AsyncSession, runs: Sequence[Dict[str, Any]]
+) -> None:
+    """Records the runs of many schedules in one statement.
+
+    Every dict holds the ``id``, ``next_run``, ``last_run`` and ``last_job_uuid``
+    of a schedule.
+    """
+    if not runs:
+        return
+    await session.execute(
+        _update_schedule_run,
+        [{f"b_{key}": value for key, value in run.items()} for run in runs],
+    )
+    await session.commit()
+
+
+@metrics.timed("async_get_busy_schedules")
+async def async_get_busy_schedules(
+    session: AsyncSession, schedule_ids: Sequence[int]
+) -> Set[int]:
+    """Returns the ids of the given schedules whose last job hasn't finished."""
+    result = await session.scalars(
+        select(Schedule.id)
+        .join(AnsibleJob, AnsibleJob.job_uuid == Schedule.last_job_uuid)
+        .where(
+            Schedule.id.in_(schedule_ids),
+            AnsibleJob.status.not_in(TERMINAL_STATUSES),
+        )
+    )
+    return set(result)
@@ -0,0 +1,252 @@
+"""Environment prepared once and shared by the jobs of an API process or worker.
+
+By default ansible_runner points every job at ``<private_data_dir>/inventory``,
+which Ansible parses from scratch, running inventory scripts and plugins, before
+the first task of the job starts. With ``prepared_inventory`` set, the inventory
+is rendered once with ``ansible-inventory --list`` into a static file that jobs
+use instead. It is rendered again when a file of the inventory or of the project
+changes, and at least every ``inventory_max_age_seconds`` so dynamic inventories
+pick up hosts that changed without their files changing. The file has the
+structure of Ansible's YAML inventory plugin but is written as JSON, which Ansible
+parses much faster than YAML.
+
+With ``ssh_control_persist_seconds`` set, jobs share the SSH connections of the
+process: Ansible keeps them open that long after their last use, with control
+sockets in a directory owned by the process and closed when it stops.
+
+With ``fact_cache`` set, jobs share the facts of their hosts, see facts.py.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.facts import FactCache, build_fact_cache
+
+
+logger = logging.getLogger("restful_runner")
+
+INVENTORY_DIR = "inventory"
+PREPARED_INVENTORY = os.path.join("prepared", "inventory.json")
+
+
+def inventory_revision(path: str) -> str:
+    """Returns a digest of the names, sizes and modification times of inventory files.
+
+    ``path`` is an inventory file or a directory of them.
+    """
+    if os.path.isfile(path):
+        files = [(os.path.basename(path), path)]
+    else:
+        files = []
+        for parent, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+            for filename in sorted(filenames):
+                file_path = os.path.join(parent, filename)
+                files.append((os.path.relpath(file_path, path), file_path))
+
+    digest = hashlib.sha1(usedforsecurity=False)
+    for name, file_path in files:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # Removed since the directory was listed
+            continue
+        digest.update(f"{name}\0{stat.st_mtime_ns}\0{stat.st_size}\0".encode())
+    return digest.hexdigest()
+
+
+def to_inventory_plugin_format(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts ``ansible-inventory --list --export`` output for the YAML plugin.
+
+    Every group and the variables of every host are written out once, further
+    occurrences only name them.
+    """
+    hostvars = listing.get("_meta", {}).get("hostvars", {})
+    defined_groups: Set[str] = set()
+    defined_hosts: Set[str] = set()
+
+    def convert(name: str) -> Optional[Dict[str, Any]]:
+        if name in defined_groups:
+            return None
+        defined_groups.add(name)
+        group = listing.get(name, {})
+        node: Dict[str, Any] = {}
+        if group.get("hosts"):
+            node["hosts"] = {}
+            for host in group["hosts"]:
+                node["hosts"][host] = None
+                if host not in defined_hosts:
+                    defined_hosts.add(host)
+                    node["hosts"][host] = hostvars.get(host) or None
+        if group.get("vars"):
+            node["vars"] = group["vars"]
+        if group.get("children"):
+            node["children"] = {child: convert(child) for child in group["children"]}
+        return node
+
+    return {"all": convert("all")}
+
+
+class PreparedEnvironment:  # pylint: disable=too-many-instance-attributes
+    """Inventory and SSH settings shared by jobs, see the module docstring.
+
+    ``project_revision`` returns a value that changes whenever the project does,
+    such as the ETag of the playbook catalog. The state of each shared resource
+    and of the refresh thread lives here, hence the number of attributes.
+    """
+
+    def __init__(
+        self,
+        settings: ApplicationSettings,
+        project_revision: Callable[[], str] = str,
+    ) -> None:
+        self._settings = settings
+        self._project_revision = project_revision
+        self._source = os.path.join(settings.private_data_dir, INVENTORY_DIR)
+        self._prepared = os.path.join(settings.private_data_dir, PREPARED_INVENTORY)
+        self._inventory: Optional[str] = None
+        self._revision: Optional[str] = None
+        self._rendered_at = 0.0
+        self.fact_cache: Optional[FactCache] = build_fact_cache(settings)
+
+        self._control_path_dir: Optional[str] = None
+        if settings.ssh_control_persist_seconds is not None:
+            # Socket paths are limited to about 100 characters, keep this short
+            self._control_path_dir = tempfile.mkdtemp(prefix="rr-cp-")
+
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="prepared-environment", daemon=True
+        )
+
+    @property
+    def inventory(self) -> Optional[str]:
+        """Path of the rendered inventory, None until it has been rendered."""
+        return self._inventory
+
+    def run_kwargs(self) -> Dict[str, Any]:
+        """Returns the arguments of ansible_runner.run that use this environment."""
+        kwargs: Dict[str, Any] = {}
+        envvars: Dict[str, str] = {}
+        if self._inventory is not None:
+            kwargs["inventory"] = self._inventory
+        if self._control_path_dir is not None:
+            envvars.update(
+                ANSIBLE_SSH_ARGS=(
+                    "-C -o ControlMaster=auto "
+                    f"-o ControlPersist={self._settings.ssh_control_persist_seconds}s"
+                ),
+                ANSIBLE_SSH_CONTROL_PATH_DIR=self._control_path_dir,
+            )
+        if self.fact_cache is not None:
+            fact_cache_kwargs = self.fact_cache.run_kwargs()
+            envvars.update(fact_cache_kwargs.pop("envvars"))
+            kwargs.update(fact_cache_kwargs)
+        if envvars:
+            kwargs["envvars"] = envvars
+        return kwargs
+
+    def refresh(self, now: Optional[float] = None) -> bool:
+        """Renders the inventory if it changed or got too old.
+
+        Returns whether it was rendered. Jobs keep using the previous rendering
+        when this raises.
+        """
+        if not self._settings.prepared_inventory or not os.path.exists(self._source):
+            self._inventory = None
+            return False
+
+        now = time.monotonic() if now is None else now
+        revision = inventory_revision(self._source) + self._project_revision()
+        if (
+            revision == self._revision
+            and now - self._rendered_at < self._settings.inventory_max_age_seconds
+        ):
+            return False
+
+        self._render()
+        self._inventory = self._prepared
+        self._revision = revision
+        self._rendered_at = now
+        return True
+
+    def start(self) -> None:
+        if self._settings.prepared_inventory:
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._control_path_dir is not None:
+            self._close_connections(self._control_path_dir)
+
+    def _render(self) -> None:
+        import ansible_runner  # pylint: disable=import-outside-toplevel
+
+        with tempfile.TemporaryDirectory(prefix="rr-inventory-") as artifact_dir:
+            # Reads env/ of the private data dir, as dynamic inventories may
+            # need the credentials in there
+            listing, error = ansible_runner.get_inventory(
+                action="list",
+                inventories=[self._source],
+                response_format="json",
+                # Keeps group variables on their groups instead of copying
+                # them to every host
+                export=True,
+                private_data_dir=self._settings.private_data_dir,
+                artifact_dir=artifact_dir,
+                quiet=True,
+            )
+        if not isinstance(listing, dict):
+            raise RuntimeError(f"ansible-inventory failed: {error}")
+
+        directory = os.path.dirname(self._prepared)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, partial = tempfile.mkstemp(dir=directory, suffix=".partial")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as partial_file:
+            json.dump(to_inventory_plugin_format(listing), partial_file)
+        # Jobs starting meanwhile read either the previous or the new inventory
+        os.replace(partial, self._prepared)
+
+    @staticmethod
+    def _close_connections(control_path_dir: str) -> None:
+        try:
+            sockets = os.listdir(control_path_dir)
+        except OSError:
+            return
+        for name in sockets:
+            try:
+                subprocess.run(
+                    [
+                        "ssh",
+                        "-O",
+                        "exit",
+                        "-S",
+                        os.path.join(control_path_dir, name),
+                        # Required, but the socket decides which host it is
+                        "localhost",
+                    ],
+                    capture_output=True,
+                    timeout=10,
+                    check=False,
+                )
+            except (OSError, subprocess.TimeoutExpired):
+                logger.warning("Could not close SSH connection %s", name)
+        shutil.rmtree(control_path_dir, True)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.refresh():
+                    logger.info("Rendered the inventory to %s", self._prepared)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to render the inventory")
+            if self._stopping.wait(self._settings.environment_poll_seconds):
+                return
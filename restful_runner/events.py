@@ -0,0 +1,155 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import itertools
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Deque,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    import ansible_runner
+
+
+@dataclass
+class StreamEvent:
+    id: int
+    event: str
+    data: Dict[str, Any]
+
+
+_Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Event]
+
+
+class _JobStream:
+    def __init__(self, max_events: int) -> None:
+        self.events: Deque[StreamEvent] = deque(maxlen=max_events)
+        self.ids = itertools.count(1)
+        self.finished = False
+        self.waiters: Set[_Waiter] = set()
+
+    def events_after(self, last_event_id: int):
+        if not self.events:
+            return []
+        start = max(0, last_event_id + 1 - self.events[0].id)
+        return list(itertools.islice(self.events, start, None))
+
+
+class EventBroker:
+    """In-memory fan-out of job events from the runner threads to subscribers.
+
+    Each job has one buffer of its most recent ``max_events`` events, written by
+    the thread running the job. Subscribers read from that shared buffer and are
+    only woken up when something is added, so N subscribers to a job cost one
+    copy of every event. Subscribers can resume from the id of the last event
+    they saw, as long as it is still buffered. The buffers of the last
+    ``max_finished_jobs`` finished jobs are kept for late subscribers.
+    """
+
+    def __init__(self, max_events: int = 1000, max_finished_jobs: int = 100) -> None:
+        self._max_events = max_events
+        self._max_finished_jobs = max_finished_jobs
+        self._lock = threading.Lock()
+        self._streams: Dict[str, _JobStream] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+
+    def publish(self, job_uuid: str, event: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            stream = self._streams.get(job_uuid)
+            if stream is None:
+                stream = self._streams[job_uuid] = _JobStream(self._max_events)
+            stream.events.append(StreamEvent(next(stream.ids), event, data))
+            waiters = list(stream.waiters)
+        self._wake(waiters)
+
+    def finish(self, job_uuid: str) -> None:
+        """Marks the stream of a job as complete, ending its subscriptions."""
+        with self._lock:
+            stream = self._streams.get(job_uuid)
+            if stream is None:
+                stream = self._streams[job_uuid] = _JobStream(self._max_events)
+            stream.finished = True
+            waiters = list(stream.waiters)
+
+            self._finished[job_uuid] = None
+            while len(self._finished) > self._max_finished_jobs:
+                evicted, _ = self._finished.popitem(last=False)
+                self._streams.pop(evicted, None)
+        self._wake(waiters)
+
+    def has_stream(self, job_uuid: str) -> bool:
+        with self._lock:
+            return job_uuid in self._streams
+
+    def event_handler(self, event_data: Dict[str, Any]) -> bool:
+        """ansible_runner event handler publishing every runner event."""
+        self.publish(
+            event_data.get("runner_ident", ""), event_data.get("event", ""), event_data
+        )
+        # Let ansible_runner write the event to the artifact directory as well
+        return True
+
+    def status_handler(
+        self, status: Dict[str, str], runner_config: "ansible_runner.RunnerConfig"
+    ) -> None:
+        """ansible_runner status handler publishing status changes."""
+        self.publish(runner_config.ident, "status", {"status": status["status"]})
+
+    async def subscribe(
+        self,
+        job_uuid: str,
+        last_event_id: int = 0,
+        heartbeat: Optional[float] = None,
+    ) -> AsyncGenerator[Optional[StreamEvent], None]:
+        """Yields the events of a job after ``last_event_id`` until it finishes.
+
+        When ``heartbeat`` is set, None is yielded after that many seconds
+        without events so callers can keep their connection alive.
+        """
+        wakeup = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wakeup)
+        with self._lock:
+            stream = self._streams.get(job_uuid)
+            if stream is None:
+                stream = self._streams[job_uuid] = _JobStream(self._max_events)
+            stream.waiters.add(waiter)
+
+        try:
+            while True:
+                with self._lock:
+                    pending = stream.events_after(last_event_id)
+                    finished = stream.finished
+
+                for event in pending:
+                    last_event_id = event.id
+                    yield event
+                if finished:
+                    return
+
+                try:
+                    await asyncio.wait_for(wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                wakeup.clear()
+        finally:
+            with self._lock:
+                stream.waiters.discard(waiter)
+                # Don't keep streams around for jobs that never produced anything
+                if not stream.waiters and not stream.events and not stream.finished:
+                    self._streams.pop(job_uuid, None)
+
+    @staticmethod
+    def _wake(waiters) -> None:
+        for loop, wakeup in waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The subscriber's loop was closed, it won't read any more events
+                pass
@@ -0,0 +1,290 @@
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+import uuid
+
+logger = logging.getLogger("restful_runner")
+
+EXECUTOR_BACKENDS = ("thread", "process", "subprocess")
+
+# Keyword arguments of ansible_runner.run that hold callbacks which must run in the
+# parent process (they talk to the database, the event broker, ...).
+_CALLBACK_KWARGS = ("status_handler", "event_handler")
+
+# Number of slots in the shared array used to tell children to cancel a job. Jobs
+# share a slot only when this many jobs are submitted and not yet finished.
+_CANCEL_SLOTS = 4096
+
+# How often the parent checks the cancel callbacks of jobs running in children
+_CANCEL_POLL_SECONDS = 0.5
+
+
+class _ChildState:
+    """Set in each child process by _init_child, used by the proxies to talk back."""
+
+    callback_queue: Any = None
+    cancel_flags: Any = None
+
+
+_CHILD_STATE = _ChildState()
+
+
+@dataclass
+class RemoteRunnerConfig:
+    """Picklable subset of ``ansible_runner.RunnerConfig`` passed to callbacks."""
+
+    ident: str
+
+
+@dataclass
+class RemoteRunner:
+    """Picklable subset of ``ansible_runner.Runner`` returned from a child process."""
+
+    config: RemoteRunnerConfig
+    status: Optional[str] = None
+    rc: Optional[int] = None
+
+    @classmethod
+    def from_runner(cls, runner: Any) -> "RemoteRunner":
+        return cls(
+            config=RemoteRunnerConfig(ident=str(runner.config.ident)),
+            status=runner.status,
+            rc=runner.rc,
+        )
+
+
+def _to_remote(value: Any) -> Any:
+    """Replace unpicklable runner configs in callback arguments with a stand-in."""
+    if hasattr(value, "ident") and not isinstance(value, RemoteRunnerConfig):
+        return RemoteRunnerConfig(ident=str(value.ident))
+    return value
+
+
+class _CallbackProxy:
+    """Picklable callable forwarding its arguments to the parent process."""
+
+    def __init__(self, token: str, name: str) -> None:
+        self.token = token
+        self.name = name
+
+    def __call__(self, *args, **kwargs) -> bool:
+        args = tuple(_to_remote(arg) for arg in args)
+        kwargs = {key: _to_remote(value) for key, value in kwargs.items()}
+        _CHILD_STATE.callback_queue.put((self.token, self.name, args, kwargs))
+        # ansible_runner uses the return value of the event handler to decide
+        # whether the event is written to the artifact directory.
+        return True
+
+
+class _CancelProxy:
+    """Picklable cancel callback, true once the parent flagged the job's slot."""
+
+    def __init__(self, slot: int, sequence: int) -> None:
+        self.slot = slot
+        self.sequence = sequence
+
+    def __call__(self) -> bool:
+        return _CHILD_STATE.cancel_flags[self.slot] == self.sequence
+
+
+def _init_child(callback_queue: Any, cancel_flags: Any) -> None:
+    _CHILD_STATE.callback_queue = callback_queue
+    _CHILD_STATE.cancel_flags = cancel_flags
+
+
+def _run_in_child(
+    token: str, func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]
+) -> RemoteRunner:
+    try:
+        return RemoteRunner.from_runner(func(*args, **kwargs))
+    finally:
+        # Tell the parent that no more callbacks will arrive for this job
+        _CHILD_STATE.callback_queue.put((token, None, (), {}))
+
+
+class _ChildFuture(Future):
+    """Future of a job run in a child, which can't be cancelled once it started."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pool_future: Optional[Future] = None
+
+    def cancel(self) -> bool:
+        if self.pool_future is not None and not self.pool_future.cancel():
+            return False
+        return super().cancel()
+
+
+class _ChildJob:
+    def __init__(
+        self,
+        future: _ChildFuture,
+        callbacks: Dict[str, Callable],
+        cancel_callback: Optional[Callable[[], bool]],
+        cancel_slot: Tuple[int, int],
+    ) -> None:
+        self.future = future
+        self.callbacks = callbacks
+        self.callbacks_done = False
+        self.cancel_callback = cancel_callback
+        self.cancel_slot = cancel_slot
+
+
+class ProcessJobExecutor(Executor):
+    """Runs jobs in child processes and marshals their callbacks back to the parent.
+
+    Callbacks passed as keyword arguments (see ``_CALLBACK_KWARGS``) are replaced
+    with proxies that send their arguments back over a queue, where a dispatcher
+    thread invokes the real callbacks in the parent. The returned futures resolve
+    only after every callback of the job has been dispatched, so the ordering seen
+    by callers matches the thread backend. When ``isolated`` is set, every job is
+    run in a fresh process which exits once the job has finished.
+
+    A ``cancel_callback`` keyword argument is polled in the parent, and a job it
+    cancels is flagged in an array shared with the children, which the proxy
+    handed to the child checks.
+    """
+
+    def __init__(self, max_workers: int, isolated: bool = False) -> None:
+        context = multiprocessing.get_context("spawn")
+        self._callback_queue = context.Queue()
+        self._cancel_flags = context.RawArray("q", [-1] * _CANCEL_SLOTS)
+        self._sequence = itertools.count()
+        pool_kwargs: Dict[str, Any] = {"max_tasks_per_child": 1} if isolated else {}
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_child,
+            initargs=(self._callback_queue, self._cancel_flags),
+            **pool_kwargs,
+        )
+        self._jobs: Dict[str, _ChildJob] = {}
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_callbacks, name="callback-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:  # type: ignore[override]
+        token = uuid.uuid4().hex
+        callbacks = {}
+        for name in _CALLBACK_KWARGS:
+            if callable(kwargs.get(name)):
+                callbacks[name] = kwargs[name]
+                kwargs[name] = _CallbackProxy(token, name)
+
+        sequence = next(self._sequence)
+        slot = sequence % _CANCEL_SLOTS
+        cancel_callback = kwargs.get("cancel_callback")
+        if callable(cancel_callback):
+            kwargs["cancel_callback"] = _CancelProxy(slot, sequence)
+
+        job = _ChildJob(_ChildFuture(), callbacks, cancel_callback, (slot, sequence))
+        with self._lock:
+            self._jobs[token] = job
+
+        pool_future = self._pool.submit(_run_in_child, token, fn, args, kwargs)
+        job.future.pool_future = pool_future
+        pool_future.add_done_callback(lambda _: self._resolve(token))
+        return job.future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._callback_queue.put(None)
+        if wait:
+            self._dispatcher.join()
+
+    def _poll_cancel_callbacks(self) -> None:
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.cancel_callback]
+        for job in jobs:
+            try:
+                canceled = job.cancel_callback()  # type: ignore[misc]
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Cancel callback failed")
+                canceled = True
+            if canceled:
+                slot, sequence = job.cancel_slot
+                self._cancel_flags[slot] = sequence
+                job.cancel_callback = None
+
+    def _dispatch_callbacks(self) -> None:
+        next_poll = time.monotonic() + _CANCEL_POLL_SECONDS
+        while True:
+            if time.monotonic() >= next_poll:
+                self._poll_cancel_callbacks()
+                next_poll = time.monotonic() + _CANCEL_POLL_SECONDS
+            try:
+                message = self._callback_queue.get(timeout=_CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+
+            token, name, args, kwargs = message
+            with self._lock:
+                job = self._jobs.get(token)
+            if job is None:
+                continue
+
+            if name is None:
+                job.callbacks_done = True
+                self._resolve(token)
+                continue
+
+            try:
+                job.callbacks[name](*args, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Callback %s failed for job %s", name, token)
+
+    def _resolve(self, token: str) -> None:
+        with self._lock:
+            job = self._jobs.get(token)
+            if job is None:
+                return
+            pool_future = job.future.pool_future
+            if pool_future is None or not pool_future.done():
+                return
+
+            cancelled = pool_future.cancelled()
+            exception = None if cancelled else pool_future.exception()
+            # Cancelled or crashed children never report back, so don't wait for
+            # their callbacks
+            crashed = isinstance(exception, BrokenProcessPool)
+            if not (job.callbacks_done or cancelled or crashed):
+                return
+            self._jobs.pop(token)
+
+        if cancelled:
+            job.future.cancel()
+        elif job.future.set_running_or_notify_cancel():
+            if exception is not None:
+                job.future.set_exception(exception)
+            else:
+                job.future.set_result(pool_future.result())
+
+
+def build_executor(backend: str, max_workers: int) -> Executor:
+    """Creates the executor used to run ansible jobs for the given backend name."""
+    if backend == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if backend == "process":
+        return ProcessJobExecutor(max_workers)
+    if backend == "subprocess":
+        return ProcessJobExecutor(max_workers, isolated=True)
+
+    raise ValueError(
+        f"Unknown executor backend: {backend} (expected one of {EXECUTOR_BACKENDS})"
+    )
@@ -0,0 +1,199 @@
+"""Ansible fact cache shared by the jobs of an API process or worker.
+
+ansible_runner gives every job a fact cache of its own in its artifact directory,
+so every job gathers the facts of its hosts again, often the slowest part of a
+short playbook. With ``fact_cache`` set, jobs share one cache in
+``fact_cache_dir`` instead and Ansible gathers facts in "smart" mode: only for
+hosts without facts in the cache, or whose facts are older than
+``fact_cache_timeout_seconds``.
+
+The ``jsonfile`` backend, built into Ansible, is the only one for now. It keeps
+one JSON file per host, which the service reads to list and show cached facts and
+deletes to invalidate a host. Recent versions of Ansible prefix the file names
+with a schema version (``s1_web1``) and wrap the facts in an envelope; both
+layouts are read.
+"""
+import datetime
+import glob
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.results import ResultCollector
+from restful_runner.schema import CachedHost
+
+
+FACT_CACHE_BACKENDS = ("jsonfile",)
+
+# Prefix of cache keys written by versions of Ansible that version their schema
+_SCHEMA_PREFIX = re.compile(r"s\d+_")
+_PAYLOAD_KEY = "__payload__"
+
+
+def _check_host(host: str) -> None:
+    if not host or host.startswith(".") or os.sep in host:
+        raise ValueError(f"Invalid host name: {host!r}")
+
+
+class FactCache:
+    """Fact cache in a directory of JSON files, see the module docstring."""
+
+    def __init__(self, settings: ApplicationSettings) -> None:
+        self._settings = settings
+        self.directory = os.path.abspath(
+            settings.fact_cache_dir
+            or os.path.join(settings.private_data_dir, "fact_cache")
+        )
+        self.timeout = settings.fact_cache_timeout_seconds
+
+    def run_kwargs(self) -> Dict[str, Any]:
+        """Returns the arguments of ansible_runner.run that use this cache."""
+        return {
+            # ansible_runner joins this to the artifact dir, which keeps it as is
+            # when it is absolute
+            "fact_cache": self.directory,
+            "fact_cache_type": "jsonfile",
+            "envvars": {
+                "ANSIBLE_GATHERING": "smart",
+                "ANSIBLE_CACHE_PLUGIN_TIMEOUT": str(self.timeout),
+            },
+        }
+
+    def _is_expired(self, mtime: float, now: float) -> bool:
+        # Like Ansible, a timeout of 0 keeps facts forever
+        return self.timeout != 0 and now - mtime > self.timeout
+
+    def _paths(self, host: str) -> List[str]:
+        _check_host(host)
+        escaped = glob.escape(host)
+        return glob.glob(os.path.join(glob.escape(self.directory), escaped)) + [
+            path
+            for path in glob.glob(
+                os.path.join(glob.escape(self.directory), f"s*_{escaped}")
+            )
+            if _SCHEMA_PREFIX.fullmatch(os.path.basename(path)[: -len(host)])
+        ]
+
+    def hosts(self, now: Optional[float] = None) -> List[CachedHost]:
+        """Lists the hosts with cached facts, sorted by name."""
+        now = time.time() if now is None else now
+        found: Dict[str, float] = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            match = _SCHEMA_PREFIX.match(entry.name)
+            host = entry.name[match.end() :] if match else entry.name
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            found[host] = max(mtime, found.get(host, mtime))
+        return [
+            CachedHost(
+                host=host,
+                updated=datetime.datetime.fromtimestamp(found[host]),
+                expired=self._is_expired(found[host], now),
+            )
+            for host in sorted(found)
+        ]
+
+    def get(self, host: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Returns the cached facts of a host, None if there are none or expired."""
+        now = time.time() if now is None else now
+        entries: List[Tuple[float, str]] = []
+        for path in self._paths(host):
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        if not entries:
+            return None
+        mtime, path = max(entries)
+        if self._is_expired(mtime, now):
+            return None
+
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                facts = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if isinstance(facts, dict) and _PAYLOAD_KEY in facts:
+            facts = json.loads(facts[_PAYLOAD_KEY])
+        return facts
+
+    def invalidate_host(self, host: str) -> bool:
+        """Deletes the cached facts of a host, returns whether there were any."""
+        deleted = False
+        for path in self._paths(host):
+            try:
+                os.remove(path)
+                deleted = True
+            except FileNotFoundError:
+                continue
+        return deleted
+
+    def _run(self, pattern: str, run_kwargs: Dict[str, Any], **kwargs) -> Dict:
+        import ansible_runner  # pylint: disable=import-outside-toplevel
+
+        collector = ResultCollector()
+        ident = f"facts-{uuid.uuid4().hex}"
+
+        def event_handler(event: Dict[str, Any]) -> bool:
+            collector.event_handler(event)
+            # Facts are large, keep them out of the artifacts
+            return False
+
+        with tempfile.TemporaryDirectory(prefix="rr-facts-") as artifact_dir:
+            runner = ansible_runner.run(
+                private_data_dir=self._settings.private_data_dir,
+                artifact_dir=artifact_dir,
+                ident=ident,
+                host_pattern=pattern,
+                event_handler=event_handler,
+                quiet=True,
+                suppress_env_files=True,
+                **run_kwargs,
+                **kwargs,
+            )
+        return collector.pop(ident, runner.rc)
+
+    def prefetch(self, pattern: str, run_kwargs: Dict[str, Any]) -> Dict:
+        """Gathers the facts of the hosts matching an Ansible host pattern.
+
+        ``run_kwargs`` are the arguments of ansible_runner.run shared by jobs,
+        which include those of this cache, see PreparedEnvironment.run_kwargs.
+        Returns the summary of the run, see results.py.
+        """
+        return self._run(pattern, run_kwargs, module="gather_facts")
+
+    def invalidate(self, pattern: str, run_kwargs: Dict[str, Any]) -> List[str]:
+        """Deletes the cached facts of the hosts matching an Ansible host pattern.
+
+        Ansible resolves the pattern against the inventory, like ``prefetch``.
+        Returns the hosts whose facts were deleted.
+        """
+        before = {cached.host for cached in self.hosts()}
+        self._run(pattern, run_kwargs, module="meta", module_args="clear_facts")
+        return sorted(before - {cached.host for cached in self.hosts()})
+
+
+def build_fact_cache(settings: ApplicationSettings) -> Optional[FactCache]:
+    """Creates the fact cache set up in the settings, None when it is off."""
+    if settings.fact_cache is None:
+        return None
+    if settings.fact_cache == "jsonfile":
+        return FactCache(settings)
+
+    raise ValueError(
+        f"Unknown fact cache: {settings.fact_cache} "
+        f"(expected one of {FACT_CACHE_BACKENDS})"
+    )
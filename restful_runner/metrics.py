@@ -0,0 +1,177 @@
+"""Prometheus metrics of the job pipeline, served by the API on ``/metrics``.
+
+A job goes through these timings, all in seconds:
+
+* ``job_queue_wait``: from the job being created to the runner starting it,
+  including the time spent in the job queue and in the executor.
+* ``executor_wait``: from ``PlaybookExecutorService.submit_job`` to the runner
+  starting the job, i.e. the wait for a free executor slot.
+* ``job_duration``: from the runner starting the job to its final status.
+"""
+import functools
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar, cast
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from restful_runner.schema import TERMINAL_STATUSES, AnsibleRunnerStatus
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Buckets for job level timings, which go from milliseconds to hours
+_JOB_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600, float("inf"))
+
+JOBS_SUBMITTED = Counter(
+    "restful_runner_jobs_submitted",
+    "Jobs submitted to the executor",
+    ["playbook"],
+)
+JOBS_FINISHED = Counter(
+    "restful_runner_jobs_finished",
+    "Jobs that reached a final status",
+    ["playbook", "status"],
+)
+ACTIVE_JOBS = Gauge(
+    "restful_runner_active_jobs",
+    "Jobs submitted to the executor that have not finished",
+)
+JOB_QUEUE_WAIT = Histogram(
+    "restful_runner_job_queue_wait_seconds",
+    "Time from a job being created to it starting",
+    buckets=_JOB_BUCKETS,
+)
+EXECUTOR_WAIT = Histogram(
+    "restful_runner_executor_wait_seconds",
+    "Time from a job being submitted to the executor to it starting",
+    buckets=_JOB_BUCKETS,
+)
+JOB_DURATION = Histogram(
+    "restful_runner_job_duration_seconds",
+    "Time from a job starting to its final status",
+    ["playbook"],
+    buckets=_JOB_BUCKETS,
+)
+STATUS_HANDLER_SECONDS = Histogram(
+    "restful_runner_status_handler_seconds",
+    "Time spent handling a status change in the runner callback",
+)
+JOB_CACHE_LOOKUPS = Counter(
+    "restful_runner_job_cache_lookups",
+    "Lookups of serialized jobs in the job cache, by whether they were found",
+    ["outcome"],
+)
+SCHEDULED_RUNS = Counter(
+    "restful_runner_scheduled_runs",
+    "Runs of schedules that came due, by whether their job was launched",
+    ["outcome"],
+)
+SCHEDULE_LAG = Histogram(
+    "restful_runner_schedule_lag_seconds",
+    "Time from a run of a schedule being due to its job being launched",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 15, 60, float("inf")),
+)
+DB_OPERATION_SECONDS = Histogram(
+    "restful_runner_db_operation_seconds",
+    "Time spent in database helpers",
+    ["operation"],
+)
+
+
+class _JobTimes:
+    __slots__ = ("playbook", "created", "submitted", "started")
+
+    def __init__(self) -> None:
+        self.playbook = ""
+        self.created: Optional[float] = None
+        self.submitted: Optional[float] = None
+        self.started: Optional[float] = None
+
+
+_lock = threading.Lock()
+_jobs: Dict[str, _JobTimes] = {}
+
+
+def _job_times(ident: str) -> _JobTimes:
+    times = _jobs.get(ident)
+    if times is None:
+        times = _jobs[ident] = _JobTimes()
+    return times
+
+
+def job_created(ident: str, created: Optional[float] = None) -> None:
+    """Records the creation of a job, ``created`` is a time.time() timestamp."""
+    with _lock:
+        _job_times(ident).created = time.time() if created is None else created
+
+
+def job_submitted(ident: str, playbook: str) -> None:
+    JOBS_SUBMITTED.labels(playbook).inc()
+    with _lock:
+        times = _job_times(ident)
+        times.playbook = playbook
+        times.submitted = time.monotonic()
+
+
+def job_status_changed(ident: str, status: AnsibleRunnerStatus) -> None:
+    """Observes the timings of a job, called from the status handlers."""
+    with _lock:
+        times = _jobs.get(ident)
+    if times is None:
+        return
+
+    if status == AnsibleRunnerStatus.STARTING:
+        times.started = time.monotonic()
+        if times.submitted is not None:
+            EXECUTOR_WAIT.observe(times.started - times.submitted)
+        if times.created is not None:
+            JOB_QUEUE_WAIT.observe(max(0.0, time.time() - times.created))
+    elif status in TERMINAL_STATUSES:
+        JOBS_FINISHED.labels(times.playbook, status.value).inc()
+        if times.started is not None:
+            JOB_DURATION.labels(times.playbook).observe(
+                time.monotonic() - times.started
+            )
+
+
+def job_done(ident: str, error: bool = False) -> None:
+    """Forgets the timings of a job once the executor is done with it.
+
+    ``error`` is set for a job that raised instead of reaching a final status.
+    """
+    with _lock:
+        times = _jobs.pop(ident, None)
+    if error and times is not None:
+        JOBS_FINISHED.labels(times.playbook, "error").inc()
+
+
+def timed(operation: str) -> Callable[[F], F]:
+    """Decorates a database helper, sync or async, to observe its duration."""
+    histogram = DB_OPERATION_SECONDS.labels(operation)
+
+    def decorator(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+
+            return cast(F, async_wrapper)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return cast(F, wrapper)
+
+    return decorator
@@ -0,0 +1,126 @@
+"""Reconciliation of the jobs a previous run of the API left unfinished.
+
+In local execution mode the job queue and the running jobs live in the API
+process, so they are lost when it stops while their rows stay unfinished. At
+startup, before any new job is accepted:
+
+* jobs that never started (``created`` or ``queued``) are queued again, in order
+  of submission, from the parameters stored with them. Jobs stored before their
+  parameters were, which have no request hash, are failed instead of being run
+  without them,
+* jobs that started are not run again, as they may have changed the hosts
+  already. They get the final status ansible_runner wrote to their artifacts, or
+  ``failed`` if it didn't write one.
+
+Unfinished jobs are read and updated ``recovery_batch_size`` at a time, using the
+status index, so the number of finished jobs doesn't matter. In distributed mode
+the leases of the workers take care of this instead.
+"""
+from dataclasses import dataclass
+import datetime
+import logging
+from typing import Any, Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from restful_runner import artifacts, database, metrics, scheduler
+from restful_runner.config import ApplicationSettings
+from restful_runner.schema import TERMINAL_STATUSES, AnsibleRunnerStatus
+
+
+logger = logging.getLogger("restful_runner")
+
+_NOT_STARTED = frozenset([AnsibleRunnerStatus.CREATED, AnsibleRunnerStatus.QUEUED])
+
+
+@dataclass
+class RecoveryReport:
+    requeued: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+def _failed_fields() -> Dict[str, Any]:
+    return {"status": AnsibleRunnerStatus.FAILED, "end_time": datetime.datetime.now()}
+
+
+def _finished_fields(settings: ApplicationSettings, job_uuid: str) -> Dict[str, Any]:
+    found = artifacts.final_status(settings, job_uuid)
+    if found is None:
+        return _failed_fields()
+    status_name, finished = found
+    try:
+        status = AnsibleRunnerStatus(status_name)
+    except ValueError:
+        status = AnsibleRunnerStatus.FAILED
+    if status not in TERMINAL_STATUSES:
+        status = AnsibleRunnerStatus.FAILED
+    return {"status": status, "end_time": datetime.datetime.fromtimestamp(finished)}
+
+
+def recover_jobs(
+    sessionmaker: Callable[[], Session],
+    settings: ApplicationSettings,
+    job_scheduler: scheduler.JobScheduler,
+) -> RecoveryReport:
+    """Requeues or finishes the unfinished jobs, see the module docstring."""
+    report = RecoveryReport()
+    after_id = 0
+    while True:
+        with sessionmaker() as session:
+            jobs = database.get_unfinished_ansible_jobs(
+                session, after_id, settings.recovery_batch_size
+            )
+            if not jobs:
+                if report != RecoveryReport():
+                    logger.info("Recovered unfinished jobs: %s", report)
+                return report
+            after_id = jobs[-1].id
+
+            updates: Dict[str, Dict[str, Any]] = {}
+            requeue = []
+            for job in jobs:
+                if job.status in _NOT_STARTED and job.request_hash is None:
+                    logger.warning(
+                        "Not requeuing job %s, its parameters weren't stored",
+                        job.job_uuid,
+                    )
+                    updates[job.job_uuid] = _failed_fields()
+                    report.failed += 1
+                    continue
+                if job.status in _NOT_STARTED:
+                    updates[job.job_uuid] = {"status": AnsibleRunnerStatus.QUEUED}
+                    requeue.append(job)
+                    continue
+                updates[job.job_uuid] = _finished_fields(settings, job.job_uuid)
+                if updates[job.job_uuid]["status"] == AnsibleRunnerStatus.FAILED:
+                    report.failed += 1
+                else:
+                    report.completed += 1
+            # Written before queueing, so these don't overwrite the new statuses
+            database.update_ansible_jobs(session, updates)
+
+            rejected: Dict[str, Dict[str, Any]] = {}
+            for job in requeue:
+                # Rows created before the column existed have no creation time
+                if job.created_time is not None:
+                    metrics.job_created(job.job_uuid, job.created_time.timestamp())
+                try:
+                    job_scheduler.submit(
+                        job.job_uuid,
+                        job.job_name,
+                        job.initiator,
+                        priority=job.priority or 0,
+                        extravars=job.extravars,
+                        tags=job.tags,
+                        timeout=job.timeout,
+                    )
+                except scheduler.AdmissionError as exc:
+                    logger.warning("Could not requeue job %s: %s", job.job_uuid, exc)
+                    metrics.job_done(job.job_uuid)
+                    rejected[job.job_uuid] = _failed_fields()
+                    continue
+                report.requeued += 1
+            if rejected:
+                database.update_ansible_jobs(session, rejected)
+                report.failed += len(rejected)
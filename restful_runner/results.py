@@ -0,0 +1,137 @@
+"""Compact summaries of the outcome of jobs, stored as their ``result``.
+
+At the end of a playbook Ansible reports, for every host, how many tasks were ok,
+changed, failed and so on in a ``playbook_on_stats`` event. ``ResultCollector``
+keeps that event as the events of a job go by, which spares reading them all back
+from the artifacts the way ``Runner.stats`` does. Once the job has finished its
+summary looks like::
+
+    {
+        "rc": 2,
+        "duration": 12.5,
+        "hosts": {
+            "web1": {"ok": 4, "changed": 1, "failed": 0, "unreachable": 0},
+            "web2": {"ok": 1, "changed": 0, "failed": 1, "unreachable": 0},
+        },
+    }
+
+``duration`` is the number of seconds from the start of the playbook to its
+stats, None along with ``hosts`` when the playbook never got that far.
+``aggregate_results`` sums the summaries of many jobs up per host.
+"""
+import datetime
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from restful_runner.schema import (
+    AnsibleRunnerStatus,
+    HostResults,
+    ResultSummary,
+)
+
+
+# Counters of a host in a summary, and the stats of Ansible they come from
+HOST_COUNTERS = {
+    "ok": "ok",
+    "changed": "changed",
+    "failed": "failures",
+    "unreachable": "dark",
+}
+
+
+def host_counts(stats: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """Returns the counters of every host from the data of a stats event."""
+    hosts: Dict[str, Dict[str, int]] = {
+        host: dict.fromkeys(HOST_COUNTERS, 0) for host in stats.get("processed") or {}
+    }
+    for counter, stat in HOST_COUNTERS.items():
+        for host, count in (stats.get(stat) or {}).items():
+            hosts.setdefault(host, dict.fromkeys(HOST_COUNTERS, 0))[counter] = count
+    return hosts
+
+
+def _timestamp(event: Dict[str, Any]) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.fromisoformat(event["created"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ResultCollector:
+    """Event handler picking up what the summaries of running jobs need."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started: Dict[str, Optional[datetime.datetime]] = {}
+        self._stats: Dict[str, Tuple[Dict[str, Any], Optional[datetime.datetime]]] = {}
+
+    def event_handler(self, event: Dict[str, Any]) -> bool:
+        kind = event.get("event")
+        if kind == "playbook_on_start":
+            with self._lock:
+                self._started[event.get("runner_ident", "")] = _timestamp(event)
+        elif kind == "playbook_on_stats":
+            with self._lock:
+                self._stats[event.get("runner_ident", "")] = (
+                    event.get("event_data") or {},
+                    _timestamp(event),
+                )
+        return True
+
+    def pop(self, ident: str, rc: Optional[int]) -> Dict[str, Any]:
+        """Returns the summary of a finished job and forgets about the job."""
+        with self._lock:
+            started = self._started.pop(ident, None)
+            stats, ended = self._stats.pop(ident, ({}, None))
+
+        duration = None
+        if started is not None and ended is not None:
+            duration = round((ended - started).total_seconds(), 3)
+        return {"rc": rc, "duration": duration, "hosts": host_counts(stats)}
+
+    def discard(self, ident: str) -> None:
+        """Forgets about a job that won't get a summary."""
+        with self._lock:
+            self._started.pop(ident, None)
+            self._stats.pop(ident, None)
+
+
+def aggregate_results(
+    rows: Iterable[Tuple[str, AnsibleRunnerStatus, Any]]
+) -> Tuple[ResultSummary, List[HostResults]]:
+    """Sums summaries up, given as (job_uuid, status, result) rows oldest first.
+
+    Rows without a summary, such as jobs that were canceled before they started,
+    only count towards the jobs per status. Hosts are sorted by name.
+    """
+    jobs_per_status: Dict[str, int] = {}
+    jobs_with_errors = 0
+    hosts: Dict[str, Dict[str, Any]] = {}
+    for job_uuid, status, result in rows:
+        jobs_per_status[status.value] = jobs_per_status.get(status.value, 0) + 1
+        if not isinstance(result, dict):
+            continue
+        if result.get("rc"):
+            jobs_with_errors += 1
+        for host, counts in (result.get("hosts") or {}).items():
+            totals = hosts.get(host)
+            if totals is None:
+                totals = hosts[host] = dict.fromkeys(HOST_COUNTERS, 0)
+                totals.update(host=host, jobs=0, last_failed_job_uuid=None)
+            totals["jobs"] += 1
+            totals["last_job_uuid"] = job_uuid
+            for counter in HOST_COUNTERS:
+                totals[counter] += counts.get(counter, 0)
+            if counts.get("failed") or counts.get("unreachable"):
+                totals["last_failed_job_uuid"] = job_uuid
+
+    summary = ResultSummary(
+        jobs=sum(jobs_per_status.values()),
+        jobs_per_status=jobs_per_status,
+        jobs_with_errors=jobs_with_errors,
+        hosts=len(hosts),
+        changed_hosts=sum(1 for totals in hosts.values() if totals["changed"]),
+        failed_hosts=sum(1 for totals in hosts.values() if totals["failed"]),
+        unreachable_hosts=sum(1 for totals in hosts.values() if totals["unreachable"]),
+    )
+    return summary, [HostResults(**hosts[host]) for host in sorted(hosts)]
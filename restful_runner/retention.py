@@ -0,0 +1,183 @@
+"""Background cleanup of job artifacts and old jobs.
+
+Every ``retention_interval_seconds`` the retention engine:
+
+1. compresses the artifact directory of every finished job into one archive,
+2. deletes archives older than ``artifact_max_age_days``,
+3. deletes the oldest archives while all artifacts take more than
+   ``artifact_max_total_mb``,
+4. deletes jobs that ended more than ``job_max_age_days`` ago, along with their
+   events and artifacts, ``retention_batch_size`` jobs per transaction.
+"""
+from dataclasses import dataclass
+import datetime
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from restful_runner import artifacts, database
+from restful_runner.config import ApplicationSettings
+
+
+logger = logging.getLogger("restful_runner")
+
+_DAY = 24 * 3600
+
+
+@dataclass
+class RetentionReport:
+    compressed: int = 0
+    archives_deleted: int = 0
+    bytes_freed: int = 0
+    jobs_deleted: int = 0
+
+
+def _directory_size(directory: str) -> int:
+    size = 0
+    for parent, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(parent, filename)).st_size
+            except OSError:
+                continue
+    return size
+
+
+def _scan_archives(root: str) -> Tuple[List[Tuple[float, int, str]], int]:
+    """Returns the archives under root, oldest first, and the size of all artifacts.
+
+    Each archive is given as its modification time, size and path.
+    """
+    archives: List[Tuple[float, int, str]] = []
+    total_size = 0
+    with os.scandir(root) as scanner:
+        for entry in scanner:
+            if entry.is_dir():
+                # Artifacts of running jobs count towards the total
+                total_size += _directory_size(entry.path)
+            elif entry.name.endswith(artifacts.ARCHIVE_SUFFIX):
+                stat = entry.stat()
+                archives.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+    archives.sort()
+    return archives, total_size
+
+
+class RetentionEngine:
+    """Applies the retention policies, see the module docstring.
+
+    ``active_jobs`` returns the jobs running on this node, whose artifacts are
+    left alone. ``on_deleted`` is called with the UUIDs of the jobs deleted.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: Callable[[], Session],
+        settings: ApplicationSettings,
+        active_jobs: Callable[[], List[str]] = list,
+        on_deleted: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        self._sessionmaker = sessionmaker
+        self._settings = settings
+        self._active_jobs = active_jobs
+        self._on_deleted = on_deleted
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run_once(self, now: Optional[float] = None) -> RetentionReport:
+        """Applies every retention policy once."""
+        now = time.time() if now is None else now
+        report = RetentionReport()
+        root = artifacts.artifact_root(self._settings)
+        if os.path.isdir(root):
+            if self._settings.artifact_compression:
+                report.compressed = self._compress_finished(root)
+            self._prune_archives(root, now, report)
+        if self._settings.job_max_age_days is not None:
+            ended_before = datetime.datetime.fromtimestamp(
+                now - self._settings.job_max_age_days * _DAY
+            )
+            report.jobs_deleted = self._prune_jobs(ended_before)
+        return report
+
+    def _compress_finished(self, root: str) -> int:
+        active = set(self._active_jobs())
+        compressed = 0
+        with os.scandir(root) as scanner:
+            directories = [entry for entry in scanner if entry.is_dir()]
+        for entry in directories:
+            if entry.name in active or not artifacts.is_finished(entry.path):
+                continue
+            try:
+                artifacts.compress(entry.path, entry.path + artifacts.ARCHIVE_SUFFIX)
+                compressed += 1
+            except OSError:
+                logger.exception("Failed to compress artifacts of job %s", entry.name)
+        return compressed
+
+    def _prune_archives(self, root: str, now: float, report: RetentionReport) -> None:
+        max_age_days = self._settings.artifact_max_age_days
+        max_total_mb = self._settings.artifact_max_total_mb
+        if max_age_days is None and max_total_mb is None:
+            return
+
+        archives, total_size = _scan_archives(root)
+        max_total = None if max_total_mb is None else max_total_mb * 1024 * 1024
+        for mtime, size, path in archives:
+            expired = max_age_days is not None and now - mtime > max_age_days * _DAY
+            over_size = max_total is not None and total_size > max_total
+            if not expired and not over_size:
+                # Archives are sorted by age, the remaining ones are newer
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                logger.exception("Failed to delete artifact archive %s", path)
+                continue
+            total_size -= size
+            report.archives_deleted += 1
+            report.bytes_freed += size
+
+    def _prune_jobs(self, ended_before: datetime.datetime) -> int:
+        batch_size = self._settings.retention_batch_size
+        deleted = 0
+        while not self._stopping.is_set():
+            with self._sessionmaker() as session:
+                job_uuids = database.delete_finished_ansible_jobs(
+                    session, ended_before, batch_size
+                )
+            if job_uuids and self._on_deleted is not None:
+                self._on_deleted(job_uuids)
+            for job_uuid in job_uuids:
+                self._delete_artifacts(job_uuid)
+            deleted += len(job_uuids)
+            if len(job_uuids) < batch_size:
+                break
+        return deleted
+
+    def _delete_artifacts(self, job_uuid: str) -> None:
+        archive = artifacts.archive_path(self._settings, job_uuid)
+        if os.path.exists(archive):
+            os.remove(archive)
+        shutil.rmtree(artifacts.artifact_path(self._settings, job_uuid), True)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._settings.retention_interval_seconds):
+            try:
+                report = self.run_once()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Retention run failed")
+                continue
+            if report != RetentionReport():
+                logger.info("Retention run: %s", report)
@@ -0,0 +1,177 @@
+"""Resources of the running API application, and the dependencies that get them.
+
+The API creates a ``Runtime`` when it starts and stops it when it shuts down, see
+``api.create_app``.
+"""
+import asyncio
+import datetime
+import functools
+from typing import AsyncGenerator, Awaitable, Callable
+
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import HTTPConnection
+
+from restful_runner import (
+    cache,
+    catalog,
+    config,
+    database,
+    environments,
+    events,
+    executors,
+    recovery,
+    retention,
+    scheduler,
+    schedules,
+    services,
+    utils,
+    writers,
+)
+from restful_runner.schema import EventHandlerInterface
+
+
+# Starts the job of a scheduled run, returns the UUID of its job
+LaunchInterface = Callable[
+    ["Runtime", schedules.ScheduleEntry, datetime.datetime], Awaitable[str]
+]
+
+
+class Runtime:  # pylint: disable=too-many-instance-attributes
+    """The resources of a running application, created by its lifespan.
+
+    Nothing is done until ``start``: the database is upgraded, jobs left over by
+    the last run are recovered and the background threads and tasks start.
+    ``launch_scheduled`` starts the job of a scheduled run, see ``schedules``.
+    Endpoints reach every resource through its attributes, hence their number.
+    """
+
+    def __init__(
+        self, settings: config.ApplicationSettings, launch_scheduled: LaunchInterface
+    ) -> None:
+        self.settings = settings
+        self.db = database.DatabaseConnection(settings.db_url, settings)
+
+        self.executor = executors.build_executor(
+            settings.executor_backend, settings.max_executor_threads
+        )
+        self.job_cache = cache.JobCache(settings.job_cache_size)
+        self.status_writer = writers.StatusWriter(
+            self.db.write_session_local,
+            settings.status_flush_interval,
+            settings.status_flush_size,
+            on_written=self.job_cache.invalidate_many,
+        )
+        if settings.status_writer_batching:
+            status_handler = utils.build_batched_status_handler(self.status_writer)
+            result_handler = utils.build_batched_result_handler(self.status_writer)
+        else:
+            status_handler = utils.build_status_handler(
+                self.db.write_session_local, self.job_cache
+            )
+            result_handler = utils.build_result_handler(
+                self.db.write_session_local, self.job_cache
+            )
+
+        self.event_broker = events.EventBroker(max_events=settings.event_buffer_size)
+        event_handler: EventHandlerInterface = self.event_broker.event_handler
+        self.event_writer = writers.EventWriter(
+            self.db.write_session_local,
+            settings.event_flush_interval,
+            settings.event_flush_size,
+        )
+        if settings.event_store:
+            event_handler = utils.combine_event_handlers(
+                event_handler, utils.build_event_store_handler(self.event_writer)
+            )
+
+        self.playbook_catalog = catalog.build_catalog(settings)
+        self.environment = environments.PreparedEnvironment(
+            settings, lambda: self.playbook_catalog.etag
+        )
+
+        self.executor_service = services.PlaybookExecutorService(
+            self.executor,
+            utils.combine_status_handlers(
+                status_handler, self.event_broker.status_handler
+            ),
+            settings,
+            event_handler=event_handler,
+            environment=self.environment,
+            result_handler=result_handler,
+        )
+        self.executor_service.add_done_listener(self.event_broker.finish)
+        self.job_scheduler = scheduler.JobScheduler(
+            self.executor_service,
+            max_running=settings.max_executor_threads,
+            max_queue_size=settings.max_queue_size,
+            max_running_per_playbook=settings.max_running_per_playbook,
+            max_running_per_initiator=settings.max_running_per_initiator,
+            max_queued_per_initiator=settings.max_queued_per_initiator,
+        )
+        self.retention_engine = retention.RetentionEngine(
+            self.db.write_session_local,
+            settings,
+            self.executor_service.active_jobs,
+            on_deleted=self.job_cache.invalidate_many,
+        )
+        self.schedule_runner = schedules.ScheduleRunner(
+            self.db.async_session_local,
+            functools.partial(launch_scheduled, self),
+            tick_seconds=settings.schedule_tick_seconds,
+            sync_seconds=settings.schedule_sync_seconds,
+        )
+
+        # Serializes coalescing submissions on this node, so identical requests
+        # arriving together attach to one job instead of all missing each other
+        self.coalesce_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        """Starts the application, from a coroutine of the event loop to run on."""
+        settings = self.settings
+        database.upgrade_schema(self.db.get_engine())
+        if settings.status_writer_batching:
+            self.status_writer.start()
+        if settings.event_store:
+            self.event_writer.start()
+        self.playbook_catalog.start()
+        self.environment.start()
+
+        # Workers run the jobs and recover those of their expired leases in
+        # distributed mode
+        if settings.execution_mode == "local":
+            if settings.recover_jobs_on_startup:
+                recovery.recover_jobs(
+                    self.db.write_session_local, settings, self.job_scheduler
+                )
+            services.preload_ansible_runner()
+
+        self.retention_engine.start()
+        if settings.schedules_enabled:
+            self.schedule_runner.start()
+
+    async def stop(self) -> None:
+        """Stops the application, waiting for the jobs that are running."""
+        self.playbook_catalog.stop()
+        self.environment.stop()
+        self.retention_engine.stop()
+        self.schedule_runner.stop()
+        # Before the writers stop, so the last statuses of the jobs are written
+        await run_in_threadpool(self.executor.shutdown)
+        if self.settings.status_writer_batching:
+            self.status_writer.stop()
+        if self.settings.event_store:
+            self.event_writer.stop()
+        await self.db.dispose()
+
+
+def get_runtime(connection: HTTPConnection) -> Runtime:
+    return connection.app.state.runtime
+
+
+async def get_session(
+    runtime: Runtime = Depends(get_runtime),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with runtime.db.async_session_local() as session:
+        yield session
@@ -0,0 +1,278 @@
+from collections import Counter
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from restful_runner.schema import QueueStats
+from restful_runner.services import PlaybookExecutorService
+
+
+logger = logging.getLogger("restful_runner")
+
+# Weight of the most recent wait time in the moving average of wait times
+_WAIT_TIME_SMOOTHING = 0.1
+
+
+class AdmissionError(Exception):
+    """Raised when a job is not admitted to the queue."""
+
+
+class QueueFullError(AdmissionError):
+    """Raised when the queue has reached its maximum size."""
+
+
+class InitiatorQueueFullError(AdmissionError):
+    """Raised when an initiator has reached its maximum number of queued jobs."""
+
+
+@dataclass(order=True)
+class QueuedJob:  # pylint: disable=too-many-instance-attributes
+    # The arguments of submit, ordered by priority then submission order
+    sort_key: Tuple[int, int]
+    ident: str = field(compare=False)
+    playbook: str = field(compare=False)
+    initiator: str = field(compare=False)
+    extravars: Optional[Dict[str, Any]] = field(compare=False, default=None)
+    tags: Optional[List[str]] = field(compare=False, default=None)
+    timeout: Optional[int] = field(compare=False, default=None)
+    enqueue_time: float = field(compare=False, default_factory=time.monotonic)
+
+
+class JobScheduler:  # pylint: disable=too-many-instance-attributes
+    """Priority queue with admission control in front of the executor service.
+
+    Jobs are started in order of descending priority, then submission order, as
+    long as the number of running jobs stays below ``max_running`` and below the
+    per-playbook and per-initiator limits. Jobs that are blocked by a limit are
+    skipped over so they don't hold back the jobs behind them.
+
+    The queue, the running counters and the statistics are all guarded by one
+    lock, so they are kept together here rather than split into helpers.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        executor_service: PlaybookExecutorService,
+        max_running: int,
+        max_queue_size: int,
+        *,
+        max_running_per_playbook: Optional[int] = None,
+        max_running_per_initiator: Optional[int] = None,
+        max_queued_per_initiator: Optional[int] = None,
+    ) -> None:
+        self._executor_service = executor_service
+        self._max_running = max_running
+        self._max_queue_size = max_queue_size
+        self._max_running_per_playbook = max_running_per_playbook
+        self._max_running_per_initiator = max_running_per_initiator
+        self._max_queued_per_initiator = max_queued_per_initiator
+
+        self._lock = threading.Lock()
+        self._queue: List[QueuedJob] = []
+        self._sequence = itertools.count()
+        self._queued_per_initiator: Counter = Counter()
+        self._running: Dict[str, QueuedJob] = {}
+        # Dispatched jobs canceled before they were handed to the executor service
+        self._canceled: Set[str] = set()
+        self._running_per_playbook: Counter = Counter()
+        self._running_per_initiator: Counter = Counter()
+        self._average_wait = 0.0
+        self._dispatched_total = 0
+        self._rejected_total = 0
+
+        executor_service.add_done_listener(self.job_done)
+
+    def submit(  # pylint: disable=too-many-arguments
+        self,
+        ident: str,
+        playbook: str,
+        initiator: str,
+        *,
+        priority: int = 0,
+        extravars: Optional[Dict[str, Any]] = None,
+        tags: Optional[List[str]] = None,
+        timeout: Optional[int] = None,
+    ) -> None:
+        """Queues a job, starting it right away if there is capacity for it."""
+        self.submit_many(
+            [
+                {
+                    "ident": ident,
+                    "playbook": playbook,
+                    "initiator": initiator,
+                    "priority": priority,
+                    "extravars": extravars,
+                    "tags": tags,
+                    "timeout": timeout,
+                }
+            ]
+        )
+
+    def submit_many(self, jobs: Sequence[Dict[str, Any]]) -> None:
+        """Queues several jobs, given as dicts of the arguments of ``submit``.
+
+        Either all of the jobs are admitted or none of them is.
+        """
+        queued = [
+            QueuedJob(
+                (-job.get("priority", 0), next(self._sequence)),
+                job["ident"],
+                job["playbook"],
+                job["initiator"],
+                job.get("extravars"),
+                job.get("tags"),
+                job.get("timeout"),
+            )
+            for job in jobs
+        ]
+        per_initiator = Counter(job.initiator for job in queued)
+        with self._lock:
+            if len(self._queue) + len(queued) > self._max_queue_size:
+                self._rejected_total += len(queued)
+                raise QueueFullError(
+                    f"Queue is full ({self._max_queue_size} jobs are waiting)"
+                )
+            if self._max_queued_per_initiator is not None:
+                for initiator, count in per_initiator.items():
+                    if (
+                        self._queued_per_initiator[initiator] + count
+                        > self._max_queued_per_initiator
+                    ):
+                        self._rejected_total += len(queued)
+                        raise InitiatorQueueFullError(
+                            f"Initiator {initiator} already has "
+                            f"{self._max_queued_per_initiator} queued jobs"
+                        )
+
+            for job in queued:
+                heapq.heappush(self._queue, job)
+            self._queued_per_initiator.update(per_initiator)
+
+        self._dispatch()
+
+    def has_job(self, ident: str) -> bool:
+        """Returns whether a job is queued or running here."""
+        with self._lock:
+            return ident in self._running or any(
+                job.ident == ident for job in self._queue
+            )
+
+    def cancel(self, ident: str) -> bool:
+        """Cancels a queued or running job, returns False if it isn't known here."""
+        with self._lock:
+            job = next((job for job in self._queue if job.ident == ident), None)
+            if job is not None:
+                self._queue.remove(job)
+                heapq.heapify(self._queue)
+                self._queued_per_initiator[job.initiator] -= 1
+            dispatched = ident in self._running
+
+        if job is not None:
+            self._executor_service.report_canceled(ident)
+            return True
+        if self._executor_service.cancel_job(ident):
+            return True
+        if not dispatched:
+            return False
+
+        # Dispatched but not submitted yet, _dispatch drops it unless it got
+        # submitted in the meantime
+        with self._lock:
+            self._canceled.add(ident)
+        if self._executor_service.cancel_job(ident):
+            with self._lock:
+                self._canceled.discard(ident)
+        return True
+
+    def job_done(self, ident: str) -> None:
+        """Releases the capacity held by a finished job and starts queued jobs."""
+        with self._lock:
+            self._canceled.discard(ident)
+            job = self._running.pop(ident, None)
+            if job is None:
+                return
+            self._running_per_playbook[job.playbook] -= 1
+            self._running_per_initiator[job.initiator] -= 1
+
+        self._dispatch()
+
+    def stats(self) -> QueueStats:
+        with self._lock:
+            now = time.monotonic()
+            oldest = min((job.enqueue_time for job in self._queue), default=now)
+            return QueueStats(
+                queued=len(self._queue),
+                running=len(self._running),
+                max_queue_size=self._max_queue_size,
+                max_running=self._max_running,
+                queued_per_playbook=Counter(job.playbook for job in self._queue),
+                oldest_wait_seconds=now - oldest,
+                average_wait_seconds=self._average_wait,
+                dispatched_total=self._dispatched_total,
+                rejected_total=self._rejected_total,
+            )
+
+    def _is_blocked(self, job: QueuedJob) -> bool:
+        return (
+            self._max_running_per_playbook is not None
+            and self._running_per_playbook[job.playbook]
+            >= self._max_running_per_playbook
+        ) or (
+            self._max_running_per_initiator is not None
+            and self._running_per_initiator[job.initiator]
+            >= self._max_running_per_initiator
+        )
+
+    def _take_next(self) -> Optional[QueuedJob]:
+        """Removes the next job that may start from the queue, if any."""
+        blocked = []
+        selected = None
+        while self._queue:
+            job = heapq.heappop(self._queue)
+            if not self._is_blocked(job):
+                selected = job
+                break
+            blocked.append(job)
+
+        for job in blocked:
+            heapq.heappush(self._queue, job)
+        return selected
+
+    def _dispatch(self) -> None:
+        to_start = []
+        with self._lock:
+            while len(self._running) < self._max_running:
+                job = self._take_next()
+                if job is None:
+                    break
+
+                self._queued_per_initiator[job.initiator] -= 1
+                self._running[job.ident] = job
+                self._running_per_playbook[job.playbook] += 1
+                self._running_per_initiator[job.initiator] += 1
+
+                wait = time.monotonic() - job.enqueue_time
+                self._average_wait += _WAIT_TIME_SMOOTHING * (wait - self._average_wait)
+                self._dispatched_total += 1
+                to_start.append(job)
+
+        # Submit outside of the lock, the done callback may run synchronously
+        for job in to_start:
+            with self._lock:
+                canceled = job.ident in self._canceled
+                self._canceled.discard(job.ident)
+            if canceled:
+                self._executor_service.report_canceled(job.ident)
+                continue
+            try:
+                self._executor_service.submit_job(
+                    job.ident, job.playbook, job.extravars, job.tags, job.timeout
+                )
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to submit job: %s", job.ident)
+                # Releases its capacity through job_done, a done listener
+                self._executor_service.report_failed(job.ident)
@@ -0,0 +1,452 @@
+"""Recurring playbook runs, stored in the ``schedules`` table.
+
+A schedule repeats on a cron expression, in the local time of the server, or
+every ``interval_seconds``. Interval schedules are anchored to their first run,
+so they don't drift by the time it takes to launch a job.
+
+``ScheduleRunner`` keeps every enabled schedule in a hashed timer wheel: a ring
+of ``slots`` buckets, each covering ``tick_seconds``, with every schedule in the
+bucket of its next run. The runner wakes up once per tick and only looks at the
+bucket of that tick, so the cost of a tick depends on the schedules that are due,
+not on how many there are. Due schedules are launched in order through the same
+path as ``POST /playbooks/{path}``, with an Idempotency-Key derived from the
+schedule and the time of the run: several API nodes running the same schedules
+start every run once. Their next runs are then stored in one statement.
+
+Runs missed while no runner was up are made up for by a single run when the
+runner starts. While the previous job of a schedule is queued or running, the
+``overlap`` policy of the schedule decides what happens to a run, see
+``OverlapPolicy``.
+"""
+import asyncio
+import calendar
+from dataclasses import dataclass
+import datetime
+import logging
+import math
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    List,
+    Optional,
+    Set,
+)
+
+from restful_runner import database, metrics
+from restful_runner.data_model import Schedule
+from restful_runner.schema import OverlapPolicy
+
+
+logger = logging.getLogger("restful_runner")
+
+# Name, lowest and highest value of the fields of a cron expression
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+_CRON_NAMES = {
+    3: {name.lower(): index for index, name in enumerate(calendar.month_abbr) if name},
+    # Sunday is 0, as in cron
+    4: {name.lower(): (index + 1) % 7 for index, name in enumerate(calendar.day_abbr)},
+}
+_CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+# Longest time between two matches of a valid expression, February 29 on a
+# given weekday aside
+_CRON_SEARCH_DAYS = 8 * 366
+
+
+def _parse_cron_value(text: str, index: int) -> int:
+    name, low, high = _CRON_FIELDS[index]
+    value = _CRON_NAMES.get(index, {}).get(text.lower())
+    if value is None:
+        try:
+            value = int(text)
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {text!r}") from None
+    if not low <= value <= high:
+        raise ValueError(f"The {name} must be between {low} and {high}: {value}")
+    return value
+
+
+def _parse_cron_field(text: str, index: int) -> FrozenSet[int]:
+    _, low, high = _CRON_FIELDS[index]
+    values: Set[int] = set()
+    for part in text.split(","):
+        span, _, step_text = part.partition("/")
+        step = 1
+        if step_text:
+            step = int(step_text) if step_text.isdigit() else 0
+            if step < 1:
+                raise ValueError(f"Invalid step: {part!r}")
+        if span == "*":
+            first, last = low, high
+        elif "-" in span:
+            first_text, _, last_text = span.partition("-")
+            first = _parse_cron_value(first_text, index)
+            last = _parse_cron_value(last_text, index)
+            if first > last:
+                raise ValueError(f"Invalid range: {part!r}")
+        else:
+            first = _parse_cron_value(span, index)
+            last = high if step_text else first
+        values.update(range(first, last + 1, step))
+    if index == 4 and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return frozenset(values)
+
+
+class CronExpression:  # pylint: disable=too-many-instance-attributes
+    """Five field cron expression, as understood by the cron daemon.
+
+    Fields hold ``*``, values, ranges, steps and lists of those, and month and
+    weekday names. When both the day of month and the day of week are
+    restricted, a day matching either one matches, as in cron. ``@daily`` and
+    the other macros are accepted as well. The parsed fields are kept along
+    with the sorted ones used to find the next run.
+    """
+
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        fields = _CRON_MACROS.get(expression.strip(), expression).split()
+        if len(fields) != len(_CRON_FIELDS):
+            raise ValueError(
+                f"A cron expression has {len(_CRON_FIELDS)} fields: {expression!r}"
+            )
+        (
+            self._minutes,
+            self._hours,
+            self._days,
+            self._months,
+            self._weekdays,
+        ) = (_parse_cron_field(text, index) for index, text in enumerate(fields))
+        self._sorted_minutes = sorted(self._minutes)
+        self._sorted_hours = sorted(self._hours)
+        self._any_day = fields[2].startswith("*")
+        self._any_weekday = fields[4].startswith("*")
+        # Rejects expressions that never match, such as February 30
+        self.next_after(datetime.datetime(2000, 1, 1))
+
+    def _day_matches(self, day: datetime.datetime) -> bool:
+        in_month = day.day in self._days
+        in_week = (day.weekday() + 1) % 7 in self._weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, after: datetime.datetime) -> datetime.datetime:
+        """Returns the first matching minute after the given time."""
+        candidate = after.replace(second=0, microsecond=0) + datetime.timedelta(
+            minutes=1
+        )
+        last_day = candidate + datetime.timedelta(days=_CRON_SEARCH_DAYS)
+        while candidate < last_day:
+            if candidate.month not in self._months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(
+                    days=1
+                )
+                continue
+            hour = next((h for h in self._sorted_hours if h >= candidate.hour), None)
+            if hour is None:
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(
+                    days=1
+                )
+                continue
+            if hour != candidate.hour:
+                candidate = candidate.replace(hour=hour, minute=0)
+            minute = next(
+                (m for m in self._sorted_minutes if m >= candidate.minute), None
+            )
+            if minute is None:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+                continue
+            return candidate.replace(minute=minute)
+        raise ValueError(f"The cron expression never matches: {self.expression!r}")
+
+
+class TimerWheel:
+    """Hashed timer wheel, see the module docstring.
+
+    Keys are due at the first tick at or after their deadline. Adding, moving
+    and removing a key takes constant time, and so does a tick without due keys.
+    Keys more than one turn of the wheel away stay in their bucket, which is
+    looked at once per turn.
+    """
+
+    def __init__(self, tick_seconds: float, slots: int, now: float) -> None:
+        self._tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        # Slot of every key
+        self._index: Dict[Hashable, int] = {}
+        self._current = math.floor(now / tick_seconds)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, key: Hashable, deadline: float) -> None:
+        """Adds a key or moves it, a deadline in the past is due on the next tick."""
+        self.remove(key)
+        tick = max(math.ceil(deadline / self._tick_seconds), self._current + 1)
+        slot = tick % len(self._slots)
+        self._slots[slot][key] = tick
+        self._index[key] = slot
+
+    def remove(self, key: Hashable) -> None:
+        slot = self._index.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Removes and returns the keys due by ``now``, in order of their tick."""
+        target = math.floor(now / self._tick_seconds)
+        # After a long pause every slot is looked at once
+        first = max(self._current + 1, target - len(self._slots) + 1)
+        due: List[Hashable] = []
+        for tick in range(first, target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            ready = sorted(
+                (key for key, at in slot.items() if at <= target), key=slot.__getitem__
+            )
+            for key in ready:
+                del slot[key]
+                del self._index[key]
+            due.extend(ready)
+        self._current = max(self._current, target)
+        return due
+
+
+@dataclass
+class ScheduleEntry:  # pylint: disable=too-many-instance-attributes
+    """What the runner keeps of a schedule, ``next_run`` is a timestamp."""
+
+    id: int
+    name: str
+    playbook: str
+    overlap: OverlapPolicy
+    initiator: str
+    priority: int
+    extravars: Optional[Dict[str, Any]]
+    tags: Optional[List[str]]
+    timeout: Optional[int]
+    cron: Optional[CronExpression]
+    interval_seconds: Optional[int]
+    next_run: float
+    last_run: Optional[datetime.datetime] = None
+    last_job_uuid: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, schedule: Schedule, now: float) -> "ScheduleEntry":
+        cron = None if schedule.cron is None else CronExpression(schedule.cron)
+        entry = cls(
+            id=schedule.id,
+            name=schedule.name,
+            playbook=schedule.playbook,
+            overlap=schedule.overlap or OverlapPolicy.SKIP,
+            initiator=schedule.initiator,
+            priority=schedule.priority or 0,
+            extravars=schedule.extravars,
+            tags=schedule.tags,
+            timeout=schedule.timeout,
+            cron=cron,
+            interval_seconds=schedule.interval_seconds,
+            next_run=0.0,
+            last_run=schedule.last_run,
+            last_job_uuid=schedule.last_job_uuid,
+        )
+        entry.next_run = (
+            schedule.next_run.timestamp()
+            if schedule.next_run is not None
+            else entry.following(now)
+        )
+        return entry
+
+    def following(self, after: float) -> float:
+        """Returns the time of the first run after ``after``."""
+        if self.cron is not None:
+            return self.cron.next_after(
+                datetime.datetime.fromtimestamp(after)
+            ).timestamp()
+        interval = self.interval_seconds or 0
+        if not self.next_run:
+            return after + interval
+        # Keeps to the times of the previous runs, skipping those in the past
+        missed = max(0, math.floor((after - self.next_run) / interval))
+        return self.next_run + (missed + 1) * interval
+
+
+def next_run(
+    cron: Optional[str], interval_seconds: Optional[int], now: float
+) -> datetime.datetime:
+    """Returns the time of the first run of a new schedule.
+
+    Raises ValueError for an invalid cron expression.
+    """
+    if cron is not None:
+        return CronExpression(cron).next_after(datetime.datetime.fromtimestamp(now))
+    return datetime.datetime.fromtimestamp(now + (interval_seconds or 0))
+
+
+@dataclass
+class ScheduleReport:
+    launched: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+# Starts the job of a run due at the given time, returns the UUID of its job
+LauncherInterface = Callable[[ScheduleEntry, datetime.datetime], Awaitable[str]]
+
+
+class ScheduleRunner:  # pylint: disable=too-many-instance-attributes
+    """Launches the runs of the schedules as they come due.
+
+    ``sessionmaker`` creates async sessions. Schedules are loaded when the runner
+    starts and again every ``sync_seconds``, which picks up the changes made
+    through other API nodes; changes made through this one are passed in with
+    ``put`` and ``remove``. The timings are keyword-only.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        sessionmaker: Callable[[], Any],
+        launcher: LauncherInterface,
+        *,
+        tick_seconds: float = 1.0,
+        sync_seconds: float = 60.0,
+        slots: int = 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._sessionmaker = sessionmaker
+        self._launcher = launcher
+        self._tick_seconds = tick_seconds
+        self._sync_seconds = sync_seconds
+        self._clock = clock
+        self._wheel = TimerWheel(tick_seconds, slots, clock())
+        self._entries: Dict[int, ScheduleEntry] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, entry: ScheduleEntry) -> None:
+        """Adds a schedule, or replaces the one with the same id."""
+        self._entries[entry.id] = entry
+        self._wheel.add(entry.id, entry.next_run)
+
+    def remove(self, schedule_id: int) -> None:
+        self._entries.pop(schedule_id, None)
+        self._wheel.remove(schedule_id)
+
+    async def load(self) -> None:
+        """Replaces the schedules of the runner with the enabled ones stored."""
+        now = self._clock()
+        async with self._sessionmaker() as session:
+            rows = await database.async_get_schedules(session, enabled_only=True)
+        entries = {}
+        for row in rows:
+            try:
+                entries[row.id] = ScheduleEntry.from_row(row, now)
+            except ValueError:
+                logger.exception("Invalid schedule: %s", row.name)
+        for schedule_id in set(self._entries) - set(entries):
+            self.remove(schedule_id)
+        for entry in entries.values():
+            self.put(entry)
+
+    async def run_once(self, now: Optional[float] = None) -> ScheduleReport:
+        """Launches the runs due by ``now``."""
+        now = self._clock() if now is None else now
+        report = ScheduleReport()
+        due = [
+            self._entries[schedule_id]
+            for schedule_id in self._wheel.advance(now)
+            if schedule_id in self._entries
+        ]
+        if not due:
+            return report
+
+        busy = set()
+        skippable = [entry.id for entry in due if entry.overlap == OverlapPolicy.SKIP]
+        if skippable:
+            async with self._sessionmaker() as session:
+                busy = await database.async_get_busy_schedules(session, skippable)
+
+        runs = []
+        for entry in due:
+            run_time = datetime.datetime.fromtimestamp(entry.next_run)
+            if entry.id in busy:
+                report.skipped += 1
+                metrics.SCHEDULED_RUNS.labels("skipped").inc()
+            else:
+                try:
+                    entry.last_job_uuid = await self._launcher(entry, run_time)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to launch the run of %s", entry.name)
+                    report.failed += 1
+                    metrics.SCHEDULED_RUNS.labels("failed").inc()
+                else:
+                    entry.last_run = run_time
+                    report.launched += 1
+                    metrics.SCHEDULED_RUNS.labels("launched").inc()
+                    metrics.SCHEDULE_LAG.observe(max(0.0, now - entry.next_run))
+
+            entry.next_run = entry.following(max(now, entry.next_run))
+            current = self._entries.get(entry.id)
+            if current is entry:
+                self._wheel.add(entry.id, entry.next_run)
+            runs.append(
+                {
+                    "id": entry.id,
+                    # The schedule may have been replaced while launching
+                    "next_run": datetime.datetime.fromtimestamp(
+                        (current or entry).next_run
+                    ),
+                    "last_run": entry.last_run,
+                    "last_job_uuid": entry.last_job_uuid,
+                }
+            )
+
+        async with self._sessionmaker() as session:
+            await database.async_update_schedule_runs(session, runs)
+        return report
+
+    def start(self) -> None:
+        """Starts launching runs, from a coroutine of the event loop to run on."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        await self.load()
+        synced = self._clock()
+        while True:
+            await asyncio.sleep(self._tick_seconds - self._clock() % self._tick_seconds)
+            try:
+                report = await self.run_once()
+                if report.failed:
+                    logger.warning("Scheduled runs: %s", report)
+                if self._clock() - synced >= self._sync_seconds:
+                    await self.load()
+                    synced = self._clock()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Schedule runner tick failed")
@@ -1,15 +1,24 @@
 import enum
 import datetime
-from typing import Any, Callable, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
-import ansible_runner
-from pydantic import BaseModel  # pylint: disable=no-name-in-module
+from pydantic import (  # pylint: disable=no-name-in-module
+    BaseModel,
+    Field,
+    PositiveInt,
+    root_validator,
+)
+
+if TYPE_CHECKING:
+    # Slow to import, only loaded once a job runs, see services.py
+    import ansible_runner
 
 
 class AnsibleRunnerStatus(enum.Enum):
     """Status of an ansible job."""
 
     CREATED = "created"
+    QUEUED = "queued"
     STARTING = "starting"
     RUNNING = "running"
     SUCCESSFUL = "successful"
@@ -18,6 +27,37 @@ class AnsibleRunnerStatus(enum.Enum):
     CANCELED = "canceled"
 
 
+TERMINAL_STATUSES = frozenset(
+    [
+        AnsibleRunnerStatus.SUCCESSFUL,
+        AnsibleRunnerStatus.TIMEOUT,
+        AnsibleRunnerStatus.FAILED,
+        AnsibleRunnerStatus.CANCELED,
+    ]
+)
+
+
+class JobEventStatus(enum.Enum):
+    """Outcome of a task on a host."""
+
+    OK = "ok"
+    FAILED = "failed"
+    UNREACHABLE = "unreachable"
+    SKIPPED = "skipped"
+
+
+class OverlapPolicy(enum.Enum):
+    """What a schedule does when its previous job is still queued or running."""
+
+    # Leave this run out
+    SKIP = "skip"
+    # Start another job, which waits in the queue like any other
+    QUEUE = "queue"
+    # Attach to a queued or running job with the same playbook, extravars and
+    # tags, however it was started, or start one if there is none
+    COALESCE = "coalesce"
+
+
 class AnsibleJob(BaseModel):
     """Information about an ansible job."""
 
@@ -31,6 +71,49 @@ class AnsibleJob(BaseModel):
         orm_mode = True
 
 
+class JobEvent(BaseModel):
+    """Outcome of a task on a host during a job."""
+
+    job_uuid: str
+    counter: Optional[int]
+    host: str
+    play: Optional[str] = None
+    task: Optional[str] = None
+    task_action: Optional[str] = None
+    status: JobEventStatus
+    changed: bool = False
+    duration: Optional[float] = None
+    message: Optional[str] = None
+    created: datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+
+class JobFilter(BaseModel):
+    """Query parameters selecting jobs, every one that is set must match."""
+
+    status: Optional[AnsibleRunnerStatus] = None
+    job_name: Optional[str] = Field(None, alias="playbook")
+    initiator: Optional[str] = None
+    started_after: Optional[datetime.datetime] = None
+    started_before: Optional[datetime.datetime] = None
+
+    class Config:
+        allow_population_by_field_name = True
+
+
+class JobEventFilter(BaseModel):
+    """Query parameters selecting job events, every one that is set must match."""
+
+    job_uuid: Optional[str] = None
+    host: Optional[str] = None
+    task: Optional[str] = None
+    status: Optional[JobEventStatus] = None
+    created_after: Optional[datetime.datetime] = None
+    created_before: Optional[datetime.datetime] = None
+
+
 class StatusHandlerStatus(BaseModel):
     """Structure passed back from the ansible_runner.Runner class to status handler."""
 
@@ -38,13 +121,169 @@ class StatusHandlerStatus(BaseModel):
     runner_ident: str
 
 
+class PlaybookInfo(BaseModel):
+    """A playbook in the project directory."""
+
+    name: str
+    mtime: datetime.datetime
+    size: int
+    plays: List[str]
+    tags: List[str]
+
+
 class StartPlaybookRequest(BaseModel):
     """Request model for starting a playbook."""
 
     extravars: Optional[Dict[str, Any]] = None
     tags: Optional[List[str]] = None
+    priority: int = 0
+    initiator: str = "REST"
+    # Seconds the playbook may run before it is stopped
+    timeout: Optional[PositiveInt] = None
+    # Attach to a queued or running job with the same playbook, extravars and
+    # tags instead of starting another one
+    coalesce: bool = False
+
+
+# Most jobs a single batch request may submit or look up
+MAX_BATCH_SIZE = 1000
+
+
+class BatchJobSubmission(StartPlaybookRequest):
+    """One job of a batch submission."""
+
+    playbook: str
+    idempotency_key: Optional[str] = None
+
+
+class BatchSubmitRequest(BaseModel):
+    """Request model for starting several playbooks at once."""
+
+    jobs: List[BatchJobSubmission] = Field(..., min_items=1, max_items=MAX_BATCH_SIZE)
+
+
+class JobLookupRequest(BaseModel):
+    """Request model for getting several jobs at once."""
+
+    job_uuids: List[str] = Field(..., min_items=1, max_items=MAX_BATCH_SIZE)
+
+
+class JobLookupResponse(BaseModel):
+    """Jobs found by a lookup, in the order requested, and the UUIDs not found."""
+
+    jobs: List[AnsibleJob]
+    missing: List[str]
+
+
+class ResultSummary(BaseModel):
+    """Outcome of the jobs that finished in a period, from their results."""
+
+    jobs: int = 0
+    jobs_per_status: Dict[str, int] = {}
+    # Jobs whose playbook exited with a non-zero return code
+    jobs_with_errors: int = 0
+    hosts: int = 0
+    changed_hosts: int = 0
+    failed_hosts: int = 0
+    unreachable_hosts: int = 0
+
+
+class HostResults(BaseModel):
+    """Task counters of a host summed over the jobs that finished in a period."""
+
+    host: str
+    jobs: int
+    ok: int
+    changed: int
+    failed: int
+    unreachable: int
+    last_job_uuid: str
+    last_failed_job_uuid: Optional[str] = None
+
+
+class CachedHost(BaseModel):
+    """A host with facts in the fact cache."""
+
+    host: str
+    updated: datetime.datetime
+    expired: bool
+
+
+class FactsRequest(BaseModel):
+    """Request model for gathering or invalidating the facts of hosts."""
+
+    # Ansible host pattern, such as a group name
+    pattern: str
+
+
+class ScheduleRequest(BaseModel):
+    """Request model for creating or replacing a schedule.
+
+    Exactly one of ``cron``, a five field cron expression in the local time of
+    the server, and ``interval_seconds`` is set.
+    """
+
+    playbook: str
+    cron: Optional[str] = None
+    interval_seconds: Optional[PositiveInt] = None
+    overlap: OverlapPolicy = OverlapPolicy.SKIP
+    enabled: bool = True
+    extravars: Optional[Dict[str, Any]] = None
+    tags: Optional[List[str]] = None
+    priority: int = 0
+    initiator: str = "schedule"
+    timeout: Optional[PositiveInt] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_recurrence(cls, values):  # pylint: disable=no-self-argument
+        if (values.get("cron") is None) == (values.get("interval_seconds") is None):
+            raise ValueError("Set exactly one of cron and interval_seconds")
+        return values
+
+
+class ScheduleInfo(BaseModel):
+    """A schedule and its latest run."""
+
+    name: str
+    playbook: str
+    cron: Optional[str] = None
+    interval_seconds: Optional[int] = None
+    overlap: OverlapPolicy
+    enabled: bool
+    extravars: Optional[Dict[str, Any]] = None
+    tags: Optional[List[str]] = None
+    priority: int
+    initiator: str
+    timeout: Optional[int] = None
+    next_run: Optional[datetime.datetime] = None
+    last_run: Optional[datetime.datetime] = None
+    last_job_uuid: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class QueueStats(BaseModel):
+    """Depth and wait times of the job queue.
+
+    In distributed mode the queue lives in the database and only the fields that
+    can be derived from it are set.
+    """
+
+    queued: int
+    running: int
+    max_queue_size: int
+    queued_per_playbook: Dict[str, int]
+    oldest_wait_seconds: float
+    max_running: Optional[int] = None
+    average_wait_seconds: Optional[float] = None
+    dispatched_total: Optional[int] = None
+    rejected_total: Optional[int] = None
+
+
+StatusHandlerInterface = Callable[[Dict[str, str], "ansible_runner.RunnerConfig"], None]
 
+EventHandlerInterface = Callable[[Dict[str, Any]], bool]
 
-StatusHandlerInterface = Callable[
-    [Dict[str, str], ansible_runner.interface.RunnerConfig], None
-]
+# Called with the ident and the summary of every job that ran, see results.py
+ResultHandlerInterface = Callable[[str, Dict[str, Any]], None]
@@ -1,29 +1,80 @@
-from concurrent.futures import Executor, Future
+from concurrent.futures import CancelledError, Executor, Future
+import functools
+import importlib
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
 
-import ansible_runner
-import ansible_runner.interface
-
-from restful_runner.schema import StatusHandlerInterface
+from restful_runner import metrics
+from restful_runner.environments import PreparedEnvironment
+from restful_runner.executors import RemoteRunnerConfig
+from restful_runner.results import ResultCollector
+from restful_runner.schema import (
+    AnsibleRunnerStatus,
+    EventHandlerInterface,
+    ResultHandlerInterface,
+    StatusHandlerInterface,
+)
 from restful_runner.config import ApplicationSettings
 from restful_runner.config import get_app_settings
 
 
+if TYPE_CHECKING:
+    import ansible_runner
+
 logger = logging.getLogger("restful_runner")
 
 
-class PlaybookExecutorService:
-    def __init__(
+def preload_ansible_runner() -> threading.Thread:
+    """Imports ansible_runner in the background, ahead of the first job.
+
+    It takes longer to import than the rest of the service, so it is only
+    imported once a job is submitted, which doesn't block on this thread.
+    """
+    thread = threading.Thread(
+        target=importlib.import_module,
+        args=("ansible_runner",),
+        name="preload-ansible-runner",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+class PlaybookExecutorService:  # pylint: disable=too-many-instance-attributes
+    """Runs playbooks on an executor and reports their progress to the handlers.
+
+    The handlers are optional and keyword-only, one per kind of output of a job.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         executor: Executor,
         status_handler: StatusHandlerInterface,
         settings: Optional[ApplicationSettings] = None,
+        *,
+        event_handler: Optional[EventHandlerInterface] = None,
+        environment: Optional[PreparedEnvironment] = None,
+        result_handler: Optional[ResultHandlerInterface] = None,
     ) -> None:
         self._executor: Executor = executor
         self._status_handler = status_handler
+        self._event_handler = event_handler
+        self._environment = environment
+        self._result_handler = result_handler
+        self._results = ResultCollector()
         self._settings = settings if settings is not None else get_app_settings()
         self._future_map: Dict[str, Future] = {}
+        self._cancel_requested: Set[str] = set()
+        self._done_listeners: List[Callable[[str], None]] = []
+
+    def active_jobs(self) -> List[str]:
+        """Returns the idents of the jobs that have been submitted but not finished."""
+        return list(self._future_map)
+
+    def add_done_listener(self, listener: Callable[[str], None]) -> None:
+        """Registers a callable invoked with the ident of every finished job."""
+        self._done_listeners.append(listener)
 
     def submit_job(
         self,
@@ -31,30 +82,147 @@ class PlaybookExecutorService:
         playbook: str,
         extravars: Optional[Dict[str, Any]] = None,
         tags: Optional[List[str]] = None,
+        timeout: Optional[int] = None,
     ) -> None:
         if extravars is None:
             extravars = {}
 
         cmdline = f"--tags {','.join(tags)}" if tags else ""
-
-        future = self._executor.submit(
-            ansible_runner.run,
-            status_handler=self._status_handler,
-            quiet=self._settings.ansible_quiet,
-            project_dir=self._settings.project_dir,
-            artifact_dir=self._settings.artifact_dir,
-            private_data_dir=self._settings.private_data_dir,
-            ident=ident,
-            playbook=playbook,
-            extravars=extravars,
-            cmdline=cmdline,
+        # Results are summed up from the events of the job, see results.py
+        event_handler = (
+            self._handle_event
+            if self._result_handler is not None
+            else self._event_handler
+        )
+        environment_kwargs = (
+            self._environment.run_kwargs() if self._environment is not None else {}
         )
 
-        future.add_done_callback(self.done_callback)
+        # Imported here rather than with the module, see preload_ansible_runner
+        import ansible_runner  # pylint: disable=import-outside-toplevel
+
+        metrics.job_submitted(ident, playbook)
+
+        try:
+            future = self._executor.submit(
+                ansible_runner.run,
+                status_handler=self._status_handler,
+                event_handler=event_handler,
+                quiet=self._settings.ansible_quiet,
+                project_dir=self._settings.project_dir,
+                artifact_dir=self._settings.artifact_dir,
+                private_data_dir=self._settings.private_data_dir,
+                ident=ident,
+                playbook=playbook,
+                extravars=extravars,
+                cmdline=cmdline,
+                timeout=timeout or self._settings.job_timeout,
+                cancel_callback=functools.partial(
+                    self._cancel_requested.__contains__, ident
+                ),
+                # The runner checks for cancellation and timeouts this often
+                settings={"pexpect_timeout": self._settings.cancel_poll_seconds},
+                # Otherwise the extravars, tags and envvars of the first job are
+                # written to env/ in the private data dir, and used by later jobs
+                suppress_env_files=True,
+                **environment_kwargs,
+            )
+        except Exception:
+            metrics.job_done(ident)
+            raise
+
+        # Tracked before adding the callback, which runs right away if it's done
         self._future_map[ident] = future
+        future.add_done_callback(self.done_callback)
+        metrics.ACTIVE_JOBS.set(len(self._future_map))
         logger.info("Submitted job: %s", ident)
 
+    def _handle_event(self, event: Dict[str, Any]) -> bool:
+        self._results.event_handler(event)
+        if self._event_handler is not None:
+            return self._event_handler(event)
+        return True
+
+    def _report_result(self, ident: str, rc: Optional[int]) -> None:
+        summary = self._results.pop(ident, rc)
+        if self._result_handler is None:
+            return
+        try:
+            self._result_handler(ident, summary)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to store the result of job: %s", ident)
+
+    def cancel_job(self, ident: str) -> bool:
+        """Cancels a submitted job, returns False if it isn't known here.
+
+        A job that hasn't started is dropped from the executor. A running job is
+        stopped by the runner, which polls its cancel callback.
+        """
+        future = self._future_map.get(ident)
+        if future is None:
+            return False
+        if not future.cancel():
+            self._cancel_requested.add(ident)
+            logger.info("Requested cancellation of job: %s", ident)
+        return True
+
+    def _future_ident(self, future: Future) -> str:
+        return next(key for key, value in self._future_map.items() if value is future)
+
+    def report_canceled(self, ident: str) -> None:
+        """Reports a job that was canceled before the runner got to it."""
+        self._status_handler(
+            {"status": AnsibleRunnerStatus.CANCELED.value, "runner_ident": ident},
+            RemoteRunnerConfig(ident),
+        )
+        logger.info("Canceled job: %s", ident)
+        metrics.job_done(ident)
+        for listener in self._done_listeners:
+            listener(ident)
+
+    def report_failed(self, ident: str) -> None:
+        """Reports a job that failed before the runner could report a status."""
+        metrics.job_done(ident, error=True)
+        self._write_failed(ident)
+        for listener in self._done_listeners:
+            listener(ident)
+
+    def _write_failed(self, ident: str) -> None:
+        # Otherwise the job would stay queued or starting for good
+        try:
+            self._status_handler(
+                {"status": AnsibleRunnerStatus.FAILED.value, "runner_ident": ident},
+                RemoteRunnerConfig(ident),
+            )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to store the failure of job: %s", ident)
+
     def done_callback(self, future: Future) -> None:
-        runner: ansible_runner.Runner = future.result()
-        self._future_map.pop(runner.config.ident)
-        logger.info("Finished job: %s", runner.config.ident)
+        error = False
+        try:
+            runner: ansible_runner.Runner = future.result()
+            ident = runner.config.ident
+        except CancelledError:
+            ident = self._future_ident(future)
+            self._future_map.pop(ident)
+            metrics.ACTIVE_JOBS.set(len(self._future_map))
+            self.report_canceled(ident)
+            return
+        except Exception:  # pylint: disable=broad-except
+            ident = self._future_ident(future)
+            logger.exception("Job raised an exception: %s", ident)
+            error = True
+            self._results.discard(ident)
+        else:
+            self._report_result(ident, runner.rc)
+
+        self._future_map.pop(ident)
+        self._cancel_requested.discard(ident)
+        metrics.ACTIVE_JOBS.set(len(self._future_map))
+        metrics.job_done(ident, error)
+        if error:
+            # After job_done, so the job isn't counted as failed a second time
+            self._write_failed(ident)
+        logger.info("Finished job: %s", ident)
+        for listener in self._done_listeners:
+            listener(ident)
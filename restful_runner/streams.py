@@ -0,0 +1,291 @@
+"""Endpoints streaming what jobs produce: events, results, artifacts and output.
+
+Events are streamed as they happen while a job runs; results, artifacts and
+output are sent in chunks of ``_RESULT_CHUNK_SIZE`` bytes.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from restful_runner import artifacts, database
+from restful_runner.data_model import AnsibleJob
+from restful_runner.runtime import Runtime, get_runtime
+from restful_runner.schema import TERMINAL_STATUSES
+
+
+# See api.router
+router = APIRouter()
+
+
+async def _get_job(runtime: Runtime, job_uuid: str) -> Optional[AnsibleJob]:
+    # Streaming responses only release their dependencies once they are over, so
+    # the endpoints here look jobs up in a session of their own instead
+    async with runtime.db.async_session_local() as session:
+        return await database.async_get_ansible_job(session, job_uuid)
+
+
+async def _check_event_stream(runtime: Runtime, job_uuid: str) -> bool:
+    """Returns whether there are events to stream for the job."""
+    if runtime.settings.execution_mode == "distributed":
+        raise HTTPException(
+            status_code=501,
+            detail="Job events are only streamed in local execution mode",
+        )
+    job = await _get_job(runtime, job_uuid)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Only the jobs queued or running on this node publish events. The others are
+    # streamed while their events are still buffered, subscribing to them would
+    # otherwise never end, whatever their stored status is.
+    return runtime.job_scheduler.has_job(job_uuid) or runtime.event_broker.has_stream(
+        job_uuid
+    )
+
+
+@router.get("/jobs/{job_uuid}/events")
+async def stream_job_events(
+    job_uuid: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Streams the events of a job as Server-Sent Events."""
+    has_events = await _check_event_stream(runtime, job_uuid)
+    if last_event_id is None:
+        last_event_id = last_event_id_header or 0
+
+    async def event_stream():
+        if not has_events:
+            return
+        subscription = runtime.event_broker.subscribe(
+            job_uuid, last_event_id, heartbeat=runtime.settings.event_heartbeat_seconds
+        )
+        async with contextlib.aclosing(subscription):
+            async for event in subscription:
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                data = json.dumps(event.data, default=str)
+                yield f"id: {event.id}\nevent: {event.event}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@router.websocket("/jobs/{job_uuid}/events/ws")
+async def websocket_job_events(
+    websocket: WebSocket,
+    job_uuid: str,
+    last_event_id: int = 0,
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Streams the events of a job as JSON messages over a WebSocket."""
+    try:
+        has_events = await _check_event_stream(runtime, job_uuid)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+
+    await websocket.accept()
+    if has_events:
+        subscription = runtime.event_broker.subscribe(job_uuid, last_event_id)
+        async with contextlib.aclosing(subscription):
+            async for event in subscription:
+                if event is None:
+                    continue
+                message = {"id": event.id, "event": event.event, "data": event.data}
+                await websocket.send_text(json.dumps(message, default=str))
+    await websocket.close()
+
+
+# Size of the chunks a stored job result is streamed in
+_RESULT_CHUNK_SIZE = 64 * 1024
+
+
+@router.get("/jobs/{job_uuid}/result")
+async def get_job_result(
+    job_uuid: str,
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Streams the result of a job as it is stored, without decoding it first."""
+    async with runtime.db.async_session_local() as session:
+        found, result = await database.async_get_ansible_job_result_text(
+            session, job_uuid
+        )
+    if not found:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job has no result")
+
+    chunks = (
+        result[offset : offset + _RESULT_CHUNK_SIZE]
+        for offset in range(0, len(result), _RESULT_CHUNK_SIZE)
+    )
+    return StreamingResponse(chunks, media_type="application/json")
+
+
+@router.get("/jobs/{job_uuid}/artifacts", response_model=List[str])
+def get_job_artifacts(job_uuid: str, runtime: Runtime = Depends(get_runtime)):
+    """Lists the artifacts of a job, whether or not they have been archived."""
+    try:
+        return artifacts.list_artifacts(runtime.settings, job_uuid)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Job has no artifacts") from exc
+
+
+@router.get("/jobs/{job_uuid}/artifacts/{name:path}")
+def get_job_artifact(job_uuid: str, name: str, runtime: Runtime = Depends(get_runtime)):
+    """Streams an artifact of a job, from its directory or from its archive."""
+    try:
+        chunks = artifacts.iter_artifact(
+            runtime.settings, job_uuid, name, _RESULT_CHUNK_SIZE
+        )
+        # Opens the artifact, so a missing one is reported before streaming
+        first_chunk = next(chunks, b"")
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Artifact not found") from exc
+
+    return StreamingResponse(
+        itertools.chain([first_chunk], chunks),
+        media_type="application/octet-stream",
+    )
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Returns the first and last byte of a single byte range.
+
+    Returns None for headers that should be ignored, such as multiple ranges.
+    """
+    unit, _, spec = range_header.partition("=")
+    first, separator, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or "," in spec or not separator:
+        return None
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+            if last and end < start:
+                return None
+        else:
+            # The last bytes of the file
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+async def _follow_stdout(
+    runtime: Runtime, job_uuid: str, offset: int
+) -> AsyncIterator[bytes]:
+    """Yields the output of a job from the offset until the job finishes."""
+    directory = artifacts.artifact_path(runtime.settings, job_uuid)
+    path = os.path.join(directory, artifacts.STDOUT)
+    while not os.path.exists(path):
+        # Queued, or canceled before it started
+        job = await _get_job(runtime, job_uuid)
+        if job is None or job.status in TERMINAL_STATUSES:
+            if not os.path.exists(path):
+                return
+            break
+        await asyncio.sleep(runtime.settings.stdout_follow_poll_seconds)
+
+    with open(path, "rb") as stdout:
+        stdout.seek(offset)
+        while True:
+            # Checked first, so everything written before the job finished is read
+            finished = artifacts.is_finished(directory)
+            chunk = await run_in_threadpool(stdout.read, _RESULT_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+            elif finished:
+                return
+            else:
+                await asyncio.sleep(runtime.settings.stdout_follow_poll_seconds)
+
+
+@router.get("/jobs/{job_uuid}/stdout")
+async def get_job_stdout(
+    job_uuid: str,
+    offset: Optional[int] = None,
+    follow: bool = False,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    runtime: Runtime = Depends(get_runtime),
+):
+    """Serves the output of a job, read from its artifacts.
+
+    ``offset`` is where to start reading, counted from the end when negative.
+    A single byte range in the Range header is served with a 206. With
+    ``follow``, the output of a running job is streamed as it is written until
+    the job finishes. The X-Next-Offset header tells where to continue reading.
+    """
+    try:
+        size = await run_in_threadpool(
+            artifacts.artifact_size, runtime.settings, job_uuid, artifacts.STDOUT
+        )
+    except FileNotFoundError:
+        job = await _get_job(runtime, job_uuid)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found") from None
+        if not follow or job.status in TERMINAL_STATUSES:
+            raise HTTPException(status_code=404, detail="Job has no output") from None
+        size = 0
+
+    if offset is None:
+        start = 0
+    elif offset < 0:
+        start = max(0, size + offset)
+    else:
+        start = min(offset, size)
+    directory = artifacts.artifact_path(runtime.settings, job_uuid)
+    live = not artifacts.is_finished(directory) and not os.path.exists(
+        artifacts.archive_path(runtime.settings, job_uuid)
+    )
+    if follow and live:
+        return StreamingResponse(
+            _follow_stdout(runtime, job_uuid, start),
+            media_type="text/plain; charset=utf-8",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    status_code = 200
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = _parse_range(range_header, size) if range_header else None
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        end = size - 1
+    headers["Content-Length"] = str(end + 1 - start)
+    headers["X-Next-Offset"] = str(end + 1)
+
+    return StreamingResponse(
+        artifacts.iter_artifact(
+            runtime.settings,
+            job_uuid,
+            artifacts.STDOUT,
+            _RESULT_CHUNK_SIZE,
+            offset=start,
+            length=end + 1 - start,
+        ),
+        status_code=status_code,
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+    )
@@ -1,41 +1,189 @@
 import datetime
-from typing import Callable, Dict
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
-import ansible_runner
 from sqlalchemy.orm import Session
 
-from restful_runner import database
+from restful_runner import database, metrics
+from restful_runner.cache import JobCache
+from restful_runner.writers import EventWriter, StatusWriter
 from restful_runner.schema import (
     AnsibleRunnerStatus,
+    EventHandlerInterface,
+    JobEventStatus,
+    ResultHandlerInterface,
     StatusHandlerStatus,
     StatusHandlerInterface,
 )
 
+if TYPE_CHECKING:
+    import ansible_runner
+
+
+def request_hash(
+    playbook: str, extravars: Optional[Dict[str, Any]], tags: Optional[List[str]]
+) -> str:
+    """Returns a hash of the parameters of a run, equal for equivalent requests.
+
+    Key order in extravars and the order and repetition of tags don't matter.
+    """
+    normalized = json.dumps(
+        [playbook, extravars or {}, sorted(set(tags or []))],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def status_update_fields(status_dict: Dict[str, str]) -> Dict[str, Any]:
+    """Returns the job fields to update for a change of status."""
+    status = StatusHandlerStatus(**status_dict)
+    cur_time = datetime.datetime.now()
+    if status.status == AnsibleRunnerStatus.STARTING:
+        return {"start_time": cur_time, "status": status.status}
+    if status.status == AnsibleRunnerStatus.RUNNING:
+        return {"status": status.status}
+
+    # We have reached a terminal state
+    return {"status": status.status, "end_time": cur_time}
+
 
 def status_handler(
     session: Session,
     status_dict: Dict[str, str],
-    runner_config: ansible_runner.RunnerConfig,
+    runner_config: "ansible_runner.RunnerConfig",
 ) -> None:
     """Callback to handle changes to status."""
-    status = StatusHandlerStatus(**status_dict)
-    cur_time = datetime.datetime.now()
-    if status.status == AnsibleRunnerStatus.STARTING:
-        database.update_ansible_job(
-            session, runner_config.ident, start_time=cur_time, status=status.status
-        )
-    elif status.status == AnsibleRunnerStatus.RUNNING:
-        database.update_ansible_job(session, runner_config.ident, status=status.status)
-    else:
-        # We have reached a terminal state
-        database.update_ansible_job(
-            session, runner_config.ident, status=status.status, end_time=cur_time
-        )
-
-
-def build_status_handler(sessionmaker: Callable[[], Session]) -> StatusHandlerInterface:
-    def wrapper(status: Dict[str, str], runner_config: ansible_runner.RunnerConfig):
+    with metrics.STATUS_HANDLER_SECONDS.time():
+        fields = status_update_fields(status_dict)
+        metrics.job_status_changed(runner_config.ident, fields["status"])
+        database.update_ansible_job(session, runner_config.ident, **fields)
+
+
+def build_status_handler(
+    sessionmaker: Callable[[], Session], job_cache: Optional[JobCache] = None
+) -> StatusHandlerInterface:
+    """Builds a status handler that stores status changes right away.
+
+    The job is dropped from ``job_cache`` once its new status is stored.
+    """
+
+    def wrapper(status: Dict[str, str], runner_config: "ansible_runner.RunnerConfig"):
         with sessionmaker() as session:
             status_handler(session, status, runner_config)
+        if job_cache is not None:
+            job_cache.invalidate(runner_config.ident)
+
+    return wrapper
+
+
+def build_batched_status_handler(writer: StatusWriter) -> StatusHandlerInterface:
+    """Builds a status handler that hands its updates to a StatusWriter."""
+
+    def wrapper(status: Dict[str, str], runner_config: "ansible_runner.RunnerConfig"):
+        with metrics.STATUS_HANDLER_SECONDS.time():
+            fields = status_update_fields(status)
+            metrics.job_status_changed(runner_config.ident, fields["status"])
+            writer.update(runner_config.ident, **fields)
+
+    return wrapper
+
+
+def build_result_handler(
+    sessionmaker: Callable[[], Session], job_cache: Optional[JobCache] = None
+) -> ResultHandlerInterface:
+    """Builds a result handler that stores job summaries right away."""
+
+    def wrapper(ident: str, result: Dict[str, Any]):
+        with sessionmaker() as session:
+            database.update_ansible_job(session, ident, result=result)
+        if job_cache is not None:
+            job_cache.invalidate(ident)
+
+    return wrapper
+
+
+def build_batched_result_handler(writer: StatusWriter) -> ResultHandlerInterface:
+    """Builds a result handler that hands job summaries to a StatusWriter."""
+
+    def wrapper(ident: str, result: Dict[str, Any]):
+        writer.update(ident, result=result)
+
+    return wrapper
+
+
+def combine_status_handlers(
+    *handlers: StatusHandlerInterface,
+) -> StatusHandlerInterface:
+    """Builds a status handler that calls each of the given handlers in turn."""
+
+    def wrapper(status: Dict[str, str], runner_config: "ansible_runner.RunnerConfig"):
+        for handler in handlers:
+            handler(status, runner_config)
+
+    return wrapper
+
+
+# Runner events reporting the outcome of a task on a host
+_HOST_EVENT_STATUSES = {
+    "runner_on_ok": JobEventStatus.OK,
+    "runner_on_failed": JobEventStatus.FAILED,
+    "runner_on_unreachable": JobEventStatus.UNREACHABLE,
+    "runner_on_skipped": JobEventStatus.SKIPPED,
+}
+
+# Longest failure message kept for a job event
+_MAX_MESSAGE_LENGTH = 1024
+
+
+def job_event_fields(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Returns the job event to store for a runner event, if it is a host outcome."""
+    status = _HOST_EVENT_STATUSES.get(event.get("event", ""))
+    if status is None:
+        return None
+
+    event_data = event.get("event_data") or {}
+    res = event_data.get("res") or {}
+    message = None
+    if status in (JobEventStatus.FAILED, JobEventStatus.UNREACHABLE):
+        message = str(res.get("msg", ""))[:_MAX_MESSAGE_LENGTH] or None
+    return {
+        "job_uuid": event.get("runner_ident"),
+        "counter": event.get("counter"),
+        "host": event_data.get("host"),
+        "play": event_data.get("play"),
+        "task": event_data.get("task"),
+        "task_action": event_data.get("task_action"),
+        "status": status,
+        "changed": bool(res.get("changed", False)),
+        "duration": event_data.get("duration"),
+        "message": message,
+        "created": datetime.datetime.now(),
+    }
+
+
+def build_event_store_handler(writer: EventWriter) -> EventHandlerInterface:
+    """Builds an event handler that stores host outcomes through an EventWriter."""
+
+    def wrapper(event: Dict[str, Any]) -> bool:
+        fields = job_event_fields(event)
+        if fields is not None:
+            writer.put(fields)
+        return True
+
+    return wrapper
+
+
+def combine_event_handlers(*handlers: EventHandlerInterface) -> EventHandlerInterface:
+    """Builds an event handler that calls each of the given handlers in turn.
+
+    The event is written to the artifact directory unless a handler returns False.
+    """
+
+    def wrapper(event: Dict[str, Any]) -> bool:
+        results = [handler(event) for handler in handlers]
+        return all(results)
 
     return wrapper
@@ -0,0 +1,265 @@
+"""Worker process for the distributed execution mode.
+
+In distributed mode the API only records jobs in the database. Any number of
+workers, on any number of nodes, claim those jobs from the ``ansible_jobs`` table
+and run them. Each claim is a lease that the worker renews while the job runs; the
+jobs of a worker that stops renewing its leases are failed by the other workers.
+
+Start a worker with ``python -m restful_runner.worker``.
+"""
+import logging
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Optional, Set
+import uuid
+
+import prometheus_client
+from sqlalchemy.orm import Session
+
+from restful_runner import (
+    config,
+    database,
+    environments,
+    executors,
+    metrics,
+    retention,
+    services,
+    utils,
+    writers,
+)
+
+
+logger = logging.getLogger("restful_runner")
+
+
+class JobWorker:  # pylint: disable=too-many-instance-attributes
+    """Claims jobs from the database and runs them, renewing their leases.
+
+    It holds the resources of the worker process and the timings of its loop,
+    hence its number of attributes and arguments.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        sessionmaker: Callable[[], Session],
+        executor_service: services.PlaybookExecutorService,
+        status_writer: Optional[writers.StatusWriter],
+        worker_id: str,
+        *,
+        max_jobs: int,
+        lease_seconds: float,
+        heartbeat_seconds: float,
+        poll_seconds: float,
+        event_writer: Optional[writers.EventWriter] = None,
+        retention_engine: Optional[retention.RetentionEngine] = None,
+        environment: Optional[environments.PreparedEnvironment] = None,
+    ) -> None:
+        self._sessionmaker = sessionmaker
+        self._executor_service = executor_service
+        self._status_writer = status_writer
+        self._event_writer = event_writer
+        self._retention_engine = retention_engine
+        self._environment = environment
+        self.worker_id = worker_id
+        self._max_jobs = max_jobs
+        self._lease_seconds = lease_seconds
+        self._heartbeat_seconds = heartbeat_seconds
+        self._poll_seconds = poll_seconds
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        # Jobs whose leases are released on the next heartbeat
+        self._finished: Set[str] = set()
+        self._finished_lock = threading.Lock()
+
+        executor_service.add_done_listener(self._job_done)
+
+    def _job_done(self, job_uuid: str) -> None:
+        with self._finished_lock:
+            self._finished.add(job_uuid)
+        # A finished job frees a slot, so look for more work right away
+        self._wakeup.set()
+
+    def claim_jobs(self) -> int:
+        """Claims and starts jobs until the worker is full or nothing is waiting."""
+        started = 0
+        with self._sessionmaker() as session:
+            while len(self._executor_service.active_jobs()) < self._max_jobs:
+                job = database.claim_ansible_job(
+                    session, self.worker_id, self._lease_seconds
+                )
+                if job is None:
+                    break
+
+                logger.info("Worker %s claimed job: %s", self.worker_id, job.job_uuid)
+                if job.request_hash is None:
+                    # Stored before its parameters were, see recovery
+                    logger.warning(
+                        "Not running job %s, its parameters weren't stored",
+                        job.job_uuid,
+                    )
+                    self._executor_service.report_failed(job.job_uuid)
+                    continue
+                # Rows created before the column existed have no creation time
+                if job.created_time is not None:
+                    metrics.job_created(job.job_uuid, job.created_time.timestamp())
+                self._executor_service.submit_job(
+                    job.job_uuid, job.job_name, job.extravars, job.tags, job.timeout
+                )
+                started += 1
+        return started
+
+    def heartbeat(self) -> None:
+        """Renews the leases of running jobs and fails jobs of dead workers.
+
+        The leases of finished jobs are released. A job that failed before it
+        started has the failed status by then, so it isn't claimed again.
+        """
+        with self._finished_lock:
+            finished = list(self._finished)
+            self._finished.clear()
+        with self._sessionmaker() as session:
+            database.release_ansible_job_leases(session, self.worker_id, finished)
+            active_jobs = self._executor_service.active_jobs()
+            renewed = database.renew_ansible_job_leases(
+                session, self.worker_id, active_jobs, self._lease_seconds
+            )
+            if renewed < len(active_jobs):
+                logger.warning(
+                    "Worker %s lost the lease on %d jobs",
+                    self.worker_id,
+                    len(active_jobs) - renewed,
+                )
+
+            for job_uuid in database.get_cancel_requested_ansible_jobs(
+                session, self.worker_id, active_jobs
+            ):
+                self._executor_service.cancel_job(job_uuid)
+
+            expired = database.expire_ansible_job_leases(session)
+            if expired:
+                logger.warning("Failed %d jobs with expired leases", expired)
+
+    def run(self) -> None:
+        """Claims jobs until stop() is called, then waits for running jobs."""
+        heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name="worker-heartbeat", daemon=True
+        )
+        heartbeat_thread.start()
+        if self._retention_engine is not None:
+            self._retention_engine.start()
+        if self._environment is not None:
+            self._environment.start()
+
+        while not self._stopping.is_set():
+            try:
+                self.claim_jobs()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Worker %s failed to claim jobs", self.worker_id)
+            self._wakeup.wait(self._poll_seconds)
+            self._wakeup.clear()
+
+        # Keep renewing leases until the running jobs have finished
+        while self._executor_service.active_jobs():
+            time.sleep(self._poll_seconds)
+        if self._retention_engine is not None:
+            self._retention_engine.stop()
+        if self._environment is not None:
+            self._environment.stop()
+        if self._status_writer is not None:
+            self._status_writer.stop()
+        if self._event_writer is not None:
+            self._event_writer.stop()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                self.heartbeat()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Worker %s heartbeat failed", self.worker_id)
+            time.sleep(self._heartbeat_seconds)
+
+
+def build_worker(settings: config.ApplicationSettings) -> JobWorker:
+    db = database.DatabaseConnection(settings.db_url, settings)
+    database.upgrade_schema(db.get_engine())
+
+    executor = executors.build_executor(
+        settings.executor_backend, settings.max_executor_threads
+    )
+    status_writer = None
+    if settings.status_writer_batching:
+        status_writer = writers.StatusWriter(
+            db.write_session_local,
+            settings.status_flush_interval,
+            settings.status_flush_size,
+        )
+        status_writer.start()
+        status_handler = utils.build_batched_status_handler(status_writer)
+        result_handler = utils.build_batched_result_handler(status_writer)
+    else:
+        status_handler = utils.build_status_handler(db.write_session_local)
+        result_handler = utils.build_result_handler(db.write_session_local)
+
+    event_writer = None
+    event_handler = None
+    if settings.event_store:
+        event_writer = writers.EventWriter(
+            db.write_session_local,
+            settings.event_flush_interval,
+            settings.event_flush_size,
+        )
+        event_writer.start()
+        event_handler = utils.build_event_store_handler(event_writer)
+
+    # Without a playbook catalog, the inventory is rendered again when its own
+    # files change or it gets too old
+    environment = environments.PreparedEnvironment(settings)
+    executor_service = services.PlaybookExecutorService(
+        executor,
+        status_handler,
+        settings,
+        event_handler=event_handler,
+        environment=environment,
+        result_handler=result_handler,
+    )
+    worker_id = settings.worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    return JobWorker(
+        db.write_session_local,
+        executor_service,
+        status_writer,
+        worker_id,
+        max_jobs=settings.max_executor_threads,
+        lease_seconds=settings.worker_lease_seconds,
+        heartbeat_seconds=settings.worker_heartbeat_seconds,
+        poll_seconds=settings.worker_poll_seconds,
+        event_writer=event_writer,
+        retention_engine=retention.RetentionEngine(
+            db.write_session_local, settings, executor_service.active_jobs
+        ),
+        environment=environment,
+    )
+
+
+def main(settings: Optional[config.ApplicationSettings] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    settings = settings or config.get_app_settings()
+    worker = build_worker(settings)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+
+    if settings.worker_metrics_port is not None:
+        prometheus_client.start_http_server(settings.worker_metrics_port)
+
+    logger.info("Worker %s started", worker.worker_id)
+    worker.run()
+    logger.info("Worker %s stopped", worker.worker_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import abc
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+from restful_runner import database
+
+
+logger = logging.getLogger("restful_runner")
+
+T = TypeVar("T")
+
+_FLUSH_ATTEMPTS = 3
+
+
+def _job_uuids(items: List[Any]) -> List[str]:
+    return sorted(
+        {
+            item["job_uuid"]
+            for item in items
+            if isinstance(item, dict) and "job_uuid" in item
+        }
+    )
+
+
+class _FlushRequest:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class BatchWriter(abc.ABC, Generic[T]):
+    """Writes items queued from any thread to the database in batches.
+
+    A single background thread takes items off the queue and writes them in one
+    transaction per batch. A batch is written once ``flush_size`` items have been
+    collected or ``flush_interval`` seconds have passed since its first item,
+    whichever comes first.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: Callable[[], Session],
+        flush_interval: float,
+        flush_size: int,
+        name: str = "batch-writer",
+    ) -> None:
+        self._sessionmaker = sessionmaker
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._stopped = False
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Writes everything queued so far and stops the writer thread."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def put(self, item: T) -> None:
+        self._queue.put(item)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until everything queued before the call has been written."""
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    @abc.abstractmethod
+    def write_batch(self, session: Session, items: List[T]) -> None:
+        """Writes a batch of items in one transaction of the given session."""
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[T] = []
+            flush_requests = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self._flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, _FlushRequest):
+                    flush_requests.append(item)
+                else:
+                    batch.append(item)
+
+                if stopping or flush_requests or len(batch) >= self._flush_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for request in flush_requests:
+                request.done.set()
+
+    def _write(self, batch: List[T]) -> None:
+        for attempt in range(1, _FLUSH_ATTEMPTS + 1):
+            try:
+                with self._sessionmaker() as session:
+                    self.write_batch(session, batch)
+                return
+            except Exception:  # pylint: disable=broad-except
+                if attempt == _FLUSH_ATTEMPTS:
+                    logger.exception(
+                        "Dropping batch of %d writes of jobs: %s",
+                        len(batch),
+                        ", ".join(_job_uuids(batch)),
+                    )
+                else:
+                    logger.warning("Batch write failed, retrying", exc_info=True)
+                    time.sleep(self._flush_interval * attempt)
+
+
+class StatusWriter(BatchWriter[Dict[str, Any]]):
+    """Coalesces job status updates and writes them in batched transactions.
+
+    Updates to the same job within a batch are merged, later values winning, so
+    a job going through several states in one interval costs a single UPDATE.
+    ``on_written`` is called with the UUIDs of the jobs of every batch written.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: Callable[[], Session],
+        flush_interval: float = 0.05,
+        flush_size: int = 500,
+        on_written: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        super().__init__(sessionmaker, flush_interval, flush_size, "status-writer")
+        self._on_written = on_written
+
+    def update(self, job_uuid: str, **kwargs) -> None:
+        """Queues an update of the given fields, see database.update_ansible_job."""
+        self.put({"job_uuid": job_uuid, **kwargs})
+
+    def write_batch(self, session: Session, items: List[Dict[str, Any]]) -> None:
+        updates: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            fields = dict(item)
+            updates.setdefault(fields.pop("job_uuid"), {}).update(fields)
+
+        missing = database.update_ansible_jobs(session, updates)
+        for job_uuid in missing:
+            logger.warning("Status update for unknown job: %s", job_uuid)
+        if self._on_written is not None:
+            self._on_written(list(updates))
+
+
+class EventWriter(BatchWriter[Dict[str, Any]]):
+    """Stores job events in bulk inserts, see utils.job_event_fields."""
+
+    def __init__(
+        self,
+        sessionmaker: Callable[[], Session],
+        flush_interval: float = 0.5,
+        flush_size: int = 1000,
+    ) -> None:
+        super().__init__(sessionmaker, flush_interval, flush_size, "event-writer")
+
+    def write_batch(self, session: Session, items: List[Dict[str, Any]]) -> None:
+        database.create_ansible_job_events(session, items)
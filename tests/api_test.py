@@ -0,0 +1,184 @@
+import datetime
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from restful_runner import api, database
+from restful_runner.config import ApplicationSettings
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _settings(directory, **kwargs):
+    os.makedirs(directory / "project", exist_ok=True)
+    return ApplicationSettings(
+        db_url=f"sqlite:///{directory / 'jobs.db'}",
+        private_data_dir=str(directory),
+        **kwargs,
+    )
+
+
+def test_import_has_no_side_effects(tmp_path):
+    """Tests importing the API neither opens the database nor imports the runner."""
+    script = (
+        "import sys\n"
+        "import restful_runner.api\n"
+        "assert 'ansible_runner' not in sys.modules\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        env=dict(
+            os.environ,
+            DB_URL=f"sqlite:///{tmp_path / 'jobs.db'}",
+            PRIVATE_DATA_DIR=str(tmp_path),
+        ),
+    )
+    assert not os.path.exists(tmp_path / "jobs.db")
+
+
+def test_create_app(tmp_path):
+    """Tests applications get resources of their own while they run.
+
+    The second one doesn't store events, so its event writer is never started.
+    The resources are released when the application stops.
+    """
+    first = api.create_app(_settings(tmp_path / "first", schedules_enabled=False))
+    second = api.create_app(_settings(tmp_path / "second", event_store=False))
+
+    with TestClient(first) as first_client, TestClient(second) as second_client:
+        runtime = first.state.runtime
+        assert runtime is not second.state.runtime
+        assert os.path.exists(tmp_path / "first" / "jobs.db")
+
+        with runtime.db.session_local() as session:
+            database.create_ansible_job(session, "job", "site.yml", "test")
+        assert [job["job_uuid"] for job in first_client.get("/jobs").json()] == ["job"]
+        assert second_client.get("/jobs").json() == []
+        assert second_client.get("/jobs/job").status_code == 404
+
+    # Stopped with the application, the executor doesn't take jobs anymore
+    with pytest.raises(RuntimeError):
+        runtime.executor.submit(print)
+
+
+def test_failed_submission_fails_job(tmp_path):
+    """Tests a job the executor doesn't accept gets the failed status."""
+    app = api.create_app(_settings(tmp_path, schedules_enabled=False))
+    with open(tmp_path / "project" / "site.yml", "w", encoding="utf-8") as playbook:
+        playbook.write("- hosts: all\n")
+
+    with TestClient(app) as client:
+        executor_service = app.state.runtime.executor_service
+        executor_service.submit_job = MagicMock(side_effect=RuntimeError("boom"))
+        job_uuid = client.post("/playbooks/site.yml", json={}).json()["job_uuid"]
+
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_uuid}").json()
+            if job["status"] == "failed":
+                break
+            time.sleep(0.05)
+        assert job["status"] == "failed"
+        assert job["end_time"] is not None
+        assert client.get("/queue").json()["running"] == 0
+
+
+def test_event_streams_of_jobs_not_running_here(tmp_path):
+    """Tests the event streams of a job that isn't queued or running here end.
+
+    The job is still running according to the database, and unknown jobs get 404.
+    """
+    app = api.create_app(_settings(tmp_path, schedules_enabled=False))
+
+    with TestClient(app) as client:
+        with app.state.runtime.db.session_local() as session:
+            database.create_ansible_job(
+                session, "job", "site.yml", "test", status=AnsibleRunnerStatus.RUNNING
+            )
+
+        response = client.get("/jobs/job/events")
+        assert response.status_code == 200
+        assert response.text == ""
+        with client.websocket_connect("/jobs/job/events/ws") as websocket:
+            with pytest.raises(WebSocketDisconnect):
+                websocket.receive_text()
+
+        assert client.get("/jobs/unknown/events").status_code == 404
+
+
+def test_results_default_to_a_window(tmp_path):
+    """Tests results are summed up over the last days unless ended_after is set."""
+    app = api.create_app(
+        _settings(tmp_path, schedules_enabled=False, results_window_days=1)
+    )
+
+    with TestClient(app) as client:
+        now = datetime.datetime.now()
+        with app.state.runtime.db.session_local() as session:
+            for job_uuid, days in (("recent", 0), ("old", 2)):
+                database.create_ansible_job(session, job_uuid, "site.yml", "test")
+                database.update_ansible_job(
+                    session,
+                    job_uuid,
+                    status=AnsibleRunnerStatus.SUCCESSFUL,
+                    end_time=now - datetime.timedelta(days=days, minutes=1),
+                    result={"rc": 0, "hosts": {job_uuid: {"ok": 1}}},
+                )
+
+        assert client.get("/results/summary").json()["jobs"] == 1
+        hosts = client.get("/results/hosts").json()
+        assert [host["host"] for host in hosts] == ["recent"]
+
+        ended_before = (now - datetime.timedelta(days=1.5)).isoformat()
+        hosts = client.get(f"/results/hosts?ended_before={ended_before}").json()
+        assert [host["host"] for host in hosts] == ["old"]
+        ended_after = (now - datetime.timedelta(days=3)).isoformat()
+        summary = client.get(f"/results/summary?ended_after={ended_after}").json()
+        assert summary["jobs"] == 2
+
+
+def test_artifacts_outside_the_job_are_not_served(tmp_path):
+    """Tests a job UUID of .. doesn't serve the private data directory."""
+    app = api.create_app(_settings(tmp_path, schedules_enabled=False))
+    os.makedirs(tmp_path / "artifacts" / "job")
+    with open(tmp_path / "secret", "w", encoding="utf-8") as secret:
+        secret.write("key")
+
+    with TestClient(app) as client:
+        assert client.get("/jobs/%2E%2E/artifacts").status_code == 404
+        assert client.get("/jobs/%2E%2E/artifacts/secret").status_code == 404
+        assert client.get("/jobs/%2E%2E/stdout?follow=true").status_code == 404
+        assert client.get("/jobs/job/artifacts/..%2F..%2Fsecret").status_code == 404
+
+
+def test_open_event_streams_hold_no_connection(tmp_path):
+    """Tests open event streams leave the connections of the pool to requests."""
+    app = api.create_app(
+        _settings(
+            tmp_path,
+            schedules_enabled=False,
+            db_pool_size=1,
+            db_max_overflow=1,
+            db_pool_timeout_seconds=1,
+        )
+    )
+
+    with TestClient(app) as client:
+        runtime = app.state.runtime
+        with runtime.db.session_local() as session:
+            database.create_ansible_job(session, "job", "site.yml", "test")
+        # Published, but not finished, so the streams stay open
+        runtime.event_broker.publish("job", "playbook_on_start", {})
+
+        with client.websocket_connect(
+            "/jobs/job/events/ws"
+        ) as first, client.websocket_connect("/jobs/job/events/ws") as second:
+            first.receive_json()
+            second.receive_json()
+            assert client.get("/jobs").status_code == 200
+            runtime.event_broker.finish("job")
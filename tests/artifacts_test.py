@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from restful_runner import artifacts
+from restful_runner.config import ApplicationSettings
+
+
+def _write_artifacts(settings, job_uuid):
+    directory = artifacts.artifact_path(settings, job_uuid)
+    os.makedirs(os.path.join(directory, "job_events"))
+    with open(os.path.join(directory, "stdout"), "w", encoding="utf-8") as stdout:
+        stdout.write("PLAY [all]\n" * 1000)
+    with open(
+        os.path.join(directory, "job_events", "1-abcd.json"), "w", encoding="utf-8"
+    ) as event:
+        event.write("{}")
+    return directory
+
+
+def test_artifacts_readable_before_and_after_compression(tmp_path):
+    """Tests reading artifacts from the job directory and from its archive."""
+    settings = ApplicationSettings(private_data_dir=str(tmp_path))
+    directory = _write_artifacts(settings, "abcd")
+    expected = ["job_events/1-abcd.json", "stdout"]
+
+    assert artifacts.list_artifacts(settings, "abcd") == expected
+    content = b"".join(artifacts.iter_artifact(settings, "abcd", "stdout", 1024))
+    assert not artifacts.is_finished(directory)
+
+    artifacts.compress(directory, artifacts.archive_path(settings, "abcd"))
+    assert not os.path.exists(directory)
+    assert artifacts.list_artifacts(settings, "abcd") == expected
+    assert b"".join(artifacts.iter_artifact(settings, "abcd", "stdout", 1024)) == (
+        content
+    )
+    with artifacts.open_artifact(settings, "abcd", "job_events/1-abcd.json") as event:
+        assert event.read() == b"{}"
+
+
+def test_missing_artifacts(tmp_path):
+    """Tests missing jobs, missing artifacts and paths outside the job."""
+    settings = ApplicationSettings(private_data_dir=str(tmp_path))
+    directory = _write_artifacts(settings, "abcd")
+
+    with pytest.raises(FileNotFoundError):
+        artifacts.list_artifacts(settings, "unknown")
+    with pytest.raises(FileNotFoundError):
+        artifacts.open_artifact(settings, "abcd", "../abcd/stdout")
+
+    artifacts.compress(directory, artifacts.archive_path(settings, "abcd"))
+    with pytest.raises(FileNotFoundError):
+        artifacts.open_artifact(settings, "abcd", "rc")
+
+
+def test_artifacts_outside_the_artifact_directory(tmp_path):
+    """Tests job UUIDs naming paths outside the artifact directory are refused."""
+    settings = ApplicationSettings(private_data_dir=str(tmp_path))
+    _write_artifacts(settings, "abcd")
+    with open(tmp_path / "secret", "w", encoding="utf-8") as secret:
+        secret.write("key")
+
+    for job_uuid in ("..", ".", "", "../artifacts", "abcd/job_events", "/tmp"):
+        with pytest.raises(FileNotFoundError):
+            artifacts.list_artifacts(settings, job_uuid)
+        with pytest.raises(FileNotFoundError):
+            artifacts.open_artifact(settings, job_uuid, "secret")
+        with pytest.raises(FileNotFoundError):
+            artifacts.artifact_size(settings, job_uuid, "secret")
+    # A link out of the artifact directory isn't followed either
+    os.symlink(tmp_path, os.path.join(artifacts.artifact_root(settings), "link"))
+    with pytest.raises(FileNotFoundError):
+        artifacts.open_artifact(settings, "link", "secret")
+
+
+def test_artifact_ranges(tmp_path):
+    """Tests reading the size and byte ranges of an artifact, also once archived."""
+    settings = ApplicationSettings(private_data_dir=str(tmp_path))
+    directory = _write_artifacts(settings, "abcd")
+    content = b"PLAY [all]\n" * 1000
+
+    for archived in (False, True):
+        if archived:
+            artifacts.compress(directory, artifacts.archive_path(settings, "abcd"))
+        assert artifacts.artifact_size(settings, "abcd", artifacts.STDOUT) == 11000
+        chunks = list(
+            artifacts.iter_artifact(
+                settings, "abcd", artifacts.STDOUT, 1024, offset=5000, length=3000
+            )
+        )
+        assert [len(chunk) for chunk in chunks] == [1024, 1024, 952]
+        assert b"".join(chunks) == content[5000:8000]
+        tail = artifacts.iter_artifact(settings, "abcd", "stdout", 1024, offset=10990)
+        assert b"".join(tail) == content[10990:]
+
+    with pytest.raises(FileNotFoundError):
+        artifacts.artifact_size(settings, "abcd", "missing")
+    with pytest.raises(FileNotFoundError):
+        artifacts.artifact_size(settings, "unknown", artifacts.STDOUT)
+
+
+def test_final_status(tmp_path):
+    """Tests reading the final status of a job from its directory and archive."""
+    settings = ApplicationSettings(private_data_dir=str(tmp_path))
+    directory = _write_artifacts(settings, "abcd")
+    assert artifacts.final_status(settings, "abcd") is None
+    assert artifacts.final_status(settings, "missing") is None
+
+    with open(os.path.join(directory, "status"), "w", encoding="utf-8") as status:
+        status.write("successful")
+    os.utime(os.path.join(directory, "status"), (1700000000, 1700000000))
+    assert artifacts.final_status(settings, "abcd") == ("successful", 1700000000)
+
+    artifacts.compress(directory, artifacts.archive_path(settings, "abcd"))
+    status, finished = artifacts.final_status(settings, "abcd")
+    # Zip archives store times with a precision of two seconds
+    assert status == "successful" and abs(finished - 1700000000) <= 2
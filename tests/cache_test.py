@@ -0,0 +1,69 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+from restful_runner.cache import JobCache, is_final, serialize_job
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _job(job_uuid="abcd", status=AnsibleRunnerStatus.SUCCESSFUL, result=None):
+    return SimpleNamespace(
+        job_uuid=job_uuid,
+        status=status,
+        start_time=datetime.datetime(2024, 1, 1, 12, 0),
+        end_time=datetime.datetime(2024, 1, 1, 12, 5),
+        result=result,
+    )
+
+
+def test_serialize_job():
+    """Tests jobs are serialized as the API returns them, with stable ETags."""
+    entry = serialize_job(_job(result={"rc": 0}))
+    assert json.loads(entry.body) == {
+        "job_uuid": "abcd",
+        "status": "successful",
+        "start_time": "2024-01-01T12:00:00",
+        "end_time": "2024-01-01T12:05:00",
+        "result": {"rc": 0},
+    }
+    assert entry.last_modified.endswith(" GMT")
+    assert serialize_job(_job(result={"rc": 0})).etag == entry.etag
+    assert serialize_job(_job(result={"rc": 2})).etag != entry.etag
+
+    running = _job(status=AnsibleRunnerStatus.RUNNING)
+    running.end_time = None
+    assert serialize_job(running).last_modified is None
+
+
+def test_is_final():
+    """Tests only finished jobs are final, with their result when it is needed."""
+    assert not is_final(_job(status=AnsibleRunnerStatus.RUNNING), True, False)
+    assert is_final(_job(), True, False)
+    assert not is_final(_job(), True, True)
+    assert is_final(_job(result={"rc": 0}), True, True)
+    # Summaries don't hold the result
+    assert is_final(SimpleNamespace(status=AnsibleRunnerStatus.FAILED), False, True)
+
+
+def test_job_cache():
+    """Tests eviction of the least recently used jobs and invalidation."""
+    job_cache = JobCache(2)
+    entry = serialize_job(_job())
+    generation = job_cache.generation()
+    assert job_cache.put("a", True, entry, generation)
+    assert job_cache.put("a", False, entry, generation)
+    assert job_cache.get("a", True) is entry
+    assert job_cache.put("b", True, entry, generation)
+    assert job_cache.get("a", False) is None
+    assert job_cache.get("a", True) is entry
+
+    job_cache.invalidate("a")
+    assert job_cache.get("a", True) is None
+    assert job_cache.get("b", True) is entry
+    # Read before the invalidation, so it may be stale
+    assert not job_cache.put("a", True, entry, generation)
+    assert job_cache.put("a", True, entry, job_cache.generation())
+
+    disabled = JobCache(0)
+    assert not disabled.put("a", True, entry, disabled.generation())
+    assert disabled.get("a", True) is None
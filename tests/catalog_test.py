@@ -0,0 +1,80 @@
+import os
+
+from restful_runner.catalog import PlaybookCatalog, parse_playbook
+
+
+_PLAYBOOK = """
+- name: Configure web servers
+  hosts: web
+  tags: [web]
+  vars:
+    password: !vault |
+      $ANSIBLE_VAULT;1.1;AES256
+      6162
+  tasks:
+    - name: Install nginx
+      apt:
+        name: nginx
+      tags: packages, nginx
+- hosts: db
+  roles:
+    - role: postgres
+      tags:
+        - db
+"""
+
+
+def test_parse_playbook(tmp_path):
+    """Tests reading the play names and tags of a playbook."""
+    path = tmp_path / "site.yml"
+    path.write_text(_PLAYBOOK)
+
+    assert parse_playbook(str(path)) == {
+        "plays": ["Configure web servers", "db"],
+        "tags": ["db", "nginx", "packages", "web"],
+    }
+
+
+def test_catalog_scans_recursively(tmp_path):
+    """Tests that playbooks in subdirectories are indexed, role files are not."""
+    (tmp_path / "site.yml").write_text(_PLAYBOOK)
+    (tmp_path / "readme.md").write_text("")
+    (tmp_path / "deploy").mkdir()
+    (tmp_path / "deploy" / "app.yaml").write_text("- hosts: all\n")
+    (tmp_path / "roles" / "postgres" / "tasks").mkdir(parents=True)
+    (tmp_path / "roles" / "postgres" / "tasks" / "main.yml").write_text("")
+
+    catalog = PlaybookCatalog(str(tmp_path))
+    assert catalog.refresh()
+
+    assert catalog.playbooks() == ["deploy/app.yaml", "site.yml"]
+    assert "deploy/app.yaml" in catalog
+    assert "roles/postgres/tasks/main.yml" not in catalog
+    entry = catalog.get("deploy/app.yaml")
+    assert catalog.details(entry) == {"plays": ["all"], "tags": []}
+
+
+def test_catalog_refresh_detects_changes(tmp_path):
+    """Tests that the ETags change with the playbooks and parsed details are kept."""
+    path = tmp_path / "site.yml"
+    path.write_text(_PLAYBOOK)
+    catalog = PlaybookCatalog(str(tmp_path))
+    catalog.refresh()
+    etag = catalog.etag
+    entry = catalog.get("site.yml")
+    catalog.details(entry)
+
+    assert not catalog.refresh()
+    assert catalog.etag == etag
+    assert catalog.get("site.yml") is entry
+
+    path.write_text("- hosts: all\n")
+    os.utime(path, ns=(0, entry.mtime_ns + 1))
+    assert catalog.refresh()
+    assert catalog.etag != etag
+    assert catalog.get("site.yml").etag != entry.etag
+    assert catalog.details(catalog.get("site.yml"))["plays"] == ["all"]
+
+    path.unlink()
+    assert catalog.refresh()
+    assert catalog.playbooks() == []
@@ -0,0 +1,129 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.environments import (
+    PreparedEnvironment,
+    inventory_revision,
+    to_inventory_plugin_format,
+)
+
+
+_LISTING = {
+    "_meta": {"hostvars": {"web1": {"port": 8080}, "db1": {}}},
+    "all": {"children": ["ungrouped", "web", "prod"]},
+    "web": {"hosts": ["web1"], "vars": {"color": "blue"}},
+    "prod": {"children": ["web", "db"]},
+    "db": {"hosts": ["db1", "web1"]},
+}
+
+
+def test_inventory_revision(tmp_path):
+    """Tests that the revision changes with the files of the inventory."""
+    (tmp_path / "hosts").write_text("web1\n")
+    revision = inventory_revision(str(tmp_path))
+    assert inventory_revision(str(tmp_path)) == revision
+
+    (tmp_path / "group_vars").mkdir()
+    (tmp_path / "group_vars" / "all.yml").write_text("color: blue\n")
+    assert inventory_revision(str(tmp_path)) != revision
+    assert inventory_revision(str(tmp_path / "hosts")) != inventory_revision(
+        str(tmp_path)
+    )
+
+
+def test_to_inventory_plugin_format():
+    """Tests that groups and host variables are written out once."""
+    assert to_inventory_plugin_format(_LISTING) == {
+        "all": {
+            "children": {
+                "ungrouped": {},
+                "web": {"hosts": {"web1": {"port": 8080}}, "vars": {"color": "blue"}},
+                "prod": {
+                    "children": {
+                        "web": None,
+                        "db": {"hosts": {"db1": None, "web1": None}},
+                    }
+                },
+            }
+        }
+    }
+
+
+def _environment(tmp_path, **settings):
+    (tmp_path / "inventory").mkdir(exist_ok=True)
+    (tmp_path / "inventory" / "hosts.py").write_text("#!/bin/sh\n")
+    return PreparedEnvironment(
+        ApplicationSettings(private_data_dir=str(tmp_path), **settings),
+        lambda: "project",
+    )
+
+
+@patch("ansible_runner.get_inventory", return_value=(_LISTING, ""))
+def test_refresh_renders_when_changed_or_too_old(get_inventory_mock, tmp_path):
+    """Tests that the inventory is only rendered again when it needs to be."""
+    environment = _environment(
+        tmp_path, prepared_inventory=True, inventory_max_age_seconds=60
+    )
+    assert not environment.run_kwargs()
+
+    assert environment.refresh(now=0)
+    assert environment.run_kwargs() == {"inventory": environment.inventory}
+    with open(environment.inventory, encoding="utf-8") as inventory_file:
+        assert json.load(inventory_file) == to_inventory_plugin_format(_LISTING)
+    assert not environment.refresh(now=30)
+    assert environment.refresh(now=61)
+
+    (tmp_path / "inventory" / "hosts.py").write_text("#!/bin/sh\nexit 0\n")
+    assert environment.refresh(now=62)
+    assert get_inventory_mock.call_count == 3
+    assert get_inventory_mock.call_args.kwargs["inventories"] == [
+        str(tmp_path / "inventory")
+    ]
+
+
+@patch("ansible_runner.get_inventory", return_value=(_LISTING, ""))
+def test_refresh_keeps_previous_inventory_on_failure(get_inventory_mock, tmp_path):
+    """Tests that jobs keep the last good rendering when rendering fails."""
+    environment = _environment(tmp_path, prepared_inventory=True)
+    environment.refresh(now=0)
+
+    get_inventory_mock.return_value = (None, "no such plugin")
+    (tmp_path / "inventory" / "hosts.py").write_text("#!/bin/sh\nexit 1\n")
+    with pytest.raises(RuntimeError, match="no such plugin"):
+        environment.refresh(now=1)
+    assert environment.run_kwargs() == {"inventory": environment.inventory}
+    assert os.listdir(os.path.dirname(environment.inventory)) == ["inventory.json"]
+
+
+def test_refresh_disabled(tmp_path):
+    environment = _environment(tmp_path)
+    assert not environment.refresh()
+    assert not environment.run_kwargs()
+
+
+def test_ssh_control_persist(tmp_path):
+    """Tests that jobs share a control socket directory removed on stop."""
+    environment = _environment(tmp_path, ssh_control_persist_seconds=600)
+    envvars = environment.run_kwargs()["envvars"]
+    assert "ControlPersist=600s" in envvars["ANSIBLE_SSH_ARGS"]
+    control_path_dir = envvars["ANSIBLE_SSH_CONTROL_PATH_DIR"]
+    assert os.path.isdir(control_path_dir)
+
+    environment.stop()
+    assert not os.path.exists(control_path_dir)
+
+
+def test_fact_cache(tmp_path):
+    """Tests that the fact cache adds to the arguments of jobs."""
+    environment = _environment(
+        tmp_path, fact_cache="jsonfile", ssh_control_persist_seconds=600
+    )
+    kwargs = environment.run_kwargs()
+    assert kwargs["fact_cache"] == str(tmp_path / "fact_cache")
+    assert kwargs["envvars"]["ANSIBLE_GATHERING"] == "smart"
+    assert "ANSIBLE_SSH_ARGS" in kwargs["envvars"]
+    environment.stop()
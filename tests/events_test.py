@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from restful_runner.events import EventBroker
+
+
+async def _collect(broker, job_uuid, last_event_id=0, heartbeat=None):
+    return [
+        event async for event in broker.subscribe(job_uuid, last_event_id, heartbeat)
+    ]
+
+
+def test_subscribers_receive_published_events():
+    """Tests that every subscriber gets every event, published from a thread."""
+    broker = EventBroker()
+
+    async def run():
+        subscribers = [asyncio.create_task(_collect(broker, "abcd")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        def produce():
+            broker.event_handler({"runner_ident": "abcd", "event": "playbook_on_start"})
+            broker.status_handler(
+                {"status": "successful"}, SimpleNamespace(ident="abcd")
+            )
+            broker.finish("abcd")
+
+        thread = threading.Thread(target=produce)
+        thread.start()
+        results = await asyncio.gather(*subscribers)
+        thread.join()
+        return results
+
+    for events in asyncio.run(run()):
+        assert [(event.id, event.event) for event in events] == [
+            (1, "playbook_on_start"),
+            (2, "status"),
+        ]
+        assert events[1].data == {"status": "successful"}
+
+
+def test_subscribe_resumes_after_last_event_id():
+    """Tests resuming a subscription from the last seen event."""
+    broker = EventBroker(max_events=3)
+    for index in range(5):
+        broker.publish("abcd", "event", {"index": index})
+    broker.finish("abcd")
+
+    events = asyncio.run(_collect(broker, "abcd", last_event_id=3))
+    assert [event.id for event in events] == [4, 5]
+    # Only the most recent events are buffered
+    events = asyncio.run(_collect(broker, "abcd"))
+    assert [event.id for event in events] == [3, 4, 5]
+
+
+def test_subscribe_heartbeat():
+    """Tests that None is yielded when no events arrive within the heartbeat."""
+    broker = EventBroker()
+
+    async def run():
+        subscription = broker.subscribe("abcd", heartbeat=0.01)
+        assert await subscription.__anext__() is None
+        await subscription.aclose()
+
+    asyncio.run(run())
+    # The empty stream is dropped once its last subscriber is gone
+    assert not broker.has_stream("abcd")
+
+
+def test_finished_streams_are_evicted():
+    """Tests only the most recent finished streams are kept."""
+    broker = EventBroker(max_finished_jobs=1)
+    broker.publish("a", "event", {})
+    broker.finish("a")
+    broker.finish("b")
+
+    assert not broker.has_stream("a")
+    assert broker.has_stream("b")
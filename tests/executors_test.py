@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from restful_runner.executors import (
+    ProcessJobExecutor,
+    RemoteRunner,
+    build_executor,
+)
+
+
+def _fake_run(ident, status_handler=None):
+    config = SimpleNamespace(ident=ident)
+    for status in ("starting", "running", "successful"):
+        status_handler({"status": status, "runner_ident": ident}, runner_config=config)
+    return SimpleNamespace(config=config, status="successful", rc=0)
+
+
+def test_build_executor():
+    """Tests building the thread backend and rejecting unknown backends."""
+    executor = build_executor("thread", 1)
+    assert isinstance(executor, ThreadPoolExecutor)
+    executor.shutdown()
+
+    with pytest.raises(ValueError):
+        build_executor("unknown", 1)
+
+
+@pytest.mark.parametrize("isolated", [False, True])
+def test_process_executor_marshals_callbacks(isolated):
+    """Tests that status callbacks made in the child reach the parent in order."""
+    executor = ProcessJobExecutor(1, isolated=isolated)
+    status_handler = MagicMock()
+    try:
+        future = executor.submit(_fake_run, "abcd", status_handler=status_handler)
+        runner = future.result(timeout=60)
+    finally:
+        executor.shutdown()
+
+    assert isinstance(runner, RemoteRunner)
+    assert runner.config.ident == "abcd"
+    assert runner.rc == 0
+    statuses = [call.args[0]["status"] for call in status_handler.call_args_list]
+    assert statuses == ["starting", "running", "successful"]
+    assert status_handler.call_args.kwargs["runner_config"].ident == "abcd"
+
+
+def _wait_for_cancel(ident, cancel_callback=None, status_handler=None):
+    config = SimpleNamespace(ident=ident)
+    status_handler({"status": "running", "runner_ident": ident}, runner_config=config)
+    deadline = time.monotonic() + 30
+    while not cancel_callback():
+        if time.monotonic() > deadline:
+            raise TimeoutError(ident)
+        time.sleep(0.05)
+    return SimpleNamespace(config=config, status="canceled", rc=254)
+
+
+def test_process_executor_cancel_callback():
+    """Tests that a cancel requested in the parent reaches the running child."""
+    executor = ProcessJobExecutor(1)
+    started, canceled = threading.Event(), threading.Event()
+    try:
+        running = executor.submit(
+            _wait_for_cancel,
+            "running",
+            cancel_callback=canceled.is_set,
+            status_handler=lambda *args, **kwargs: started.set(),
+        )
+        # The pool hands up to two jobs to its worker ahead of time, the job
+        # after those waits in its queue until the running one finishes
+        for ident in ("prefetched-0", "prefetched-1"):
+            executor.submit(_fake_run, ident, status_handler=MagicMock())
+        queued = executor.submit(
+            _wait_for_cancel, "queued", cancel_callback=canceled.is_set
+        )
+        # Only the job that hasn't started can be cancelled through its future
+        assert queued.cancel()
+        assert started.wait(30)
+        assert not running.cancel()
+
+        canceled.set()
+        assert running.result(timeout=30).status == "canceled"
+        assert queued.cancelled()
+    finally:
+        executor.shutdown()
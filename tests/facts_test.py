@@ -0,0 +1,89 @@
+import json
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from restful_runner.config import ApplicationSettings
+from restful_runner.facts import FactCache, build_fact_cache
+
+
+def _fact_cache(tmp_path, **kwargs):
+    settings = ApplicationSettings(
+        private_data_dir=str(tmp_path), fact_cache="jsonfile", **kwargs
+    )
+    return build_fact_cache(settings)
+
+
+def _write(fact_cache, name, content, age=0.0):
+    os.makedirs(fact_cache.directory, exist_ok=True)
+    path = os.path.join(fact_cache.directory, name)
+    with open(path, "w", encoding="utf-8") as cache_file:
+        json.dump(content, cache_file)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_build_fact_cache(tmp_path):
+    assert build_fact_cache(ApplicationSettings(private_data_dir=str(tmp_path))) is None
+    assert isinstance(_fact_cache(tmp_path), FactCache)
+    with pytest.raises(ValueError):
+        build_fact_cache(ApplicationSettings(fact_cache="redis"))
+
+
+def test_read_and_invalidate_hosts(tmp_path):
+    """Tests both file layouts of Ansible are read, and expired facts ignored."""
+    fact_cache = _fact_cache(tmp_path, fact_cache_timeout_seconds=3600)
+    assert not fact_cache.hosts()
+    _write(fact_cache, "web1", {"ansible_system": "Linux"})
+    _write(
+        fact_cache,
+        "s1_web2",
+        {"__payload__": json.dumps({"ansible_system": "FreeBSD"})},
+    )
+    _write(fact_cache, "s1_old", {"__payload__": "{}"}, age=7200)
+
+    hosts = fact_cache.hosts()
+    assert [(cached.host, cached.expired) for cached in hosts] == [
+        ("old", True),
+        ("web1", False),
+        ("web2", False),
+    ]
+    assert fact_cache.get("web1") == {"ansible_system": "Linux"}
+    assert fact_cache.get("web2") == {"ansible_system": "FreeBSD"}
+    assert fact_cache.get("old") is None
+    assert fact_cache.get("web3") is None
+    with pytest.raises(ValueError):
+        fact_cache.get("../web1")
+
+    assert fact_cache.invalidate_host("web2")
+    assert not fact_cache.invalidate_host("web2")
+    assert [cached.host for cached in fact_cache.hosts()] == ["old", "web1"]
+
+
+@patch("ansible_runner.run")
+def test_prefetch(run_mock, tmp_path):
+    """Tests facts are gathered with the arguments of jobs and summed up."""
+    fact_cache = _fact_cache(tmp_path)
+
+    def run(**kwargs):
+        assert not kwargs["event_handler"](
+            {
+                "event": "playbook_on_stats",
+                "runner_ident": kwargs["ident"],
+                "event_data": {"ok": {"web1": 1}, "dark": {"web2": 1}},
+            }
+        )
+        run_mock.return_value.rc = 4
+        return run_mock.return_value
+
+    run_mock.side_effect = run
+    summary = fact_cache.prefetch("web", {"inventory": "/inventory.json"})
+
+    kwargs = run_mock.call_args.kwargs
+    assert kwargs["module"] == "gather_facts"
+    assert kwargs["host_pattern"] == "web"
+    assert kwargs["inventory"] == "/inventory.json"
+    assert summary["rc"] == 4
+    assert summary["hosts"]["web2"]["unreachable"] == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from restful_runner import metrics
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_job_timings():
+    """Tests the timings observed as a job goes through its statuses."""
+    waits = _sample("restful_runner_executor_wait_seconds_count")
+    queue_waits = _sample("restful_runner_job_queue_wait_seconds_count")
+    durations = _sample(
+        "restful_runner_job_duration_seconds_count", playbook="metrics.yml"
+    )
+    finished = _sample(
+        "restful_runner_jobs_finished_total", playbook="metrics.yml", status="failed"
+    )
+
+    metrics.job_created("abcd")
+    metrics.job_submitted("abcd", "metrics.yml")
+    metrics.job_status_changed("abcd", AnsibleRunnerStatus.STARTING)
+    metrics.job_status_changed("abcd", AnsibleRunnerStatus.RUNNING)
+    metrics.job_status_changed("abcd", AnsibleRunnerStatus.FAILED)
+    metrics.job_done("abcd")
+    # Status changes of jobs that are not tracked are ignored
+    metrics.job_status_changed("abcd", AnsibleRunnerStatus.FAILED)
+
+    assert _sample("restful_runner_executor_wait_seconds_count") == waits + 1
+    assert _sample("restful_runner_job_queue_wait_seconds_count") == queue_waits + 1
+    assert (
+        _sample("restful_runner_job_duration_seconds_count", playbook="metrics.yml")
+        == durations + 1
+    )
+    assert (
+        _sample(
+            "restful_runner_jobs_finished_total",
+            playbook="metrics.yml",
+            status="failed",
+        )
+        == finished + 1
+    )
+
+
+def test_timed():
+    """Tests timing sync and async functions."""
+
+    @metrics.timed("test_sync")
+    def sync_helper():
+        return 1
+
+    @metrics.timed("test_async")
+    async def async_helper():
+        return 2
+
+    assert sync_helper() == 1
+    assert asyncio.run(async_helper()) == 2
+    assert _sample("restful_runner_db_operation_seconds_count", operation="test_sync")
+    assert _sample("restful_runner_db_operation_seconds_count", operation="test_async")
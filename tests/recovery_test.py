@@ -0,0 +1,163 @@
+import os
+from unittest import mock
+
+from sqlalchemy import text
+
+from restful_runner import artifacts, database
+from restful_runner.config import ApplicationSettings
+from restful_runner.database import DatabaseConnection
+from restful_runner.data_model import AnsibleJob
+from restful_runner.recovery import RecoveryReport, recover_jobs
+from restful_runner.scheduler import QueueFullError
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _setup(tmp_path, **kwargs):
+    settings = ApplicationSettings(private_data_dir=str(tmp_path), **kwargs)
+    db_conn = DatabaseConnection(f"sqlite:///{tmp_path / 'jobs.db'}")
+    database.upgrade_schema(db_conn.get_engine())
+    return settings, db_conn
+
+
+def _write_status(settings, job_uuid, status):
+    directory = artifacts.artifact_path(settings, job_uuid)
+    os.makedirs(directory)
+    with open(os.path.join(directory, "status"), "w", encoding="utf-8") as status_file:
+        status_file.write(status)
+
+
+def _statuses(db_conn):
+    with db_conn.session_local() as session:
+        return {job.job_uuid: job.status for job in database.get_ansible_jobs(session)}
+
+
+def test_recovers_unfinished_jobs(tmp_path):
+    """Tests waiting jobs are requeued and started jobs get their final status."""
+    settings, db_conn = _setup(tmp_path, recovery_batch_size=1)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(
+            session,
+            "created",
+            "first.yml",
+            "alice",
+            priority=3,
+            extravars={"a": 1},
+            tags=["t"],
+            timeout=60,
+            request_hash="first",
+        )
+        database.create_ansible_job(
+            session,
+            "queued",
+            "second.yml",
+            "bob",
+            status=AnsibleRunnerStatus.QUEUED,
+            request_hash="second",
+        )
+        for job_uuid in ("finished", "orphaned", "successful"):
+            database.create_ansible_job(
+                session,
+                job_uuid,
+                "third.yml",
+                "bob",
+                status=AnsibleRunnerStatus.RUNNING,
+            )
+        database.update_ansible_job(
+            session, "successful", status=AnsibleRunnerStatus.SUCCESSFUL
+        )
+    _write_status(settings, "finished", "failed")
+    artifacts.compress(
+        artifacts.artifact_path(settings, "finished"),
+        artifacts.archive_path(settings, "finished"),
+    )
+
+    job_scheduler = mock.MagicMock()
+    report = recover_jobs(db_conn.session_local, settings, job_scheduler)
+
+    assert report == RecoveryReport(requeued=2, completed=0, failed=2)
+    assert [call.args for call in job_scheduler.submit.call_args_list] == [
+        ("created", "first.yml", "alice"),
+        ("queued", "second.yml", "bob"),
+    ]
+    assert job_scheduler.submit.call_args_list[0].kwargs == {
+        "priority": 3,
+        "extravars": {"a": 1},
+        "tags": ["t"],
+        "timeout": 60,
+    }
+    assert _statuses(db_conn) == {
+        "created": AnsibleRunnerStatus.QUEUED,
+        "queued": AnsibleRunnerStatus.QUEUED,
+        "finished": AnsibleRunnerStatus.FAILED,
+        "orphaned": AnsibleRunnerStatus.FAILED,
+        "successful": AnsibleRunnerStatus.SUCCESSFUL,
+    }
+    with db_conn.session_local() as session:
+        assert database.get_ansible_job(session, "orphaned").end_time is not None
+
+
+def test_recovery_uses_artifact_status(tmp_path):
+    """Tests a job that finished while its status was not stored gets it."""
+    settings, db_conn = _setup(tmp_path)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(
+            session, "job", "playbook.yml", "test", status=AnsibleRunnerStatus.STARTING
+        )
+    _write_status(settings, "job", "successful")
+
+    report = recover_jobs(db_conn.session_local, settings, mock.MagicMock())
+    assert report == RecoveryReport(completed=1)
+    assert _statuses(db_conn) == {"job": AnsibleRunnerStatus.SUCCESSFUL}
+
+
+def test_recovery_fails_rejected_jobs(tmp_path):
+    """Tests jobs that no longer fit in the queue are marked failed."""
+    settings, db_conn = _setup(tmp_path)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(
+            session, "job", "playbook.yml", "test", request_hash="hash"
+        )
+    job_scheduler = mock.MagicMock()
+    job_scheduler.submit.side_effect = QueueFullError("full")
+
+    report = recover_jobs(db_conn.session_local, settings, job_scheduler)
+    assert report == RecoveryReport(failed=1)
+    assert _statuses(db_conn) == {"job": AnsibleRunnerStatus.FAILED}
+
+
+def test_recovery_requeues_jobs_without_created_time(tmp_path):
+    """Tests jobs without a creation time are requeued."""
+    settings, db_conn = _setup(tmp_path)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(
+            session, "job", "playbook.yml", "test", request_hash="hash"
+        )
+        session.query(AnsibleJob).update({AnsibleJob.created_time: None})
+        session.commit()
+    job_scheduler = mock.MagicMock()
+
+    report = recover_jobs(db_conn.session_local, settings, job_scheduler)
+    assert report == RecoveryReport(requeued=1)
+    assert _statuses(db_conn) == {"job": AnsibleRunnerStatus.QUEUED}
+
+
+def test_recovery_fails_jobs_without_stored_parameters(tmp_path):
+    """Tests waiting jobs stored before their parameters were aren't run."""
+    settings, db_conn = _setup(tmp_path)
+    with db_conn.session_local() as session:
+        # As upgrade_schema leaves the rows of earlier versions
+        session.execute(
+            text(
+                "INSERT INTO ansible_jobs (job_uuid, job_name, initiator, status) "
+                "VALUES ('legacy', 'playbook.yml', 'test', 'CREATED')"
+            )
+        )
+        session.commit()
+    job_scheduler = mock.MagicMock()
+
+    report = recover_jobs(db_conn.session_local, settings, job_scheduler)
+    assert report == RecoveryReport(failed=1)
+    job_scheduler.submit.assert_not_called()
+    assert _statuses(db_conn) == {"legacy": AnsibleRunnerStatus.FAILED}
+    with db_conn.session_local() as session:
+        assert database.get_ansible_job(session, "legacy").end_time is not None
@@ -0,0 +1,100 @@
+from restful_runner.results import ResultCollector, aggregate_results, host_counts
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _counts(ok=0, changed=0, failed=0, unreachable=0):
+    return {"ok": ok, "changed": changed, "failed": failed, "unreachable": unreachable}
+
+
+def test_host_counts():
+    """Tests the counters of every host are taken from Ansible's stats."""
+    stats = {
+        "processed": {"web1": 1, "web2": 1, "db1": 1},
+        "ok": {"web1": 3, "web2": 1},
+        "changed": {"web1": 1},
+        "failures": {"web2": 1},
+        "dark": {"db1": 1},
+        "skipped": {"web1": 2},
+    }
+    assert host_counts(stats) == {
+        "web1": _counts(ok=3, changed=1),
+        "web2": _counts(ok=1, failed=1),
+        "db1": _counts(unreachable=1),
+    }
+    assert not host_counts({})
+
+
+def test_result_collector():
+    """Tests summaries of interleaved jobs are kept apart and forgotten."""
+    collector = ResultCollector()
+    for ident, created in (("a", "00:00:00"), ("b", "00:00:01")):
+        assert collector.event_handler(
+            {
+                "event": "playbook_on_start",
+                "runner_ident": ident,
+                "created": f"2024-01-01T{created}.000000",
+            }
+        )
+    collector.event_handler({"event": "runner_on_ok", "runner_ident": "a"})
+    collector.event_handler(
+        {
+            "event": "playbook_on_stats",
+            "runner_ident": "a",
+            "created": "2024-01-01T00:00:02.250000",
+            "event_data": {"ok": {"web1": 1}, "changed": {"web1": 1}},
+        }
+    )
+
+    assert collector.pop("a", 0) == {
+        "rc": 0,
+        "duration": 2.25,
+        "hosts": {"web1": _counts(ok=1, changed=1)},
+    }
+    assert collector.pop("a", 0) == {"rc": 0, "duration": None, "hosts": {}}
+    collector.discard("b")
+    assert collector.pop("b", 1) == {"rc": 1, "duration": None, "hosts": {}}
+
+
+def test_aggregate_results():
+    """Tests summaries are summed up per host, keeping the last jobs."""
+    rows = [
+        (
+            "job1",
+            AnsibleRunnerStatus.FAILED,
+            {
+                "rc": 2,
+                "hosts": {
+                    "web1": _counts(ok=2, failed=1),
+                    "web2": _counts(ok=3, changed=1),
+                },
+            },
+        ),
+        ("job2", AnsibleRunnerStatus.CANCELED, None),
+        (
+            "job3",
+            AnsibleRunnerStatus.SUCCESSFUL,
+            {"rc": 0, "hosts": {"web1": _counts(ok=3), "db1": _counts()}},
+        ),
+    ]
+    summary, hosts = aggregate_results(rows)
+
+    assert summary.dict() == {
+        "jobs": 3,
+        "jobs_per_status": {"failed": 1, "canceled": 1, "successful": 1},
+        "jobs_with_errors": 1,
+        "hosts": 3,
+        "changed_hosts": 1,
+        "failed_hosts": 1,
+        "unreachable_hosts": 0,
+    }
+    assert [host.host for host in hosts] == ["db1", "web1", "web2"]
+    assert hosts[1].dict() == {
+        "host": "web1",
+        "jobs": 2,
+        "ok": 5,
+        "changed": 0,
+        "failed": 1,
+        "unreachable": 0,
+        "last_job_uuid": "job3",
+        "last_failed_job_uuid": "job1",
+    }
@@ -0,0 +1,99 @@
+import datetime
+import os
+import time
+
+from restful_runner import artifacts, database
+from restful_runner.config import ApplicationSettings
+from restful_runner.database import DatabaseConnection
+from restful_runner.retention import RetentionEngine
+from restful_runner.schema import AnsibleRunnerStatus
+
+
+def _write_artifacts(settings, job_uuid, finished=True, size=1000):
+    directory = artifacts.artifact_path(settings, job_uuid)
+    os.makedirs(directory)
+    with open(os.path.join(directory, "stdout"), "wb") as stdout:
+        stdout.write(os.urandom(size))
+    if finished:
+        with open(os.path.join(directory, "status"), "w", encoding="utf-8") as status:
+            status.write("successful")
+
+
+def _engine(tmp_path, **kwargs):
+    settings = ApplicationSettings(private_data_dir=str(tmp_path), **kwargs)
+    db_conn = DatabaseConnection(f"sqlite:///{tmp_path / 'jobs.db'}")
+    database.upgrade_schema(db_conn.get_engine())
+    return (
+        settings,
+        db_conn,
+        RetentionEngine(db_conn.session_local, settings, lambda: ["active"]),
+    )
+
+
+def test_compresses_finished_jobs(tmp_path):
+    """Tests only finished jobs that are not running are compressed."""
+    settings, _, engine = _engine(tmp_path)
+    _write_artifacts(settings, "finished")
+    _write_artifacts(settings, "unfinished", finished=False)
+    _write_artifacts(settings, "active")
+
+    assert engine.run_once().compressed == 1
+    assert sorted(os.listdir(artifacts.artifact_root(settings))) == [
+        "active",
+        "finished.zip",
+        "unfinished",
+    ]
+
+
+def test_prunes_archives_by_age_and_size(tmp_path):
+    """Tests old archives and the oldest archives over the size limit are deleted."""
+    settings, _, engine = _engine(tmp_path, artifact_max_age_days=1)
+    now = time.time()
+    for index, age_days in enumerate([3, 0.5, 0.2, 0.1]):
+        _write_artifacts(settings, f"job{index}")
+        archive = artifacts.archive_path(settings, f"job{index}")
+        artifacts.compress(artifacts.artifact_path(settings, f"job{index}"), archive)
+        os.utime(archive, (now - age_days * 86400,) * 2)
+
+    kept = sum(
+        os.path.getsize(artifacts.archive_path(settings, job_uuid))
+        for job_uuid in ("job2", "job3")
+    )
+    settings.artifact_max_total_mb = kept / 1024 / 1024
+    report = engine.run_once(now)
+    # job0 is too old, job1 goes to bring the total under the limit
+    assert report.archives_deleted == 2
+    assert sorted(os.listdir(artifacts.artifact_root(settings))) == [
+        "job2.zip",
+        "job3.zip",
+    ]
+
+
+def test_prunes_old_jobs_in_batches(tmp_path):
+    """Tests that jobs that ended long ago are deleted with their artifacts."""
+    settings, db_conn, engine = _engine(
+        tmp_path, job_max_age_days=7, retention_batch_size=2
+    )
+    deleted = []
+    engine._on_deleted = deleted.extend  # pylint: disable=protected-access
+    now = datetime.datetime.now()
+    with db_conn.session_local() as session:
+        for index, age_days in enumerate([30, 20, 10, 1]):
+            job_uuid = f"job{index}"
+            database.create_ansible_job(session, job_uuid, "playbook.yml", "test")
+            database.update_ansible_job(
+                session,
+                job_uuid,
+                status=AnsibleRunnerStatus.SUCCESSFUL,
+                end_time=now - datetime.timedelta(days=age_days),
+            )
+            _write_artifacts(settings, job_uuid)
+        database.create_ansible_job(session, "running", "playbook.yml", "test")
+
+    report = engine.run_once()
+    assert report.jobs_deleted == 3
+    assert sorted(deleted) == ["job0", "job1", "job2"]
+    assert os.listdir(artifacts.artifact_root(settings)) == ["job3.zip"]
+    with db_conn.session_local() as session:
+        remaining = database.get_ansible_jobs(session)
+        assert sorted(job.job_uuid for job in remaining) == ["job3", "running"]
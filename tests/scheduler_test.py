@@ -0,0 +1,186 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from restful_runner.scheduler import (
+    InitiatorQueueFullError,
+    JobScheduler,
+    QueueFullError,
+)
+
+
+def _started(service_mock):
+    return [call.args[0] for call in service_mock.submit_job.call_args_list]
+
+
+def test_submit_starts_job_when_capacity_available():
+    """Tests that a job starts right away when nothing else is running."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(service_mock, max_running=1, max_queue_size=10)
+    service_mock.add_done_listener.assert_called_once_with(scheduler.job_done)
+
+    scheduler.submit("a", "playbook.yml", "REST", extravars={"var": 1})
+
+    service_mock.submit_job.assert_called_once_with(
+        "a", "playbook.yml", {"var": 1}, None, None
+    )
+    assert scheduler.stats().running == 1
+    assert scheduler.stats().queued == 0
+
+
+def test_jobs_start_in_priority_order():
+    """Tests that queued jobs start by priority, then submission order."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(service_mock, max_running=1, max_queue_size=10)
+    scheduler.submit("a", "playbook.yml", "REST")
+    scheduler.submit("b", "playbook.yml", "REST", priority=0)
+    scheduler.submit("c", "playbook.yml", "REST", priority=5)
+    scheduler.submit("d", "playbook.yml", "REST", priority=0)
+    assert scheduler.stats().queued == 3
+
+    for ident in ("a", "c", "b"):
+        scheduler.job_done(ident)
+
+    assert _started(service_mock) == ["a", "c", "b", "d"]
+
+
+def test_per_playbook_limit_skips_blocked_jobs():
+    """Tests that a playbook at its limit doesn't block other playbooks."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(
+        service_mock, max_running=2, max_queue_size=10, max_running_per_playbook=1
+    )
+    scheduler.submit("a", "noisy.yml", "REST")
+    scheduler.submit("b", "noisy.yml", "REST", priority=10)
+    scheduler.submit("c", "quiet.yml", "REST")
+
+    assert _started(service_mock) == ["a", "c"]
+    scheduler.job_done("a")
+    assert _started(service_mock) == ["a", "c", "b"]
+
+
+def test_per_initiator_limit():
+    """Tests that an initiator can't run more jobs than its limit."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(
+        service_mock, max_running=2, max_queue_size=10, max_running_per_initiator=1
+    )
+    scheduler.submit("a", "playbook.yml", "user1")
+    scheduler.submit("b", "playbook.yml", "user1")
+
+    assert _started(service_mock) == ["a"]
+    assert scheduler.stats().queued_per_playbook == {"playbook.yml": 1}
+
+
+def test_queue_full():
+    """Tests that jobs are rejected once the queue is full."""
+    scheduler = JobScheduler(MagicMock(), max_running=1, max_queue_size=1)
+    scheduler.submit("a", "playbook.yml", "REST")
+    scheduler.submit("b", "playbook.yml", "REST")
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit("c", "playbook.yml", "REST")
+    assert scheduler.stats().rejected_total == 1
+
+
+def test_initiator_queue_full():
+    """Tests that an initiator can't queue more jobs than its limit."""
+    scheduler = JobScheduler(
+        MagicMock(), max_running=1, max_queue_size=10, max_queued_per_initiator=1
+    )
+    scheduler.submit("a", "playbook.yml", "user1")
+    scheduler.submit("b", "playbook.yml", "user1")
+
+    with pytest.raises(InitiatorQueueFullError):
+        scheduler.submit("c", "playbook.yml", "user1")
+    scheduler.submit("d", "playbook.yml", "user2")
+
+
+def test_failed_submission_releases_capacity():
+    """Tests that a job failing to submit doesn't hold on to its slot."""
+    service_mock = MagicMock()
+    service_mock.submit_job.side_effect = [RuntimeError("boom"), None]
+    scheduler = JobScheduler(service_mock, max_running=1, max_queue_size=10)
+    # Like the service, which notifies its done listeners
+    service_mock.report_failed.side_effect = scheduler.job_done
+    scheduler.submit("a", "playbook.yml", "REST")
+    scheduler.submit("b", "playbook.yml", "REST")
+
+    service_mock.report_failed.assert_called_once_with("a")
+    assert _started(service_mock) == ["a", "b"]
+    assert scheduler.stats().running == 1
+
+
+def test_cancel_queued_and_running_jobs():
+    """Tests that queued jobs are dropped and running ones handed to the service."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(service_mock, max_running=1, max_queue_size=10)
+    scheduler.submit("a", "playbook.yml", "REST")
+    scheduler.submit("b", "playbook.yml", "REST")
+    scheduler.submit("c", "playbook.yml", "REST")
+
+    assert scheduler.cancel("b")
+    service_mock.report_canceled.assert_called_once_with("b")
+    assert scheduler.stats().queued == 1
+
+    assert scheduler.cancel("a")
+    service_mock.cancel_job.assert_called_once_with("a")
+
+    service_mock.cancel_job.return_value = False
+    assert not scheduler.cancel("unknown")
+
+    scheduler.job_done("a")
+    assert _started(service_mock) == ["a", "c"]
+
+
+def test_has_job():
+    """Tests that queued and running jobs are known until they are done."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(service_mock, max_running=1, max_queue_size=10)
+    scheduler.submit("a", "playbook.yml", "REST")
+    scheduler.submit("b", "playbook.yml", "REST")
+
+    assert scheduler.has_job("a")
+    assert scheduler.has_job("b")
+    assert not scheduler.has_job("unknown")
+
+    scheduler.job_done("a")
+    assert not scheduler.has_job("a")
+    assert scheduler.has_job("b")
+
+
+def test_submit_many_admits_all_or_nothing():
+    """Tests that a batch is rejected as a whole when it doesn't fit the queue."""
+    service_mock = MagicMock()
+    scheduler = JobScheduler(
+        service_mock, max_running=1, max_queue_size=3, max_queued_per_initiator=2
+    )
+    scheduler.submit("a", "playbook.yml", "REST")
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit_many(
+            [
+                {"ident": ident, "playbook": "playbook.yml", "initiator": "REST"}
+                for ident in ("b", "c", "d", "e")
+            ]
+        )
+    with pytest.raises(InitiatorQueueFullError):
+        scheduler.submit_many(
+            [
+                {"ident": ident, "playbook": "playbook.yml", "initiator": "user1"}
+                for ident in ("b", "c", "d")
+            ]
+        )
+    assert scheduler.stats().queued == 0
+    assert scheduler.stats().rejected_total == 7
+
+    scheduler.submit_many(
+        [
+            {"ident": "b", "playbook": "playbook.yml", "initiator": "user1"},
+            {"ident": "c", "playbook": "playbook.yml", "initiator": "user1"},
+            {"ident": "d", "playbook": "other.yml", "initiator": "REST", "priority": 5},
+        ]
+    )
+    assert scheduler.stats().queued == 3
+    scheduler.job_done("a")
+    assert _started(service_mock) == ["a", "d"]
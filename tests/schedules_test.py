@@ -0,0 +1,221 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from restful_runner import database
+from restful_runner.data_model import Schedule
+from restful_runner.database import DatabaseConnection
+from restful_runner.schedules import (
+    CronExpression,
+    ScheduleReport,
+    ScheduleRunner,
+    TimerWheel,
+)
+from restful_runner.schema import AnsibleRunnerStatus, OverlapPolicy
+
+
+def _next(expression, after):
+    return CronExpression(expression).next_after(datetime.datetime(*after))
+
+
+def test_cron_expression():
+    """Tests finding the next match of cron expressions."""
+    # 2024-01-01 is a Monday
+    assert _next("* * * * *", (2024, 1, 1, 10, 30, 15)) == datetime.datetime(
+        2024, 1, 1, 10, 31
+    )
+    assert _next("*/15 9-17 * * *", (2024, 1, 1, 17, 50)) == datetime.datetime(
+        2024, 1, 2, 9, 0
+    )
+    assert _next("0 0 * * sat,sun", (2024, 1, 1)) == datetime.datetime(2024, 1, 6)
+    assert _next("0 0 * * 7", (2024, 1, 1)) == datetime.datetime(2024, 1, 7)
+    assert _next("30 4 1 feb *", (2024, 1, 1)) == datetime.datetime(2024, 2, 1, 4, 30)
+    assert _next("0 0 29 2 *", (2024, 3, 1)) == datetime.datetime(2028, 2, 29)
+    # Either the day of month or the day of week
+    assert _next("0 12 15 * fri", (2024, 1, 1)) == datetime.datetime(2024, 1, 5, 12)
+    assert _next("@monthly", (2024, 1, 31, 23, 59)) == datetime.datetime(2024, 2, 1)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "* * * *",
+        "60 * * * *",
+        "* * * * mon-",
+        "*/0 * * * *",
+        "5-1 * * * *",
+        "0 0 30 2 *",
+    ],
+)
+def test_invalid_cron_expression(expression):
+    """Tests invalid expressions and expressions that never match are rejected."""
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_timer_wheel():
+    """Tests keys come due on the first tick at or after their deadline."""
+    wheel = TimerWheel(1.0, 8, now=100.0)
+    wheel.add("a", 102.5)
+    wheel.add("b", 101.0)
+    wheel.add("late", 50.0)
+    # More than one turn away
+    wheel.add("c", 120.0)
+    wheel.add("removed", 102.0)
+    wheel.remove("removed")
+    assert len(wheel) == 4
+
+    assert not wheel.advance(100.9)
+    assert wheel.advance(101.0) == ["b", "late"]
+    assert not wheel.advance(102.9)
+    assert wheel.advance(103.0) == ["a"]
+    assert not wheel.advance(119.9)
+    # Moving a key replaces its deadline
+    wheel.add("c", 104.0)
+    assert wheel.advance(200.0) == ["c"]
+    assert len(wheel) == 0
+
+
+def _setup(tmp_path, rows):
+    db_conn = DatabaseConnection(f"sqlite:///{tmp_path / 'jobs.db'}")
+    database.upgrade_schema(db_conn.get_engine())
+    with db_conn.session_local() as session:
+        session.execute(insert(Schedule), rows)
+        session.commit()
+    return db_conn
+
+
+def _row(index, next_run, **kwargs):
+    return {
+        "name": f"schedule-{index}",
+        "playbook": "site.yml",
+        "interval_seconds": 60,
+        "overlap": OverlapPolicy.QUEUE,
+        "enabled": True,
+        "initiator": "schedule",
+        "next_run": next_run,
+        **kwargs,
+    }
+
+
+def test_overlap_policies(tmp_path):
+    """Tests a run is skipped only when the last job of a skipping schedule runs."""
+    start = datetime.datetime(2024, 1, 1, 12, 0)
+    db_conn = _setup(
+        tmp_path,
+        [
+            _row(0, start, overlap=OverlapPolicy.SKIP, last_job_uuid="running"),
+            _row(1, start, overlap=OverlapPolicy.SKIP, last_job_uuid="done"),
+            _row(2, start, overlap=OverlapPolicy.QUEUE, last_job_uuid="running"),
+            _row(3, start, enabled=False),
+        ],
+    )
+    with db_conn.session_local() as session:
+        database.create_ansible_job(
+            session, "running", "site.yml", "x", status=AnsibleRunnerStatus.RUNNING
+        )
+        database.create_ansible_job(
+            session, "done", "site.yml", "x", status=AnsibleRunnerStatus.SUCCESSFUL
+        )
+
+    launched = []
+
+    async def launcher(entry, run_time):
+        launched.append((entry.name, run_time))
+        return f"job-{entry.name}"
+
+    async def scenario():
+        runner = ScheduleRunner(
+            db_conn.async_session_local, launcher, clock=start.timestamp
+        )
+        await runner.load()
+        assert len(runner) == 3
+        report = await runner.run_once(start.timestamp() + 1)
+        async with db_conn.async_session_local() as session:
+            stored = {
+                schedule.name: schedule
+                for schedule in await database.async_get_schedules(session)
+            }
+        return report, stored
+
+    report, stored = asyncio.run(scenario())
+    assert report == ScheduleReport(launched=2, skipped=1)
+    assert sorted(launched) == [("schedule-1", start), ("schedule-2", start)]
+    assert stored["schedule-0"].last_job_uuid == "running"
+    assert stored["schedule-1"].last_job_uuid == "job-schedule-1"
+    assert stored["schedule-1"].last_run == start
+    for name in ("schedule-0", "schedule-1", "schedule-2"):
+        assert stored[name].next_run == start + datetime.timedelta(minutes=1)
+    assert stored["schedule-3"].next_run == start
+
+
+def test_thousands_of_schedules_fire_on_time(tmp_path):
+    """Tests 10000 schedules fire within a tick of their time, at a bounded cost.
+
+    The clock is simulated: the runner is driven through five minutes of ticks,
+    during which every schedule comes due five times, spread over the last 50
+    seconds of every minute.
+    """
+    schedules = 10000
+    start = datetime.datetime(2024, 1, 1, 12, 0)
+    db_conn = _setup(
+        tmp_path,
+        [
+            _row(
+                index,
+                start
+                + datetime.timedelta(seconds=10 + (index + 1) * 50 / (schedules + 1)),
+            )
+            for index in range(schedules)
+        ],
+    )
+    now = start.timestamp()
+    launches = []
+    sessions = 0
+
+    async def launcher(_entry, run_time):
+        launches.append(now - run_time.timestamp())
+        return "job"
+
+    def sessionmaker():
+        nonlocal sessions
+        sessions += 1
+        return db_conn.async_session_local()
+
+    async def scenario():
+        nonlocal now
+        runner = ScheduleRunner(sessionmaker, launcher, clock=lambda: now)
+        await runner.load()
+        cpu_start = time.process_time()
+        for _ in range(5 * 60):
+            now += 1.0
+            await runner.run_once()
+        busy_cpu = time.process_time() - cpu_start
+
+        # Ticks without due schedules don't touch the database
+        idle_sessions = sessions
+        now += 1.0
+        await runner.run_once()
+        return busy_cpu, sessions - idle_sessions
+
+    busy_cpu, idle_sessions = asyncio.run(scenario())
+    assert len(launches) == 5 * schedules
+    assert 0 <= min(launches) and max(launches) <= 1.0
+    # Every busy tick launches 200 runs and stores them in one statement
+    assert busy_cpu < 30
+    assert idle_sessions == 0
+
+
+def test_tick_cost_ignores_schedules_not_due():
+    """Tests the cost of a tick doesn't depend on the schedules that aren't due."""
+    now = datetime.datetime(2024, 1, 1, 12, 0).timestamp()
+    wheel = TimerWheel(1.0, 3600, now)
+    for index in range(10000):
+        wheel.add(index, now + 3000 + index % 500)
+    cpu_start = time.process_time()
+    for tick in range(1, 3000):
+        assert not wheel.advance(now + tick)
+    assert time.process_time() - cpu_start < 0.5
@@ -1,10 +1,12 @@
 # pylint: disable=protected-access
+from concurrent.futures import CancelledError
 from unittest import TestCase
 from unittest.mock import MagicMock
 from unittest.mock import ANY
 
 import ansible_runner
 
+from restful_runner import metrics
 from restful_runner.services import PlaybookExecutorService
 from restful_runner.config import ApplicationSettings
 
@@ -25,6 +27,7 @@ class PlaybookExecutorServiceTestCase(TestCase):
         self.executor_mock.submit.assert_called_once_with(
             ansible_runner.run,
             status_handler=self.status_handler_mock,
+            event_handler=None,
             quiet=ANY,
             project_dir=ANY,
             artifact_dir=ANY,
@@ -33,6 +36,10 @@ class PlaybookExecutorServiceTestCase(TestCase):
             playbook=playbook,
             extravars=extravars,
             cmdline=cmdline,
+            timeout=None,
+            cancel_callback=ANY,
+            settings={"pexpect_timeout": 1.0},
+            suppress_env_files=True,
         )
 
     def test_submit_job(self):
@@ -67,6 +74,22 @@ class PlaybookExecutorServiceTestCase(TestCase):
         )
         assert len(self.service._future_map) == 1
 
+    def test_submit_job_with_environment(self):
+        """Tests that the prepared environment adds to the runner arguments."""
+        environment_mock = MagicMock()
+        environment_mock.run_kwargs.return_value = {"inventory": "/inventory.json"}
+        service = PlaybookExecutorService(
+            self.executor_mock,
+            self.status_handler_mock,
+            self.settings,
+            environment=environment_mock,
+        )
+        service.submit_job("abcdef", "playbook.yml")
+
+        assert self.executor_mock.submit.call_args.kwargs["inventory"] == (
+            "/inventory.json"
+        )
+
     def test_done_callback(self):
         future_mock = MagicMock()
         runner_mock = future_mock.result.return_value
@@ -75,3 +98,113 @@ class PlaybookExecutorServiceTestCase(TestCase):
         self.service._future_map["abcd"] = None
         self.service.done_callback(future_mock)
         assert len(self.service._future_map) == 0
+
+    def test_done_callback_notifies_listeners(self):
+        """Tests a job that raised fails, and done listeners are still called."""
+        listener_mock = MagicMock()
+        self.service.add_done_listener(listener_mock)
+        future_mock = MagicMock()
+        future_mock.result.side_effect = RuntimeError("boom")
+
+        self.service._future_map["abcd"] = future_mock
+        self.service.done_callback(future_mock)
+        assert len(self.service._future_map) == 0
+        listener_mock.assert_called_once_with("abcd")
+        status, runner_config = self.status_handler_mock.call_args.args
+        assert status == {"status": "failed", "runner_ident": "abcd"}
+        assert runner_config.ident == "abcd"
+
+    def test_report_failed(self):
+        """Tests jobs that failed to submit get the failed status."""
+        listener_mock = MagicMock()
+        self.service.add_done_listener(listener_mock)
+        self.status_handler_mock.side_effect = RuntimeError("database is down")
+
+        self.service.report_failed("abcd")
+        status, _ = self.status_handler_mock.call_args.args
+        assert status == {"status": "failed", "runner_ident": "abcd"}
+        listener_mock.assert_called_once_with("abcd")
+
+    def test_report_canceled_forgets_the_job_timings(self):
+        """Tests jobs canceled while queued are no longer tracked by the metrics."""
+        listener_mock = MagicMock()
+        self.service.add_done_listener(listener_mock)
+        metrics.job_created("abcd")
+        metrics.job_submitted("abcd", "playbook.yml")
+
+        self.service.report_canceled("abcd")
+        status, _ = self.status_handler_mock.call_args.args
+        assert status == {"status": "canceled", "runner_ident": "abcd"}
+        assert "abcd" not in metrics._jobs
+        listener_mock.assert_called_once_with("abcd")
+
+    def test_cancel_job(self):
+        """Tests canceling jobs before and after they started."""
+        self.service.submit_job("pending", "playbook.yml")
+        pending_future = self.executor_mock.submit.return_value
+        pending_future.cancel.return_value = True
+        assert self.service.cancel_job("pending")
+        pending_future.cancel.assert_called_once()
+
+        self.executor_mock.submit.return_value = MagicMock()
+        self.service.submit_job("running", "playbook.yml")
+        running_future = self.executor_mock.submit.return_value
+        running_future.cancel.return_value = False
+        cancel_callback = self.executor_mock.submit.call_args.kwargs["cancel_callback"]
+        assert not cancel_callback()
+        assert self.service.cancel_job("running")
+        assert cancel_callback()
+
+        assert not self.service.cancel_job("unknown")
+
+    def test_done_callback_reports_canceled_jobs(self):
+        """Tests that jobs canceled before starting get the canceled status."""
+        listener_mock = MagicMock()
+        self.service.add_done_listener(listener_mock)
+        future_mock = MagicMock()
+        future_mock.result.side_effect = CancelledError()
+
+        self.service._future_map["abcd"] = future_mock
+        self.service.done_callback(future_mock)
+        assert len(self.service._future_map) == 0
+        status, runner_config = self.status_handler_mock.call_args.args
+        assert status == {"status": "canceled", "runner_ident": "abcd"}
+        assert runner_config.ident == "abcd"
+        listener_mock.assert_called_once_with("abcd")
+
+    def test_done_callback_reports_results(self):
+        """Tests the summary of a job is built from its events and handed over."""
+        result_handler_mock = MagicMock()
+        event_handler_mock = MagicMock(return_value=False)
+        service = PlaybookExecutorService(
+            self.executor_mock,
+            self.status_handler_mock,
+            self.settings,
+            event_handler=event_handler_mock,
+            result_handler=result_handler_mock,
+        )
+        service.submit_job("abcd", "playbook.yml")
+        event_handler = self.executor_mock.submit.call_args.kwargs["event_handler"]
+        stats = {
+            "event": "playbook_on_stats",
+            "runner_ident": "abcd",
+            "created": "2024-01-01T00:00:12.500000",
+            "event_data": {"processed": {"web1": 1}, "ok": {"web1": 2}},
+        }
+        assert not event_handler(stats)
+        event_handler_mock.assert_called_once_with(stats)
+
+        future = self.executor_mock.submit.return_value
+        future.result.return_value.config.ident = "abcd"
+        future.result.return_value.rc = 0
+        service.done_callback(future)
+        result_handler_mock.assert_called_once_with(
+            "abcd",
+            {
+                "rc": 0,
+                "duration": None,
+                "hosts": {
+                    "web1": {"ok": 2, "changed": 0, "failed": 0, "unreachable": 0}
+                },
+            },
+        )
@@ -1,7 +1,16 @@
 from unittest.mock import patch
 from unittest.mock import MagicMock
 
-from restful_runner.utils import status_handler, build_status_handler
+from restful_runner.schema import JobEventStatus
+from restful_runner.utils import (
+    build_batched_status_handler,
+    build_event_store_handler,
+    build_status_handler,
+    combine_event_handlers,
+    job_event_fields,
+    request_hash,
+    status_handler,
+)
 
 
 def _assert_status_handler_updates_fields(database_mock, status, field_list):
@@ -46,3 +55,79 @@ def test_build_status_handler(status_handler_mock):
     assert callable(wrapper)
     wrapper(None, None)
     status_handler_mock.assert_called_once_with(session_mock, None, None)
+
+
+@patch("restful_runner.utils.status_handler")
+def test_build_status_handler_invalidates_job_cache(status_handler_mock):
+    """Tests the cached job is dropped once its new status is stored."""
+    job_cache = MagicMock()
+    job_cache.invalidate.side_effect = lambda _: status_handler_mock.assert_called()
+    wrapper = build_status_handler(MagicMock(), job_cache)
+    wrapper({"runner_ident": "abcd", "status": "successful"}, MagicMock(ident="abcd"))
+    job_cache.invalidate.assert_called_once_with("abcd")
+
+
+def test_build_batched_status_handler():
+    writer_mock = MagicMock()
+    runner_config_mock = MagicMock()
+    runner_config_mock.ident = "abcd"
+    wrapper = build_batched_status_handler(writer_mock)
+    wrapper({"runner_ident": "abcd", "status": "starting"}, runner_config_mock)
+
+    writer_mock.update.assert_called_once()
+    assert writer_mock.update.call_args.args == ("abcd",)
+    assert set(writer_mock.update.call_args.kwargs) == {"status", "start_time"}
+
+
+def test_job_event_fields():
+    event = {
+        "event": "runner_on_failed",
+        "runner_ident": "abcd",
+        "counter": 7,
+        "event_data": {
+            "host": "web1",
+            "play": "site",
+            "task": "install nginx",
+            "task_action": "apt",
+            "duration": 1.5,
+            "res": {"changed": True, "msg": "No package matching 'nginx'"},
+        },
+    }
+    fields = job_event_fields(event)
+    assert fields["job_uuid"] == "abcd"
+    assert fields["counter"] == 7
+    assert fields["host"] == "web1"
+    assert fields["task"] == "install nginx"
+    assert fields["status"] == JobEventStatus.FAILED
+    assert fields["changed"] is True
+    assert fields["message"] == "No package matching 'nginx'"
+
+    assert job_event_fields({"event": "playbook_on_start"}) is None
+
+
+def test_build_event_store_handler():
+    writer_mock = MagicMock()
+    wrapper = build_event_store_handler(writer_mock)
+    assert wrapper({"event": "playbook_on_start"})
+    writer_mock.put.assert_not_called()
+
+    assert wrapper({"event": "runner_on_ok", "runner_ident": "abcd"})
+    writer_mock.put.assert_called_once()
+
+
+def test_combine_event_handlers():
+    first, second = MagicMock(return_value=True), MagicMock(return_value=False)
+    wrapper = combine_event_handlers(first, second)
+    assert not wrapper({"event": "runner_on_ok"})
+    first.assert_called_once_with({"event": "runner_on_ok"})
+    second.assert_called_once_with({"event": "runner_on_ok"})
+
+
+def test_request_hash():
+    base = request_hash("site.yml", {"a": 1, "b": [1, 2]}, ["x", "y"])
+    assert base == request_hash("site.yml", {"b": [1, 2], "a": 1}, ["y", "x"])
+    assert base == request_hash("site.yml", {"a": 1, "b": [1, 2]}, ["x", "y", "x"])
+    assert base != request_hash("other.yml", {"a": 1, "b": [1, 2]}, ["x", "y"])
+    assert base != request_hash("site.yml", {"a": 2, "b": [1, 2]}, ["x", "y"])
+    assert base != request_hash("site.yml", {"a": 1, "b": [1, 2]}, ["x"])
+    assert request_hash("site.yml", None, None) == request_hash("site.yml", {}, [])
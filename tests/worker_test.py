@@ -0,0 +1,226 @@
+from concurrent.futures import Future
+import datetime
+import multiprocessing
+from unittest.mock import MagicMock
+
+from restful_runner import database, utils
+from restful_runner.config import ApplicationSettings
+from restful_runner.database import DatabaseConnection
+from restful_runner.data_model import AnsibleJob
+from restful_runner.schema import AnsibleRunnerStatus
+from restful_runner.services import PlaybookExecutorService
+from restful_runner.worker import JobWorker
+
+
+def _connect(db_path):
+    db_conn = DatabaseConnection(f"sqlite:///{db_path}")
+    database.upgrade_schema(db_conn.get_engine())
+    return db_conn
+
+
+def _create_jobs(db_conn, count, **kwargs):
+    with db_conn.session_local() as session:
+        for index in range(count):
+            database.create_ansible_job(
+                session,
+                f"job-{index}",
+                "playbook.yml",
+                "test",
+                request_hash="hash",
+                **kwargs,
+            )
+
+
+def _claim_all(db_path, worker_id):
+    db_conn = _connect(db_path)
+    claimed = []
+    with db_conn.session_local() as session:
+        while True:
+            job = database.claim_ansible_job(session, worker_id, 60, attempts=50)
+            if job is None:
+                return claimed
+            claimed.append(job.job_uuid)
+
+
+def test_claim_ansible_job_order(tmp_path):
+    """Tests jobs are claimed by priority, then age, and only once."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 2)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(session, "urgent", "playbook.yml", "t", priority=5)
+
+    assert _claim_all(tmp_path / "jobs.db", "worker") == ["urgent", "job-0", "job-1"]
+
+
+def test_claim_ansible_job_expired_lease(tmp_path):
+    """Tests a job claimed by a worker that died before starting it is reclaimed."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 1)
+    with db_conn.session_local() as session:
+        assert database.claim_ansible_job(session, "dead", 60) is not None
+        assert database.claim_ansible_job(session, "alive", 60) is None
+
+        session.query(AnsibleJob).update(
+            {AnsibleJob.lease_expires: datetime.datetime(2000, 1, 1)}
+        )
+        session.commit()
+        assert database.claim_ansible_job(session, "alive", 60).worker_id == "alive"
+
+
+def test_expire_ansible_job_leases(tmp_path):
+    """Tests started jobs with expired leases are failed."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 2)
+    with db_conn.session_local() as session:
+        for job_uuid in ("job-0", "job-1"):
+            database.claim_ansible_job(session, "worker", 60)
+            database.update_ansible_job(
+                session, job_uuid, status=AnsibleRunnerStatus.RUNNING
+            )
+        session.query(AnsibleJob).filter(AnsibleJob.job_uuid == "job-0").update(
+            {AnsibleJob.lease_expires: datetime.datetime(2000, 1, 1)}
+        )
+        session.commit()
+
+        assert database.expire_ansible_job_leases(session) == 1
+        job = database.get_ansible_job(session, "job-0")
+        assert job.status == AnsibleRunnerStatus.FAILED
+        assert job.end_time is not None
+
+
+def test_claim_ansible_job_multiple_processes(tmp_path):
+    """Tests that workers in separate processes never claim the same job."""
+    db_path = tmp_path / "jobs.db"
+    _create_jobs(_connect(db_path), 60)
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(3) as pool:
+        results = pool.starmap(_claim_all, [(db_path, f"w{i}") for i in range(3)])
+
+    claimed = [job_uuid for result in results for job_uuid in result]
+    assert sorted(claimed) == sorted(f"job-{index}" for index in range(60))
+
+
+def test_worker_claims_up_to_capacity(tmp_path):
+    """Tests the worker submits claimed jobs without exceeding its capacity."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 3, extravars={"var": 1}, tags=["tag"])
+    service_mock = MagicMock()
+    active_jobs = []
+    service_mock.active_jobs.side_effect = lambda: list(active_jobs)
+    service_mock.submit_job.side_effect = lambda ident, *_: active_jobs.append(ident)
+
+    worker = JobWorker(
+        db_conn.session_local,
+        service_mock,
+        None,
+        "worker",
+        max_jobs=2,
+        lease_seconds=60,
+        heartbeat_seconds=10,
+        poll_seconds=1,
+    )
+    assert worker.claim_jobs() == 2
+    service_mock.submit_job.assert_any_call(
+        "job-0", "playbook.yml", {"var": 1}, ["tag"], None
+    )
+
+    worker.heartbeat()
+    with db_conn.session_local() as session:
+        assert database.get_ansible_job(session, "job-2").worker_id is None
+        assert database.get_ansible_job(session, "job-1").lease_expires is not None
+
+
+def test_worker_fails_jobs_without_stored_parameters(tmp_path):
+    """Tests jobs stored before their parameters were are failed, not run."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 1)
+    with db_conn.session_local() as session:
+        database.create_ansible_job(session, "legacy", "playbook.yml", "test")
+    service_mock = MagicMock()
+    service_mock.active_jobs.return_value = []
+
+    worker = JobWorker(
+        db_conn.session_local,
+        service_mock,
+        None,
+        "worker",
+        max_jobs=2,
+        lease_seconds=60,
+        heartbeat_seconds=10,
+        poll_seconds=1,
+    )
+    assert worker.claim_jobs() == 1
+    service_mock.report_failed.assert_called_once_with("legacy")
+    assert [call.args[0] for call in service_mock.submit_job.call_args_list] == [
+        "job-0"
+    ]
+
+
+def test_worker_heartbeat_cancels_jobs(tmp_path):
+    """Tests jobs flagged for cancellation are canceled by their worker."""
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 2)
+    service_mock = MagicMock()
+    service_mock.active_jobs.return_value = ["job-0", "job-1"]
+    worker = JobWorker(
+        db_conn.session_local,
+        service_mock,
+        None,
+        "worker",
+        max_jobs=2,
+        lease_seconds=60,
+        heartbeat_seconds=10,
+        poll_seconds=1,
+    )
+    with db_conn.session_local() as session:
+        for _ in range(2):
+            database.claim_ansible_job(session, "worker", 60)
+        session.query(AnsibleJob).filter(AnsibleJob.job_uuid == "job-1").update(
+            {AnsibleJob.cancel_requested: True}
+        )
+        session.commit()
+
+    worker.heartbeat()
+    service_mock.cancel_job.assert_called_once_with("job-1")
+
+
+def test_worker_fails_jobs_that_raise(tmp_path):
+    """Tests a job that raises before it starts fails rather than being reclaimed.
+
+    Its row has no creation time, like rows created before the column existed.
+    """
+    db_conn = _connect(tmp_path / "jobs.db")
+    _create_jobs(db_conn, 1)
+    with db_conn.session_local() as session:
+        session.query(AnsibleJob).update({AnsibleJob.created_time: None})
+        session.commit()
+    future = Future()
+    future.set_exception(RuntimeError("boom"))
+    executor_mock = MagicMock()
+    executor_mock.submit.return_value = future
+    executor_service = PlaybookExecutorService(
+        executor_mock,
+        utils.build_status_handler(db_conn.session_local),
+        ApplicationSettings(private_data_dir=str(tmp_path)),
+    )
+
+    worker = JobWorker(
+        db_conn.session_local,
+        executor_service,
+        None,
+        "worker",
+        max_jobs=1,
+        lease_seconds=60,
+        heartbeat_seconds=10,
+        poll_seconds=1,
+    )
+    assert worker.claim_jobs() == 1
+    worker.heartbeat()
+
+    with db_conn.session_local() as session:
+        job = database.get_ansible_job(session, "job-0")
+        assert job.status == AnsibleRunnerStatus.FAILED
+        assert job.end_time is not None
+        assert job.lease_expires is None
+    assert worker.claim_jobs() == 0
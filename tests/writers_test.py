@@ -0,0 +1,128 @@
+import datetime
+from unittest.mock import ANY, MagicMock, patch
+
+from restful_runner import database
+from restful_runner.database import DatabaseConnection
+from restful_runner.schema import AnsibleRunnerStatus, JobEventStatus
+from restful_runner.writers import BatchWriter, EventWriter, StatusWriter
+
+
+@patch("restful_runner.writers.database")
+def test_status_writer_coalesces_updates(database_mock):
+    """Tests that updates to the same job in one batch are merged."""
+    database_mock.update_ansible_jobs.return_value = []
+    written = []
+    writer = StatusWriter(MagicMock(), on_written=written.append)
+    start_time = datetime.datetime(2022, 1, 1)
+    writer.write_batch(
+        MagicMock(),
+        [
+            {"job_uuid": "a", "status": "starting", "start_time": start_time},
+            {"job_uuid": "b", "status": "running"},
+            {"job_uuid": "a", "status": "running"},
+        ],
+    )
+
+    database_mock.update_ansible_jobs.assert_called_once_with(
+        ANY,
+        {
+            "a": {"status": "running", "start_time": start_time},
+            "b": {"status": "running"},
+        },
+    )
+    assert written == [["a", "b"]]
+
+
+def test_batch_writer_batches_and_flushes():
+    """Tests that queued items are written in batches of at most flush_size."""
+    batches = []
+
+    class ListWriter(BatchWriter):
+        def write_batch(self, session, items):
+            batches.append(list(items))
+
+    writer = ListWriter(MagicMock(), flush_interval=10, flush_size=2)
+    for item in range(3):
+        writer.put(item)
+    writer.start()
+
+    assert writer.flush(timeout=5)
+    assert batches == [[0, 1], [2]]
+    writer.put(3)
+    writer.stop()
+    assert batches == [[0, 1], [2], [3]]
+
+
+def test_batch_writer_retries_failed_batches():
+    """Tests that a failed batch is retried in a new session."""
+    sessionmaker_mock = MagicMock()
+    write_mock = MagicMock(side_effect=[RuntimeError("database is locked"), None])
+
+    class FlakyWriter(BatchWriter):
+        def write_batch(self, session, items):
+            write_mock(items)
+
+    writer = FlakyWriter(sessionmaker_mock, flush_interval=0.01, flush_size=10)
+    writer.start()
+    writer.put("item")
+    writer.stop()
+
+    assert write_mock.call_count == 2
+    assert sessionmaker_mock.call_count == 2
+
+
+def test_batch_writer_logs_dropped_batches(caplog):
+    """Tests that a batch failing every attempt is logged with its jobs."""
+    writer = StatusWriter(
+        MagicMock(side_effect=RuntimeError("database is locked")), flush_interval=0
+    )
+    writer.start()
+    writer.update("b", status="running")
+    writer.update("a", status="running")
+    writer.stop()
+
+    (record,) = [record for record in caplog.records if record.levelname == "ERROR"]
+    assert record.getMessage() == "Dropping batch of 2 writes of jobs: a, b"
+
+
+def test_status_writer_updates_database(tmp_path):
+    """Tests status updates reach the database."""
+    db_conn = DatabaseConnection(f"sqlite:///{tmp_path / 'jobs.db'}")
+    database.upgrade_schema(db_conn.get_engine())
+    with db_conn.session_local() as session:
+        database.create_ansible_job(session, "abcd", "playbook.yml", "test")
+
+    writer = StatusWriter(db_conn.session_local)
+    writer.start()
+    writer.update("abcd", status=AnsibleRunnerStatus.RUNNING)
+    writer.update("unknown", status=AnsibleRunnerStatus.RUNNING)
+    writer.update("abcd", status=AnsibleRunnerStatus.SUCCESSFUL)
+    writer.stop()
+
+    with db_conn.session_local() as session:
+        job = database.get_ansible_job(session, "abcd")
+        assert job.status == AnsibleRunnerStatus.SUCCESSFUL
+
+
+def test_event_writer_inserts_events(tmp_path):
+    """Tests job events are inserted in bulk."""
+    db_conn = DatabaseConnection(f"sqlite:///{tmp_path / 'jobs.db'}")
+    database.upgrade_schema(db_conn.get_engine())
+
+    writer = EventWriter(db_conn.session_local, flush_size=2)
+    writer.start()
+    for index in range(3):
+        writer.put(
+            {
+                "job_uuid": "abcd",
+                "counter": index,
+                "host": f"host{index}",
+                "status": JobEventStatus.OK,
+                "created": datetime.datetime.now(),
+            }
+        )
+    writer.stop()
+
+    with db_conn.session_local() as session:
+        job_events = database.get_ansible_job_events(session, job_uuid="abcd")
+        assert [event.host for event in job_events] == ["host2", "host1", "host0"]